@@ -18,7 +18,8 @@ CREATE TABLE IF NOT EXISTS compaction_cache (
     model_used TEXT NOT NULL,
     token_count INTEGER,
     created_at REAL NOT NULL,
-    updated_at REAL NOT NULL
+    updated_at REAL NOT NULL,
+    segments TEXT  -- JSON list of tiered summary segments (compaction_tiers)
 );
 
 CREATE TABLE IF NOT EXISTS settings (
@@ -80,6 +81,7 @@ SETTINGS_SPEC = {
     "max_output_tokens":  (500,  100,  4000),
     "image_lookback":     (10,   0,    50),
     "debug":              ("off", None, None),
+    "stream":             ("on",  None, None),
     "answer_model":       ("claude-opus-4.6", None, None),
     "compact_model":      ("claude-sonnet-4.5", None, None),
     "max_context_tokens": (20000, 5000, 100000),  # Fallback cap for main context
@@ -120,6 +122,7 @@ SETTINGS_HELP = {
     "max_output_tokens":  "Max tokens the bot can generate per response",
     "image_lookback":     "Number of recent messages to scan for images (0 to disable)",
     "debug":              "Show token debug info to bot admins (on/off)",
+    "stream":             "Show answers as they're generated, editing the reply in place (on/off)",
     "answer_model":       "Model used for answering questions",
     "compact_model":      "Model used for compaction/summarization",
     "max_context_tokens":  "Maximum tokens for main context window (fallback cap)",
@@ -174,6 +177,12 @@ class AICache:
         self.logdir = logdir
         self.db_path = os.path.join(logdir, "ai_cache.db")
         self._db = None
+        # Settings cache: stored rows per guild {guild_id: {channel_id|None: {key: value}}}
+        # and resolved channel→guild→default dicts {guild_id: {channel_id|None: settings}}.
+        # Both are dropped for a guild whenever set_setting writes to it.
+        self._settings = {}
+        self._resolved = {}
+        self._settings_version = {}
 
     async def get_db(self) -> aiosqlite.Connection:
         if self._db is None:
@@ -183,12 +192,15 @@ class AICache:
             await self._db.executescript(SCHEMA)
             await self._db.commit()
             await self._migrate_costs()
+            await self._migrate_segments()
         return self._db
 
     async def close(self):
         if self._db is not None:
             await self._db.close()
             self._db = None
+        self._settings.clear()
+        self._resolved.clear()
 
     async def _migrate_costs(self):
         """One-time migration: recalculate cost_usd using current MODEL_PRICING.
@@ -216,6 +228,16 @@ class AICache:
             "INSERT INTO migrations (name) VALUES ('recalc_costs_v1')")
         await db.commit()
 
+    async def _migrate_segments(self):
+        """Add compaction_cache.segments to databases created before it.
+        Existing rows keep segments NULL and are read as one segment."""
+        db = self._db
+        cursor = await db.execute("PRAGMA table_info(compaction_cache)")
+        if any(row["name"] == "segments" for row in await cursor.fetchall()):
+            return
+        await db.execute("ALTER TABLE compaction_cache ADD COLUMN segments TEXT")
+        await db.commit()
+
     # ── Cache CRUD ──────────────────────────────────────────────
 
     async def get_cache(self, channel_id: int):
@@ -233,8 +255,13 @@ class AICache:
     async def set_cache(self, channel_id: int, guild_id: int,
                         oldest_snowflake: int, newest_snowflake: int,
                         summary_text: str, model_used: str,
-                        token_count: int | None = None):
-        """Insert or replace a compaction cache entry."""
+                        token_count: int | None = None,
+                        segments: str | None = None):
+        """Insert or replace a compaction cache entry.
+
+        segments is the JSON from compaction_tiers.dump() that summary_text
+        was rendered from, if any.
+        """
         db = await self.get_db()
         now = time.time()
         if token_count is None:
@@ -242,10 +269,10 @@ class AICache:
         await db.execute(
             """INSERT OR REPLACE INTO compaction_cache
                (channel_id, guild_id, oldest_snowflake, newest_snowflake,
-                summary_text, model_used, token_count, created_at, updated_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                summary_text, model_used, token_count, created_at, updated_at, segments)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             [channel_id, guild_id, oldest_snowflake, newest_snowflake,
-             summary_text, model_used, token_count, now, now],
+             summary_text, model_used, token_count, now, now, segments],
         )
         await db.commit()
 
@@ -286,30 +313,8 @@ class AICache:
         """
         if key not in SETTINGS_SPEC:
             return None
-
-        db = await self.get_db()
-        default_val = SETTINGS_SPEC[key][0]
-
-        # Try channel-specific first
-        if channel_id is not None:
-            cursor = await db.execute(
-                "SELECT value FROM settings WHERE guild_id = ? AND channel_id = ? AND key = ?",
-                [guild_id, channel_id, key],
-            )
-            row = await cursor.fetchone()
-            if row is not None:
-                return self._cast_setting(key, row["value"])
-
-        # Fallback to guild-wide (channel_id IS NULL)
-        cursor = await db.execute(
-            "SELECT value FROM settings WHERE guild_id = ? AND channel_id IS NULL AND key = ?",
-            [guild_id, key],
-        )
-        row = await cursor.fetchone()
-        if row is not None:
-            return self._cast_setting(key, row["value"])
-
-        return default_val
+        settings = await self._resolved_settings(guild_id, channel_id)
+        return settings[key]
 
     async def set_setting(self, guild_id: int, channel_id: int | None, key: str, value):
         """Validate and store a setting. Returns (success, error_msg)."""
@@ -356,14 +361,59 @@ class AICache:
             [guild_id, channel_id, key, str(value), time.time()],
         )
         await db.commit()
+        self._invalidate_settings(guild_id)
         return True, None
 
     async def get_all_settings(self, guild_id: int, channel_id: int | None = None):
         """Return dict of all effective settings for a channel."""
-        result = {}
-        for key in SETTINGS_SPEC:
-            result[key] = await self.get_setting(guild_id, channel_id, key)
-        return result
+        return dict(await self._resolved_settings(guild_id, channel_id))
+
+    async def _guild_settings(self, guild_id: int) -> dict:
+        """All stored settings for a guild as {channel_id or None: {key: value}}.
+
+        Loaded with a single query, then served from memory until
+        set_setting touches the guild.
+        """
+        rows = self._settings.get(guild_id)
+        if rows is not None:
+            return rows
+        version = self._settings_version.get(guild_id, 0)
+        db = await self.get_db()
+        cursor = await db.execute(
+            "SELECT channel_id, key, value FROM settings WHERE guild_id = ?",
+            [guild_id],
+        )
+        rows = {}
+        for row in await cursor.fetchall():
+            if row["key"] in SETTINGS_SPEC:
+                rows.setdefault(row["channel_id"], {})[row["key"]] = \
+                    self._cast_setting(row["key"], row["value"])
+        # Don't cache what we read if a set_setting landed while we awaited
+        if self._settings_version.get(guild_id, 0) == version:
+            self._settings[guild_id] = rows
+        return rows
+
+    async def _resolved_settings(self, guild_id: int, channel_id: int | None) -> dict:
+        """Effective settings for a channel (channel → guild → default).
+        Shared cached dict, callers must not modify it."""
+        guild = self._resolved.get(guild_id)
+        if guild is not None and channel_id in guild:
+            return guild[channel_id]
+        version = self._settings_version.get(guild_id, 0)
+        rows = await self._guild_settings(guild_id)
+        settings = {key: spec[0] for key, spec in SETTINGS_SPEC.items()}
+        settings.update(rows.get(None, {}))
+        if channel_id is not None:
+            settings.update(rows.get(channel_id, {}))
+        if self._settings_version.get(guild_id, 0) == version:
+            self._resolved.setdefault(guild_id, {})[channel_id] = settings
+        return settings
+
+    def _invalidate_settings(self, guild_id: int):
+        """Drop cached settings for a guild after a write."""
+        self._settings_version[guild_id] = self._settings_version.get(guild_id, 0) + 1
+        self._settings.pop(guild_id, None)
+        self._resolved.pop(guild_id, None)
 
     def _cast_setting(self, key: str, raw: str):
         """Cast a raw setting value to the correct type."""
@@ -0,0 +1,195 @@
+"""Background compaction scheduler.
+
+Keeps channel compaction summaries warm off the request path. The Logger
+reports newly logged text per channel (the `messages_logged` event); once
+a tracked channel has grown enough, the scheduler re-measures its overflow
+and re-compacts in the background; periodic sweeps also catch summary
+segments due to expire or roll up (see compaction_tiers). Jobs are
+limited per guild and there is at most one queued/running job per channel
+(later requests join it).
+"""
+
+import asyncio
+import collections
+import time
+
+MAX_PER_GUILD = 1           # concurrent compaction calls per guild
+CHECK_EVERY_TOKENS = 1000   # re-measure a channel's overflow after this much new text
+SWEEP_INTERVAL = 600        # also re-measure every tracked channel this often, since
+                            # messages age into the overflow window without new writes
+FORGET_AFTER = 7 * 86400    # stop tracking channels nobody has asked about in a week
+
+
+class _Tracked:
+    """What the scheduler needs to compact a channel in the background.
+
+    Captured from the last foreground request in the channel, so jobs use
+    the same settings, model and credentials the user's command did.
+    """
+
+    def __init__(self, channel, settings, compact_model, auth):
+        self.channel = channel
+        self.settings = settings
+        self.compact_model = compact_model
+        self.auth = auth            # async () -> (token, base_url)
+        self.last_used = time.time()
+        self.new_tokens = 0         # estimated tokens logged since the last check
+
+
+class CompactionScheduler:
+    """Runs ContextGatherer.compact_channel() in the background."""
+
+    def __init__(self, bot, gatherer):
+        self.bot = bot
+        self.gatherer = gatherer
+        self.channels = {}          # channel_id -> _Tracked
+        self._jobs = {}             # channel_id -> Task (queued or running)
+        self._running = set()       # channel_ids currently holding a guild slot
+        self._guild_limits = {}     # guild_id -> Semaphore
+        self._sweeper = None
+        self.stats = {"done": 0, "skipped": 0, "failed": 0, "joined": 0}
+        # (wait_s, run_s) for recent compactions
+        self.latency = collections.deque(maxlen=50)
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self):
+        tasks = list(self._jobs.values())
+        if self._sweeper is not None:
+            tasks.append(self._sweeper)
+            self._sweeper = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ── Foreground hooks ────────────────────────────────────────
+
+    def track(self, channel, settings: dict, compact_model: str, auth):
+        """Record (or refresh) how to compact a channel in the background."""
+        tracked = self.channels.get(channel.id)
+        if tracked is None:
+            self.channels[channel.id] = _Tracked(channel, settings, compact_model, auth)
+        else:
+            tracked.channel = channel
+            tracked.settings = settings
+            tracked.compact_model = compact_model
+            tracked.auth = auth
+            tracked.last_used = time.time()
+
+    def schedule(self, channel_id: int, check: bool = False) -> bool:
+        """Queue a compaction for a tracked channel.
+
+        With check=True the job first re-measures overflow and only
+        compacts if it is over the threshold. Returns False if a job for
+        the channel is already queued or running (the caller joins it).
+        """
+        if channel_id in self._jobs:
+            self.stats["joined"] += 1
+            return False
+        if channel_id not in self.channels:
+            return False
+        self._jobs[channel_id] = asyncio.create_task(self._run(channel_id, check))
+        return True
+
+    def status(self, channel_id: int) -> str:
+        """'running', 'queued' or 'idle' for a channel."""
+        if channel_id in self._running:
+            return "running"
+        if channel_id in self._jobs:
+            return "queued"
+        return "idle"
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._jobs) - len(self._running)
+
+    # ── Logger events ───────────────────────────────────────────
+
+    def note_logged(self, chars_by_channel: dict):
+        """Account for newly logged text; check channels that grew enough."""
+        for channel_id, chars in chars_by_channel.items():
+            tracked = self.channels.get(channel_id)
+            if tracked is None:
+                continue
+            tracked.new_tokens += chars // 4
+            if tracked.new_tokens >= CHECK_EVERY_TOKENS:
+                tracked.new_tokens = 0
+                self.schedule(channel_id, check=True)
+
+    # ── Jobs ────────────────────────────────────────────────────
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            cutoff = time.time() - FORGET_AFTER
+            for channel_id, tracked in list(self.channels.items()):
+                if tracked.last_used < cutoff:
+                    if channel_id not in self._jobs:
+                        del self.channels[channel_id]
+                    continue
+                self.schedule(channel_id, check=True)
+
+    async def _needs_compaction(self, tracked) -> bool:
+        if tracked.settings.get("context", "on") == "off":
+            return False
+        cache = await self.gatherer.ai_cache.get_cache(tracked.channel.id)
+        if cache is None:
+            return True  # cold; compact_channel decides if there's enough history
+        if self.gatherer.segments_due(cache, tracked.settings):
+            return True  # segments to expire or roll up, even if the channel is quiet
+        overflow = await self.gatherer.measure_overflow(tracked.channel, cache, tracked.settings)
+        return overflow > tracked.settings["recompact_raw_tokens"]
+
+    async def _run(self, channel_id: int, check: bool):
+        tracked = self.channels[channel_id]
+        channel = tracked.channel
+        queued_at = time.monotonic()
+        try:
+            if check and not await self._needs_compaction(tracked):
+                return
+            guild_id = channel.guild.id
+            limit = self._guild_limits.setdefault(guild_id, asyncio.Semaphore(MAX_PER_GUILD))
+            async with limit:
+                self._running.add(channel_id)
+                started = time.monotonic()
+                token, base_url = await tracked.auth()
+                result = await self.gatherer.compact_channel(
+                    channel, tracked.settings, token, base_url, tracked.compact_model)
+                finished = time.monotonic()
+            if result is None:
+                self.stats["skipped"] += 1
+                return
+            self.stats["done"] += 1
+            self.latency.append((started - queued_at, finished - started))
+            self.bot.logger.info(
+                f"Background compaction for #{channel.name} took {finished - started:.1f}s "
+                f"(waited {started - queued_at:.1f}s)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Keep the old cache; the next check will try again
+            self.stats["failed"] += 1
+            self.bot.logger.error(f"Background compaction failed for #{channel.name}: {e}")
+        finally:
+            self._running.discard(channel_id)
+            self._jobs.pop(channel_id, None)
+            tracked.new_tokens = 0
+
+    def describe(self) -> str:
+        """One-line summary for !claistatus."""
+        line = (f"Compactor: {len(self._running)} running, {self.queue_depth} queued | "
+                f"{self.stats['done']} done, {self.stats['failed']} failed, "
+                f"{self.stats['joined']} joined")
+        if self.latency:
+            waits = sorted(w for w, _ in self.latency)
+            runs = sorted(r for _, r in self.latency)
+            line += (f" | run p50 {runs[len(runs) // 2]:.1f}s max {runs[-1]:.1f}s"
+                     f", wait p50 {waits[len(waits) // 2]:.1f}s")
+        return line
+
+
+# Dummy setup since it's not a cog but an extra module used by one
+async def setup(bot):
+    pass
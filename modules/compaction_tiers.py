@@ -0,0 +1,164 @@
+"""Tiered compaction summaries.
+
+A channel's compaction summary is a list of segments, oldest first, each
+summarizing one span of the log at one of three tiers:
+
+  hour  the overflow that aged out of the raw window since the last run
+  day   one UTC day, rolled up from its hour segments once the day is over
+  week  one week, rolled up from its day segments once the week is over
+
+Re-compaction only summarizes the new overflow (split at UTC midnights)
+and then folds finished hours/days into the tier above; older segments
+are never rebuilt from the raw log. Segments whose span has fully left the
+compact_days window are dropped. The segments are stored as JSON in
+compaction_cache.segments; summary_text holds the rendered result that
+goes into prompts.
+"""
+
+import json
+from datetime import datetime, timezone
+
+HOUR, DAY, WEEK = "hour", "day", "week"
+TIERS = (HOUR, DAY, WEEK)
+TIER_SPAN = {DAY: 86400, WEEK: 7 * 86400}
+DISCORD_EPOCH = 1420070400000  # same as ContextGatherer.DISCORD_EPOCH
+
+MIN_SEGMENT_TOKENS = 200    # smallest summary budget for any segment
+MIN_NEW_TOKENS = 1000       # overflow below this waits in the raw window
+COMPRESSION = 10            # at least this many raw tokens per summary token
+ROLLUP_KEEP = 0.6           # a roll-up asks for at most this fraction of its inputs
+MAX_ROLLUPS = 8             # merge calls per compaction run
+
+
+def _ts(snowflake: int) -> float:
+    return ((snowflake >> 22) + DISCORD_EPOCH) / 1000
+
+
+class Segment:
+    """One summarized span of a channel's log."""
+
+    def __init__(self, tier: str, oldest: int, newest: int, summary: str, tokens: int):
+        self.tier = tier
+        self.oldest = oldest        # snowflakes of the first/last message covered
+        self.newest = newest
+        self.summary = summary
+        self.tokens = tokens
+
+    def to_dict(self) -> dict:
+        return {"tier": self.tier, "oldest": self.oldest, "newest": self.newest,
+                "summary": self.summary, "tokens": self.tokens}
+
+    def label(self) -> str:
+        start = datetime.fromtimestamp(_ts(self.oldest), timezone.utc)
+        end = datetime.fromtimestamp(_ts(self.newest), timezone.utc)
+        if start.date() != end.date():
+            return f"{start:%Y-%m-%d} to {end:%Y-%m-%d}"
+        if self.tier == HOUR:
+            return f"{start:%Y-%m-%d %H:%M}–{end:%H:%M} UTC"
+        return f"{end:%Y-%m-%d}"
+
+    def __repr__(self):
+        return f"<Segment {self.tier} {self.label()} {self.tokens}tok>"
+
+
+def load(cache: dict) -> list:
+    """Segments of a compaction_cache row, oldest first.
+
+    Rows written before segments existed hold a single summary; it is
+    treated as one segment at the tier that matches its span.
+    """
+    if cache.get("segments"):
+        return [Segment(**s) for s in json.loads(cache["segments"])]
+    span = _ts(cache["newest_snowflake"]) - _ts(cache["oldest_snowflake"])
+    tier = WEEK if span > TIER_SPAN[DAY] else DAY
+    return [Segment(tier, cache["oldest_snowflake"], cache["newest_snowflake"],
+                    cache["summary_text"], cache["token_count"] or 0)]
+
+
+def dump(segments: list) -> str:
+    return json.dumps([s.to_dict() for s in segments])
+
+
+def render(segments: list) -> str:
+    """Summary text for prompts: each segment under its date heading."""
+    return "\n\n".join(f"[{s.label()}]\n{s.summary}" for s in segments)
+
+
+def describe(segments: list) -> str:
+    """Tier counts for !claistatus, e.g. `1 week, 5 day, 2 hour`."""
+    counts = {tier: 0 for tier in reversed(TIERS)}
+    for s in segments:
+        counts[s.tier] += 1
+    return ", ".join(f"{n} {tier}" for tier, n in counts.items() if n)
+
+
+def expire(segments: list, window_start: int) -> list:
+    """Drop segments that lie entirely before the compact_days window."""
+    return [s for s in segments if s.newest > window_start]
+
+
+def day_chunks(snowflakes: list, start: int, end: int, now: float) -> list:
+    """Split snowflakes[start:end] at UTC midnights.
+
+    Returns (tier, start, end) index ranges: DAY for finished days, HOUR
+    for the current day (it rolls up with later hour segments).
+    """
+    chunks = []
+    while start < end:
+        day = int(_ts(snowflakes[start]) // TIER_SPAN[DAY])
+        day_end = (day + 1) * TIER_SPAN[DAY]
+        stop = start + 1
+        while stop < end and _ts(snowflakes[stop]) < day_end:
+            stop += 1
+        chunks.append((DAY if day_end <= now else HOUR, start, stop))
+        start = stop
+    return chunks
+
+
+def budget(tokens_in: int, oldest: int, newest: int, compact_max_tokens: int,
+           compact_days: int, keep: float = 1 / COMPRESSION) -> int:
+    """Summary size to ask for when summarizing a span.
+
+    Each segment gets the share of compact_max_tokens that its time span is
+    of the compact_days window, so a full window of segments adds up to
+    about compact_max_tokens, but never more than keep x its input.
+    """
+    span = max(_ts(newest) - _ts(oldest), 3600)
+    share = compact_max_tokens * span / (compact_days * TIER_SPAN[DAY])
+    return int(max(MIN_SEGMENT_TOKENS, min(tokens_in * keep, share, compact_max_tokens)))
+
+
+def next_rollup(segments: list, now: float, max_tokens: int):
+    """The next merge to run, as (tier, first_index, end_index), or None.
+
+    Finished days and weeks come first: consecutive lower-tier segments
+    whose newest message falls in the same finished day (week) become one
+    day (week) segment. Otherwise, while the total is over max_tokens, the
+    two oldest segments are merged.
+    """
+    for tier in (DAY, WEEK):
+        rank = TIERS.index(tier)
+        span = TIER_SPAN[tier]
+        i = 0
+        while i < len(segments):
+            seg = segments[i]
+            bucket = int(_ts(seg.newest) // span)
+            if TIERS.index(seg.tier) >= rank or (bucket + 1) * span > now:
+                i += 1
+                continue
+            j = i + 1
+            while (j < len(segments) and TIERS.index(segments[j].tier) < rank
+                   and int(_ts(segments[j].newest) // span) == bucket):
+                j += 1
+            return tier, i, j
+    if len(segments) > 1 and sum(s.tokens for s in segments) > max_tokens:
+        tier = max((s.tier for s in segments[:2]), key=TIERS.index)
+        if _ts(segments[1].newest) - _ts(segments[0].oldest) > TIER_SPAN[DAY]:
+            tier = WEEK
+        return tier, 0, 2
+    return None
+
+
+# Dummy setup since it's not a cog but an extra module used by one
+async def setup(bot):
+    pass
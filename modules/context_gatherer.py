@@ -3,8 +3,8 @@
 This module provides shared context-gathering functionality for commands like !clai, !sclai, and !glm.
 """
 
-import aiohttp
 import asyncio
+import bisect
 import io
 import re
 import time
@@ -16,7 +16,115 @@ try:
 except ImportError:
     HAS_PIL = False
 
+from modules import compaction_tiers as tiers
 from modules.ai_cache import AICache
+from modules.compaction_scheduler import CompactionScheduler
+from modules.singleflight import SingleFlight
+from modules.llm_providers import COMPACTION_TIMEOUT
+
+
+def _format_line(row, bot_user_id: int):
+    """One message row as it appears in the prompt, or None if it has no text.
+
+    Same format as gather_channel_context.
+
+    Bot messages have their 🔧 debug header stripped so it doesn't echo back;
+    a bot message that was only a debug header is dropped.
+    """
+    user_id, canon_nick, message = row[0], row[1], row[2]
+    if user_id != bot_user_id:
+        return f"{canon_nick} (<@{user_id}>): {message}"
+    lines = [l for l in message.split("\n") if not l.lstrip("-# ").startswith("🔧")]
+    message = "\n".join(lines).strip()
+    if not message:
+        return None
+    return f"[BOT] {canon_nick} (<@{user_id}>): {message}"
+
+
+class MessageWindow:
+    """Message rows formatted once, with a running token count.
+
+    Rows are (user_id, canon_nick, message, snowflake) in snowflake order.
+    Each row is formatted and token-counted once; after that, the token
+    count of any slice, trimming to a budget and splitting at a snowflake
+    are bisects over the cumulative arrays, and text is only joined for
+    the slice that actually goes into a prompt.
+
+    Token counts are per message (line plus its newline), so a slice's
+    count can differ from counting its joined text by a token or so per
+    message. Budgets apply the tokenizer's safety margin (1.2x for the
+    len/4 heuristic).
+
+    In the bot use build(), which counts uncached text off the event loop.
+    """
+
+    def __init__(self, rows, bot_user_id: int, tokenizer):
+        self._format(rows, bot_user_id, tokenizer)
+        self._accumulate(tokenizer.count_many(self._texts()))
+
+    @classmethod
+    async def build(cls, rows, bot_user_id: int, tokenizer) -> "MessageWindow":
+        """MessageWindow(rows, bot_user_id, tokenizer) for use on the event loop."""
+        window = cls.__new__(cls)
+        window._format(rows, bot_user_id, tokenizer)
+        window._accumulate(await tokenizer.count_many_async(window._texts()))
+        return window
+
+    def _format(self, rows, bot_user_id: int, tokenizer):
+        self.rows = rows
+        self.lines = [_format_line(row, bot_user_id) for row in rows]
+        self.snowflakes = [row[3] for row in rows]
+        self.margin = tokenizer.margin
+
+    def _texts(self):
+        return [l + "\n" for l in self.lines if l is not None]
+
+    def _accumulate(self, counts):
+        counts = iter(counts)
+        # cum[i] = tokens in rows[:i]
+        self.cum = [0] * (len(self.rows) + 1)
+        total = 0
+        for i, line in enumerate(self.lines):
+            if line is not None:
+                total += next(counts)
+            self.cum[i + 1] = total
+
+    def __len__(self):
+        return len(self.rows)
+
+    def tokens(self, start: int = 0, end: int = None) -> int:
+        """Estimated tokens in rows[start:end]."""
+        if end is None:
+            end = len(self.rows)
+        return self.cum[end] - self.cum[start]
+
+    def split(self, snowflake: int, start: int = 0, end: int = None) -> int:
+        """Index of the first row in [start, end) newer than snowflake."""
+        if end is None:
+            end = len(self.rows)
+        return bisect.bisect_right(self.snowflakes, snowflake, start, end)
+
+    def take(self, max_tokens: int, start: int = 0) -> int:
+        """Largest index j > start such that rows[start:j] fits max_tokens.
+
+        Always takes at least one row. Same margin as trim().
+        """
+        j = bisect.bisect_right(self.cum, self.cum[start] + max_tokens / self.margin, start) - 1
+        return min(len(self.rows), max(j, start + 1))
+
+    def trim(self, max_tokens: int, start: int = 0, end: int = None) -> int:
+        """Smallest index i >= start such that rows[i:end] fits max_tokens.
+
+        Applies the tokenizer's safety margin on token estimates.
+        """
+        if end is None:
+            end = len(self.rows)
+        target = self.cum[end] - max_tokens / self.margin
+        return bisect.bisect_left(self.cum, target, start, end)
+
+    def text(self, start: int = 0, end: int = None) -> str:
+        """rows[start:end] joined into prompt text."""
+        return "\n".join(l for l in self.lines[start:end] if l is not None)
 
 
 class ContextGatherer:
@@ -32,9 +140,14 @@ class ContextGatherer:
     def __init__(self, bot, ai_cache: AICache, provider):
         self.bot = bot
         self.ai_cache = ai_cache
-        # provider is used for estimate_tokens() only — all providers use the
-        # same len(text)//4 heuristic, so it doesn't matter which is passed.
+        # provider is used for estimate_tokens() and its shared HTTP client —
+        # the Copilot cog gives all providers the same tokenizer, so it
+        # doesn't matter which is passed.
         self.provider = provider
+        # Compaction runs in the background; requests only read the cache
+        self.scheduler = CompactionScheduler(bot, self)
+        # One compaction (or rebuild) per channel at a time, whoever asks
+        self.compactions = SingleFlight()
 
     def resolve_mentions(self, ctx, text: str) -> str:
         """Replace Discord mention IDs with display names"""
@@ -111,19 +224,19 @@ class ContextGatherer:
             return ""
 
         logger_cog = self.bot.cogs['Logger']
-        db = await logger_cog.get_db(ctx.guild)
 
         context_parts = []
         for user in mentioned:
-            cursor = await db.execute(
-                """SELECT u.canon_nick, m.message FROM messages m
-                   JOIN users u ON m.user_id = u.user_id
-                   WHERE m.user_id = ? AND m.channel_id = ? AND m.message != '' AND m.deleted = 0
-                   ORDER BY m.snowflake DESC
-                   LIMIT ?""",
-                [user.id, ctx.channel.id, max_msgs_per_user]
-            )
-            rows = await cursor.fetchall()
+            async with logger_cog.reader(ctx.guild) as db:
+                cursor = await db.execute(
+                    """SELECT u.canon_nick, m.message FROM messages m
+                       JOIN users u ON m.user_id = u.user_id
+                       WHERE m.user_id = ? AND m.channel_id = ? AND m.message != '' AND m.deleted = 0
+                       ORDER BY m.snowflake DESC
+                       LIMIT ?""",
+                    [user.id, ctx.channel.id, max_msgs_per_user]
+                )
+                rows = await cursor.fetchall()
 
             if rows:
                 # Use canon_nick from DB, rows are (canon_nick, message)
@@ -146,7 +259,6 @@ class ContextGatherer:
             return ""
 
         logger_cog = self.bot.cogs['Logger']
-        db = await logger_cog.get_db(ctx.guild)
 
         # Discord snowflake epoch is 1420070400000 (Jan 1, 2015)
         # Calculate the snowflake for N hours ago
@@ -156,15 +268,16 @@ class ContextGatherer:
         bot_user_id = self.bot.user.id
 
         # Include all messages (including bot's own for continuity)
-        cursor = await db.execute(
-            """SELECT m.user_id, u.canon_nick, m.message FROM messages m
-               JOIN users u ON m.user_id = u.user_id
-               WHERE m.channel_id = ? AND m.snowflake > ? AND m.message != ''
-               AND m.deleted = 0 AND m.ephemeral = 0
-               ORDER BY m.snowflake ASC""",
-            [ctx.channel.id, cutoff_snowflake]
-        )
-        rows = await cursor.fetchall()
+        async with logger_cog.reader(ctx.guild) as db:
+            cursor = await db.execute(
+                """SELECT m.user_id, u.canon_nick, m.message FROM messages m
+                   JOIN users u ON m.user_id = u.user_id
+                   WHERE m.channel_id = ? AND m.snowflake > ? AND m.message != ''
+                   AND m.deleted = 0 AND m.ephemeral = 0
+                   ORDER BY m.snowflake ASC""",
+                [ctx.channel.id, cutoff_snowflake]
+            )
+            rows = await cursor.fetchall()
 
         if not rows:
             return ""
@@ -191,56 +304,61 @@ class ContextGatherer:
 
         Returns list of (user_id, canon_nick, message, snowflake) tuples.
         """
+        return await self._fetch_channel_messages(ctx.channel, start_snowflake, end_snowflake)
+
+    async def _fetch_channel_messages(self, channel, start_snowflake: int,
+                                      end_snowflake: int | None = None) -> list:
+        """_fetch_messages_range() for a channel object (no ctx needed)."""
         if "Logger" not in self.bot.cogs:
             return []
 
         logger_cog = self.bot.cogs['Logger']
-        db = await logger_cog.get_db(ctx.guild)
 
-        if end_snowflake is not None:
-            cursor = await db.execute(
-                """SELECT m.user_id, u.canon_nick, m.message, m.snowflake FROM messages m
-                   JOIN users u ON m.user_id = u.user_id
-                   WHERE m.channel_id = ? AND m.snowflake > ? AND m.snowflake <= ?
-                   AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
-                   ORDER BY m.snowflake ASC""",
-                [ctx.channel.id, start_snowflake, end_snowflake],
-            )
-        else:
-            cursor = await db.execute(
-                """SELECT m.user_id, u.canon_nick, m.message, m.snowflake FROM messages m
-                   JOIN users u ON m.user_id = u.user_id
-                   WHERE m.channel_id = ? AND m.snowflake > ?
-                   AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
-                   ORDER BY m.snowflake ASC""",
-                [ctx.channel.id, start_snowflake],
-            )
-        return await cursor.fetchall()
-
-    def _format_messages(self, rows, bot_user_id: int) -> str:
-        """Format message rows into text (same format as gather_channel_context)."""
-        msgs = []
-        for row in rows:
-            user_id, canon_nick, message = row[0], row[1], row[2]
-            # Strip debug header from bot messages so it doesn't echo back
-            if user_id == bot_user_id:
-                lines = message.split("\n")
-                lines = [l for l in lines if not l.lstrip("-# ").startswith("🔧")]
-                message = "\n".join(lines).strip()
-                if not message:
-                    continue
-                msgs.append(f"[BOT] {canon_nick} (<@{user_id}>): {message}")
+        async with logger_cog.reader(channel.guild) as db:
+            if end_snowflake is not None:
+                cursor = await db.execute(
+                    """SELECT m.user_id, u.canon_nick, m.message, m.snowflake FROM messages m
+                       JOIN users u ON m.user_id = u.user_id
+                       WHERE m.channel_id = ? AND m.snowflake > ? AND m.snowflake <= ?
+                       AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
+                       ORDER BY m.snowflake ASC""",
+                    [channel.id, start_snowflake, end_snowflake],
+                )
             else:
-                msgs.append(f"{canon_nick} (<@{user_id}>): {message}")
-        return "\n".join(msgs)
+                cursor = await db.execute(
+                    """SELECT m.user_id, u.canon_nick, m.message, m.snowflake FROM messages m
+                       JOIN users u ON m.user_id = u.user_id
+                       WHERE m.channel_id = ? AND m.snowflake > ?
+                       AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
+                       ORDER BY m.snowflake ASC""",
+                    [channel.id, start_snowflake],
+                )
+            return await cursor.fetchall()
+
+    async def _window(self, rows, bot_user_id: int) -> MessageWindow:
+        """Format rows once for budgeting with this provider's token estimate."""
+        return await MessageWindow.build(rows, bot_user_id, self.provider.tokenizer)
 
     async def _do_compaction(self, ctx, messages_text: str, compact_max_tokens: int,
-                             compact_model: str, token, base_url) -> tuple:
+                             compact_model: str, token, base_url, merge: bool = False) -> tuple:
         """Call the compact_model to summarize messages.
 
+        With merge=True, messages_text is a run of dated summaries to be
+        combined into one (a tier roll-up) rather than raw messages.
         Returns (summary_text, input_tokens, output_tokens) or raises on failure.
         """
-        system_prompt = f"""Summarize the following Discord conversation thoroughly. Aim for around {compact_max_tokens} tokens. Preserve:
+        if merge:
+            system_prompt = f"""Combine the following consecutive summaries of a Discord conversation (oldest first, each under its date) into a single summary. Aim for around {compact_max_tokens} tokens. Preserve:
+- Key facts, decisions, and conclusions, and roughly when they happened
+- Specific names, numbers, dates, URLs, and technical details
+- Important context about users and their preferences
+- Your own previous responses and positions (marked with [BOT])
+
+Where a later summary updates or contradicts an earlier one, keep the later state. Drop detail that no longer matters.
+
+This summary replaces the ones below and is the only record of what was discussed."""
+        else:
+            system_prompt = f"""Summarize the following Discord conversation thoroughly. Aim for around {compact_max_tokens} tokens. Preserve:
 - Key facts, decisions, and conclusions
 - Specific names, numbers, dates, URLs, and technical details
 - Important context about users and their preferences
@@ -270,16 +388,17 @@ Be detailed — this summary replaces the original messages and is the only reco
             "max_tokens": compact_max_tokens + 200,  # small buffer
         }
 
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
-            async with session.post(
-                f"{base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(f"Compaction API error: {resp.status} - {error_text[:200]}")
-                data = await resp.json()
+        async with self.provider.http.request(
+            "POST",
+            f"{base_url}/chat/completions",
+            headers=headers,
+            json=payload,
+            timeout=COMPACTION_TIMEOUT,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"Compaction API error: {resp.status} - {error_text[:200]}")
+            data = await resp.json()
 
         summary = data["choices"][0]["message"]["content"]
         usage = data.get("usage", {})
@@ -289,38 +408,227 @@ Be detailed — this summary replaces the original messages and is the only reco
 
         return summary, input_tokens, output_tokens, cached_tokens
 
-    def _trim_messages_to_budget(self, msgs: list, bot_user_id: int, max_tokens: int) -> list:
-        """Trim oldest messages until formatted output fits within max_tokens.
+    def _context_limits(self, settings: dict) -> tuple[int, int]:
+        """(max_context_tokens, max_compaction_input) for this provider/settings."""
+        # Use provider-specific context limits if available, otherwise fall back to settings
+        max_context = getattr(self.provider, 'max_context_tokens', None) or settings.get("max_context_tokens", 20000)
+        max_input = getattr(self.provider, 'max_compaction_input', None) or settings.get("max_compaction_input", 120000)
+        return max_context, max_input
+
+    async def measure_overflow(self, channel, cache: dict, settings: dict) -> int:
+        """Tokens logged since the cached summary that are older than the raw window.
+
+        This is what triggers re-compaction: the raw window always stretches
+        back to the compaction boundary, so only what has aged past
+        raw_hours counts.
+        """
+        bot_user_id = self.bot.user.id
+        raw_window_start = self._ts_to_snowflake(time.time() - settings["raw_hours"] * 3600)
+        # Same measure as the foreground warm path: trim the raw window, then
+        # count what's older than raw_hours
+        raw = await self._window(
+            await self._fetch_channel_messages(channel, cache["newest_snowflake"]), bot_user_id)
+        start = raw.trim(settings.get("raw_max_tokens", 5000))
+        return raw.tokens(start, raw.split(raw_window_start, start))
+
+    def segments_due(self, cache: dict, settings: dict) -> bool:
+        """Whether a cached summary has segments to expire or roll up."""
+        segments = tiers.load(cache)
+        now = time.time()
+        compact_window_start = self._ts_to_snowflake(now - settings["compact_days"] * 86400)
+        return (segments[0].newest <= compact_window_start
+                or tiers.next_rollup(segments, now, settings["compact_max_tokens"]) is not None)
+
+    async def compact_channel(self, channel, settings: dict, token, base_url,
+                              compact_model: str = None) -> tuple | None:
+        """Bring a channel's tiered compaction summary up to date.
+
+        Used by the background CompactionScheduler (and safe to call directly).
+        With no cache, the compact_days history older than raw_hours is
+        summarized into day segments. With a cache, only the overflow
+        logged since it was built is summarized, then segments that left
+        the compact_days window are dropped and finished days/weeks rolled
+        up; the raw log behind older segments is never re-read. See
+        compaction_tiers.
+
+        Returns (summary, compacted_msg_count), or None if there was
+        nothing worth doing. Raises on API failure, leaving any existing
+        cache in place. Concurrent calls for a channel share one run.
+        """
+        result, _ = await self.compactions.do(channel.id, lambda: self._compact_channel(
+            channel, settings, token, base_url, compact_model))
+        return result
+
+    async def rebuild_channel(self, channel, settings: dict, token, base_url,
+                              compact_model: str = None) -> tuple | None:
+        """Drop a channel's compaction cache and build it again from the log.
+
+        Waits for a compaction already running in the channel so it can't
+        write its result over the rebuild; compactions requested meanwhile
+        join the rebuild. Returns what compact_channel() does.
+        """
+        async def rebuild():
+            await self.ai_cache.delete_cache(channel.id)
+            return await self._compact_channel(channel, settings, token, base_url, compact_model)
+        return await self.compactions.do_after(channel.id, rebuild)
+
+    async def _compact_channel(self, channel, settings: dict, token, base_url,
+                               compact_model: str = None) -> tuple | None:
+        if not compact_model:
+            compact_model = settings["compact_model"]
+
+        now = time.time()
+        compact_window_start = self._ts_to_snowflake(now - settings["compact_days"] * 86400)
+        raw_window_start = self._ts_to_snowflake(now - settings["raw_hours"] * 3600)
+
+        cache = await self.ai_cache.get_cache(channel.id)
+        if cache is None:
+            older_msgs = await self._fetch_channel_messages(channel, compact_window_start, raw_window_start)
+            result = await self._compact_cold(channel, older_msgs, settings, compact_model, token, base_url)
+            if result is None:
+                return None
+            segments, count = result
+        else:
+            segments = tiers.expire(tiers.load(cache), compact_window_start)
+            since = max(cache["newest_snowflake"], compact_window_start)
+            new = await self._window(
+                await self._fetch_channel_messages(channel, since, raw_window_start), self.bot.user.id)
+            count = 0
+            if new.tokens() >= tiers.MIN_NEW_TOKENS:
+                segments += await self._summarize_new(
+                    channel, new, 0, now, settings, compact_model, token, base_url)
+                count = len(new)
+            segments = await self._roll_up(channel, segments, now, settings,
+                                           compact_model, token, base_url)
+            if not segments:
+                # Everything aged out and nothing new: the channel is cold again
+                await self.ai_cache.delete_cache(channel.id)
+                return None
+            if not count and tiers.dump(segments) == cache["segments"]:
+                return None
+
+        return await self._store_segments(channel, segments, compact_model), count
+
+    async def _store_segments(self, channel, segments: list, compact_model: str) -> str:
+        """Write segments to the compaction cache. Returns the rendered summary."""
+        summary = tiers.render(segments)
+        await self.ai_cache.set_cache(
+            channel.id, channel.guild.id, segments[0].oldest, segments[-1].newest,
+            summary, compact_model, token_count=self.provider.estimate_tokens(summary),
+            segments=tiers.dump(segments))
+        return summary
+
+    async def _compact_cold(self, channel, older_msgs: list, settings: dict, compact_model: str,
+                            token, base_url) -> tuple | None:
+        """Summarize a channel with no cache into day segments.
+
+        older_msgs is the history between compact_days and raw_hours ago.
+        Returns (segments, compacted_msg_count), or None if there was too
+        little to be worth compacting.
+        """
+        if not older_msgs:
+            return None
+        _, max_compaction_input = self._context_limits(settings)
+
+        older = await self._window(older_msgs, self.bot.user.id)
+        start = 0
+        # Truncate older history if it exceeds compaction model's context limit
+        if older.tokens() > max_compaction_input:
+            start = older.trim(max_compaction_input)
+        if older.tokens(start) < settings["compact_max_tokens"]:
+            # Too small to bother compacting
+            return None
 
-        Uses binary search on message count for efficiency. Applies a 1.2x
-        safety margin on token estimates since estimate_tokens (len/4) can
-        undercount by 20-30% on code, URLs, or non-English text.
+        now = time.time()
+        segments = await self._summarize_new(
+            channel, older, start, now, settings, compact_model, token, base_url)
+        segments = await self._roll_up(channel, segments, now, settings,
+                                       compact_model, token, base_url)
+        return segments, len(older) - start
+
+    async def _summarize_new(self, channel, window: MessageWindow, start: int, now: float,
+                             settings: dict, compact_model: str, token, base_url) -> list:
+        """Summarize window rows from start on into new segments.
+
+        One segment per UTC day (hour tier for today, which is still
+        growing), split further if a day doesn't fit the compaction
+        model's input. The calls run concurrently.
         """
-        text = self._format_messages(msgs, bot_user_id)
-        if self.provider.estimate_tokens(text) * 1.2 <= max_tokens:
-            return msgs
-
-        # Binary search: find minimum messages to drop from front
-        lo, hi = 0, len(msgs)
-        while lo < hi:
-            mid = (lo + hi) // 2
-            if self.provider.estimate_tokens(self._format_messages(msgs[mid:], bot_user_id)) * 1.2 <= max_tokens:
-                hi = mid
+        _, max_compaction_input = self._context_limits(settings)
+        spans = []
+        for tier, i, j in tiers.day_chunks(window.snowflakes, start, len(window), now):
+            while i < j:
+                k = min(window.take(max_compaction_input, i), j)
+                if window.tokens(i, k):
+                    spans.append((tier, i, k))
+                i = k
+        return list(await asyncio.gather(*(
+            self._summarize_span(channel, window, i, j, tier, settings, compact_model, token, base_url)
+            for tier, i, j in spans)))
+
+    async def _summarize_span(self, channel, window: MessageWindow, start: int, end: int,
+                              tier: str, settings: dict, compact_model: str,
+                              token, base_url) -> tiers.Segment:
+        """Summarize window rows [start, end) into one segment."""
+        oldest, newest = window.rows[start][3], window.rows[end - 1][3]
+        budget = tiers.budget(window.tokens(start, end), oldest, newest,
+                              settings["compact_max_tokens"], settings["compact_days"])
+        summary = await self._compact_text(channel, window.text(start, end), budget,
+                                           compact_model, token, base_url)
+        return tiers.Segment(tier, oldest, newest, summary, self.provider.estimate_tokens(summary))
+
+    async def _roll_up(self, channel, segments: list, now: float, settings: dict,
+                       compact_model: str, token, base_url) -> list:
+        """Fold finished days/weeks into the tier above, and merge the
+        oldest segments while the total is over compact_max_tokens."""
+        compact_max_tokens = settings["compact_max_tokens"]
+        merges = 0
+        while merges < tiers.MAX_ROLLUPS:
+            step = tiers.next_rollup(segments, now, compact_max_tokens)
+            if step is None:
+                break
+            tier, i, j = step
+            group = segments[i:j]
+            oldest, newest = group[0].oldest, group[-1].newest
+            if len(group) == 1:
+                # Nothing to merge, it just moves up a tier
+                merged = tiers.Segment(tier, oldest, newest, group[0].summary, group[0].tokens)
             else:
-                lo = mid + 1
-        return msgs[lo:]
+                budget = tiers.budget(sum(s.tokens for s in group), oldest, newest,
+                                      compact_max_tokens, settings["compact_days"],
+                                      keep=tiers.ROLLUP_KEEP)
+                summary = await self._compact_text(channel, tiers.render(group), budget,
+                                                   compact_model, token, base_url, merge=True)
+                merged = tiers.Segment(tier, oldest, newest, summary,
+                                       self.provider.estimate_tokens(summary))
+                merges += 1
+            segments = segments[:i] + [merged] + segments[j:]
+        return segments
+
+    async def _compact_text(self, channel, text: str, budget: int, compact_model: str,
+                            token, base_url, merge: bool = False) -> str:
+        """One compaction call, logged to usage_log. Returns the summary."""
+        summary, in_tok, out_tok, cached_comp = await self._do_compaction(
+            channel, text, budget, compact_model, token, base_url, merge=merge)
+        await self.ai_cache.log_usage(
+            channel.id, channel.guild.id, "compaction",
+            in_tok, out_tok, compact_model,
+            cached_tokens=cached_comp)
+        return summary
 
     async def _build_compacted_context(self, ctx, settings: dict, token, base_url,
                                        compact_model: str = None) -> str:
         """Build context for !clai using compaction.
 
         Returns the context string (summary + raw messages) to use in the prompt.
-        Sets self._last_compaction to 'recompact', 'cold', or None.
+        Never waits on a compaction call: a cold cache, or one past its
+        re-compaction threshold, is handed to the background scheduler and
+        this request uses what is there now. Sets self._last_compaction to
+        'queued' when that happened, or None.
         """
         self._last_compaction = None
 
         bot_user_id = self.bot.user.id
-        guild_id = ctx.guild.id
         channel_id = ctx.channel.id
 
         compact_days = settings["compact_days"]
@@ -328,12 +636,17 @@ Be detailed — this summary replaces the original messages and is the only reco
         raw_max_tokens = settings.get("raw_max_tokens", 5000)
         compact_max_tokens = settings["compact_max_tokens"]
         recompact_raw_tokens = settings["recompact_raw_tokens"]
-        if not compact_model:
+
+        # Remember how to compact this channel so the scheduler can keep it warm
+        if compact_model:
+            async def auth():
+                return token, base_url
+        else:
             compact_model = settings["compact_model"]
+            auth = self.provider.get_auth
+        self.scheduler.track(ctx.channel, settings, compact_model, auth)
 
-        # Use provider-specific context limits if available, otherwise fall back to settings
-        MAX_CONTEXT_TOKENS = getattr(self.provider, 'max_context_tokens', None) or settings.get("max_context_tokens", 20000)
-        MAX_COMPACTION_INPUT = getattr(self.provider, 'max_compaction_input', None) or settings.get("max_compaction_input", 120000)
+        MAX_CONTEXT_TOKENS, MAX_COMPACTION_INPUT = self._context_limits(settings)
 
         now = time.time()
         compact_window_start = self._ts_to_snowflake(now - compact_days * 86400)
@@ -345,152 +658,53 @@ Be detailed — this summary replaces the original messages and is the only reco
             # ── Warm cache ──
             newest_snowflake = cache["newest_snowflake"]
             # Raw window stretches back to compaction boundary (never gaps)
-            raw_msgs = await self._fetch_messages_range(ctx, newest_snowflake)
+            raw = await self._window(await self._fetch_messages_range(ctx, newest_snowflake), bot_user_id)
             # Trim raw messages to token budget
-            raw_msgs = self._trim_messages_to_budget(raw_msgs, bot_user_id, raw_max_tokens)
-            raw_text = self._format_messages(raw_msgs, bot_user_id)
-            raw_tokens = self.provider.estimate_tokens(raw_text)
+            start = raw.trim(raw_max_tokens)
+            raw_text = raw.text(start)
 
             # Check re-compaction trigger — token-only, no time component.
             # Only count tokens BEYOND the configured raw_hours window — the raw
             # window always stretches back to the compaction boundary, so in a busy
             # channel it can be large even right after compaction ran.
-            overflow_msgs = [m for m in raw_msgs if m[3] <= raw_window_start]
-            overflow_tokens = self.provider.estimate_tokens(self._format_messages(overflow_msgs, bot_user_id)) if overflow_msgs else 0
+            overflow_tokens = raw.tokens(start, raw.split(raw_window_start, start))
             self._overflow_tokens = overflow_tokens
             self._recompact_threshold = recompact_raw_tokens
-            # Recompact when overflow exceeds the token threshold
-            needs_recompact = overflow_tokens > recompact_raw_tokens
-
-            if needs_recompact:
-                # Full re-summarization
-                try:
-                    all_msgs = await self._fetch_messages_range(ctx, compact_window_start)
-                    if not all_msgs:
-                        return raw_text
-
-                    # Split: older portion for compaction, recent for raw
-                    older_msgs = [m for m in all_msgs if m[3] <= raw_window_start]
-                    recent_msgs = self._trim_messages_to_budget(
-                        [m for m in all_msgs if m[3] > raw_window_start], bot_user_id, raw_max_tokens)
-
-                    if not older_msgs:
-                        # Nothing old enough to compact
-                        return "Recent channel conversation:\n" + self._format_messages(all_msgs, bot_user_id)
-
-                    older_text = self._format_messages(older_msgs, bot_user_id)
-
-                    # Truncate older text if it exceeds compaction model's context limit
-                    if self.provider.estimate_tokens(older_text) > MAX_COMPACTION_INPUT:
-                        older_msgs = self._trim_messages_to_budget(older_msgs, bot_user_id, MAX_COMPACTION_INPUT)
-                        older_text = self._format_messages(older_msgs, bot_user_id)
-
-                    if self.provider.estimate_tokens(older_text) < compact_max_tokens:
-                        # Too small to bother compacting
-                        return "Recent channel conversation:\n" + self._format_messages(all_msgs, bot_user_id)
-
-                    summary, in_tok, out_tok, cached_comp = await self._do_compaction(
-                        ctx, older_text, compact_max_tokens, compact_model, token, base_url)
-                    self._last_compaction = 'recompact'
-                    # Log compaction usage
-                    await self.ai_cache.log_usage(
-                        channel_id, guild_id, "compaction",
-                        in_tok, out_tok, compact_model,
-                        cached_tokens=cached_comp)
-
-                    # Update cache
-                    newest_older = older_msgs[-1][3]
-                    oldest_older = older_msgs[0][3]
-                    await self.ai_cache.set_cache(
-                        channel_id, guild_id, oldest_older, newest_older,
-                        summary, compact_model)
-
-                    recent_text = self._format_messages(recent_msgs, bot_user_id)
-                    parts = [f"[Conversation summary — last {compact_days} days]\n{summary}"]
-                    if recent_text:
-                        parts.append(f"Recent channel conversation:\n{recent_text}")
-                    return "\n\n".join(parts)
-
-                except Exception as e:
-                    # Keep old cache, skip re-compaction this round
-                    self.bot.logger.error(f"Re-compaction failed for #{ctx.channel.name}: {e}")
-                    summary = cache["summary_text"]
-                    parts = [f"[Conversation summary]\n{summary}"]
-                    if raw_text:
-                        parts.append(f"Recent channel conversation:\n{raw_text}")
-                    return "\n\n".join(parts)
-
-            else:
-                # Warm cache, no re-compaction needed
-                summary = cache["summary_text"]
-
-                parts = [f"[Conversation summary]\n{summary}"]
-                if raw_text:
-                    parts.append(f"Recent channel conversation:\n{raw_text}")
-                return "\n\n".join(parts)
-
-        else:
-            # ── Cold cache ──
-            all_msgs = await self._fetch_messages_range(ctx, compact_window_start)
-            if not all_msgs:
-                return ""
-
-            all_text = self._format_messages(all_msgs, bot_user_id)
-
-            if self.provider.estimate_tokens(all_text) < compact_max_tokens:
-                # Small enough, no compaction needed
-                return "Recent channel conversation:\n" + all_text
-
-            # Split for compaction
-            older_msgs = [m for m in all_msgs if m[3] <= raw_window_start]
-            recent_msgs = self._trim_messages_to_budget(
-                [m for m in all_msgs if m[3] > raw_window_start], bot_user_id, raw_max_tokens)
-
-            if not older_msgs:
-                # Truncate if needed
-                all_msgs = self._trim_messages_to_budget(all_msgs, bot_user_id, MAX_CONTEXT_TOKENS)
-                return "Recent channel conversation:\n" + self._format_messages(all_msgs, bot_user_id)
+            # Recompact in the background; this answer uses the current summary
+            if overflow_tokens > recompact_raw_tokens:
+                if self.scheduler.schedule(channel_id):
+                    self._last_compaction = 'queued'
+
+            summary = cache["summary_text"]
+            parts = [f"[Conversation summary]\n{summary}"]
+            if raw_text:
+                parts.append(f"Recent channel conversation:\n{raw_text}")
+            return "\n\n".join(parts)
+
+        # ── Cold cache ──
+        all_msgs = await self._fetch_messages_range(ctx, compact_window_start)
+        if not all_msgs:
+            return ""
 
-            older_text = self._format_messages(older_msgs, bot_user_id)
+        window = await self._window(all_msgs, bot_user_id)
 
-            # Truncate older text if it exceeds compaction model's context limit
-            if self.provider.estimate_tokens(older_text) > MAX_COMPACTION_INPUT:
-                older_msgs = self._trim_messages_to_budget(older_msgs, bot_user_id, MAX_COMPACTION_INPUT)
-                older_text = self._format_messages(older_msgs, bot_user_id)
+        if window.tokens() < compact_max_tokens:
+            # Small enough, no compaction needed
+            return "Recent channel conversation:\n" + window.text()
 
-            if self.provider.estimate_tokens(older_text) < compact_max_tokens:
-                # Older portion is small, just send everything raw (truncated if needed)
-                all_msgs = self._trim_messages_to_budget(all_msgs, bot_user_id, MAX_CONTEXT_TOKENS)
-                return "Recent channel conversation:\n" + self._format_messages(all_msgs, bot_user_id)
+        split = window.split(raw_window_start)
+        if split:
+            older_start = 0
+            # Same cap compact_channel() applies before deciding it's worth it
+            if window.tokens(0, split) > MAX_COMPACTION_INPUT:
+                older_start = window.trim(MAX_COMPACTION_INPUT, 0, split)
+            if window.tokens(older_start, split) >= compact_max_tokens:
+                # Worth summarizing: build the cache in the background
+                if self.scheduler.schedule(channel_id):
+                    self._last_compaction = 'queued'
 
-            try:
-                summary, in_tok, out_tok, cached_comp = await self._do_compaction(
-                    ctx, older_text, compact_max_tokens, compact_model, token, base_url)
-                self._last_compaction = 'cold'
-                # Log compaction
-                await self.ai_cache.log_usage(
-                    channel_id, guild_id, "compaction",
-                    in_tok, out_tok, compact_model,
-                    cached_tokens=cached_comp)
-
-                # Store cache
-                newest_older = older_msgs[-1][3]
-                oldest_older = older_msgs[0][3]
-                await self.ai_cache.set_cache(
-                    channel_id, guild_id, oldest_older, newest_older,
-                    summary, compact_model)
-
-                recent_text = self._format_messages(recent_msgs, bot_user_id)
-                parts = [f"[Conversation summary — last {compact_days} days]\n{summary}"]
-                if recent_text:
-                    parts.append(f"Recent channel conversation:\n{recent_text}")
-                return "\n\n".join(parts)
-
-            except Exception as e:
-                # Cold start failure — just use raw messages, truncated to fit
-                self.bot.logger.error(f"Cold compaction failed for #{ctx.channel.name}: {e}")
-                all_msgs = self._trim_messages_to_budget(all_msgs, bot_user_id, MAX_CONTEXT_TOKENS)
-                return "Recent channel conversation:\n" + self._format_messages(all_msgs, bot_user_id)
+        # Meanwhile send raw messages, truncated to fit
+        return "Recent channel conversation:\n" + window.text(window.trim(MAX_CONTEXT_TOKENS))
 
     async def build_full_context(self, ctx, settings: dict, token: str, base_url: str,
                                 compact_model: str = None, user_prompt: str = None) -> dict:
@@ -586,6 +800,8 @@ RULES:
                     debug_parts.append(f"overflow={self._overflow_tokens}/{self._recompact_threshold}")
             else:
                 stable_prefix_tokens += self.provider.estimate_tokens(channel_context)
+                if getattr(self, '_last_compaction', None):
+                    debug_parts.append(f"⟳{self._last_compaction}")
                 debug_parts.append(f"history={self.provider.estimate_tokens(channel_context)}tok")
 
         if user_context:
@@ -1,22 +1,26 @@
-import aiohttp
 import asyncio
 import base64
-import io
+import collections
+import contextlib
 import json
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urlsplit
 from discord.ext import commands
 import discord
-try:
-    from PIL import Image
-    HAS_PIL = True
-except ImportError:
-    HAS_PIL = False
 from modules.ai_cache import (AICache, SETTINGS_SPEC, SETTINGS_HELP,
                               GLOBAL_SETTINGS, SECRET_SETTINGS)
-from modules.llm_providers import CopilotProvider, OpenAIProvider
+from modules.llm_providers import (CopilotProvider, OpenAIProvider, HTTPClient,
+                                   CallStats, PROBE_TIMEOUT, HeuristicTokenizer,
+                                   load_tokenizer)
 from modules.context_gatherer import ContextGatherer
+from modules.singleflight import SingleFlight
+from modules.image_processing import HAS_PIL, ImagePool
+from modules.image_cache import ImageCache
+from modules import web_content
+from modules import compaction_tiers
 
 BOT_ADMIN_ROLE = "Bot Admin"
 
@@ -37,18 +41,116 @@ async def _check_bot_admin(ctx) -> bool:
 
 _IMAGE_HINT = "\n\nImages from recent chat are included for visual context. Do NOT comment on, describe, or respond to images unless the user is clearly and specifically asking about an image. Focus on the text conversation."
 
+# Streaming replies: Discord allows ~5 edits per 5s per channel, so keep
+# well under that and leave room for everything else the bot posts.
+STREAM_EDIT_INTERVAL = 1.5
+STREAM_CURSOR = " ▌"
+
+# Image lookback: candidate images are fetched concurrently within these limits
+IMAGE_FETCHES = 8           # downloads at once per request
+IMAGE_FETCHES_PER_HOST = 4  # ... to any one host (most are Discord's CDN)
+IMAGE_DEADLINE = 8.0        # seconds; images still loading after this are left out
+
+# !sclai and !sglm for the same question (or two people asking it) within
+# this many seconds share one search and page fetch
+SEARCH_REUSE_SECONDS = 60
+
+
+class _StreamSender:
+    """Posts a streamed answer as soon as text arrives, then edits it in place.
+
+    The first post goes through ctx.send, so MoreContext's edit override
+    (the user edited their command) updates the old reply instead of
+    posting a new one; later updates edit whatever message that returned.
+    """
+
+    def __init__(self, ctx, render, t0: float):
+        self.ctx = ctx
+        self.render = render        # raw answer text -> display text
+        self.t0 = t0
+        self.text = ""
+        self.message = None
+        self.first_visible = None   # seconds from t0 until text was on screen
+        self._last_push = 0.0
+        self._pending = None        # in-flight send/edit
+
+    async def on_delta(self, fragment: str):
+        self.text += fragment
+        if self._pending is not None and not self._pending.done():
+            return
+        if not self.text.strip():
+            return
+        now = time.monotonic()
+        if self.message is not None and now - self._last_push < STREAM_EDIT_INTERVAL:
+            return
+        self._last_push = now
+        # Don't hold up reading the stream on Discord's API
+        self._pending = asyncio.create_task(self._push(self.text))
+
+    async def _push(self, text: str):
+        content = self.render(text)[:1980 - len(STREAM_CURSOR)] + STREAM_CURSOR
+        if self.message is None:
+            self.message = await self.ctx.send(content)
+            self.first_visible = time.monotonic() - self.t0
+        else:
+            await self.message.edit(content=content)
+
+    async def finish(self, content: str):
+        """Replace the in-progress text with the final content (or an error)."""
+        if self._pending is not None:
+            with contextlib.suppress(Exception):
+                await self._pending
+        if self.message is None:
+            self.message = await self.ctx.send(content)
+        else:
+            await self.message.edit(content=content)
+
+
 class Copilot(commands.Cog):
     DISCORD_EPOCH = 1420070400000  # Jan 1, 2015 in ms
 
     def __init__(self, bot):
         self.bot = bot
         self.ai_cache = AICache()
-        self.provider = CopilotProvider(bot)
-        self.glm_provider = OpenAIProvider(bot)
+        # One keep-alive pool for the LLM APIs, compaction, search and image fetches
+        self.http = HTTPClient()
+        # Token counting for context budgets: real BPE counts if a vocab file is configured
+        try:
+            self.tokenizer = load_tokenizer(getattr(bot.config, "tokenizer_vocab_path", None))
+        except Exception as e:
+            bot.logger.error(f"Couldn't load tokenizer vocab, using len/4: {e}")
+            self.tokenizer = HeuristicTokenizer()
+        self.provider = CopilotProvider(bot, http=self.http, tokenizer=self.tokenizer)
+        self.glm_provider = OpenAIProvider(bot, http=self.http, tokenizer=self.tokenizer)
         self.context_gatherer = ContextGatherer(bot, self.ai_cache, self.provider)
+        self.search_flight = SingleFlight(ttl=SEARCH_REUSE_SECONDS)
+        # Image downscaling is CPU-heavy; keep it off the event loop
+        self.image_pool = ImagePool()
+        # Processed images, so follow-up questions don't redo them
+        self.image_cache = ImageCache()
+        # Web search: fetched page text and search results, HTML parsed off the loop
+        self.page_cache = web_content.TTLCache(
+            web_content.PAGE_CACHE_BYTES, web_content.PAGE_TTL, sizeof=lambda item: len(item[0]))
+        self.search_cache = web_content.TTLCache(
+            web_content.SEARCH_CACHE_BYTES, web_content.SEARCH_TTL, sizeof=lambda r: len(repr(r)))
+        self.extract_pool = ThreadPoolExecutor(web_content.EXTRACT_WORKERS,
+                                               thread_name_prefix="page-extract")
+
+    async def cog_load(self):
+        self.context_gatherer.scheduler.start()
 
     def cog_unload(self):
+        asyncio.ensure_future(self.context_gatherer.scheduler.close())
         asyncio.ensure_future(self.ai_cache.close())
+        asyncio.ensure_future(self.http.close())
+        self.image_pool.close()
+        asyncio.ensure_future(self.image_cache.close())
+        self.extract_pool.shutdown(wait=False, cancel_futures=True)
+
+    @commands.Cog.listener()
+    async def on_messages_logged(self, guild_id, chars_by_channel):
+        """Logger flushed new messages; let the compactor check those channels."""
+        self.context_gatherer.scheduler.note_logged(chars_by_channel)
 
     async def get_provider_auth(self):
         """Get authentication from provider.
@@ -62,52 +164,6 @@ class Copilot(commands.Cog):
     MAX_IMAGE_BYTES = 3_500_000  # ~3.5MB raw; base64 is ~33% larger → ~4.7MB (API limit ~5MB)
     MAX_IMAGE_DIMENSION = 2048   # max width or height in pixels
 
-    @staticmethod
-    def _downscale_image(data: bytes, max_bytes: int, max_dim: int) -> tuple[bytes, str]:
-        """Downscale image if too large. Returns (bytes, mime_type).
-
-        Converts to JPEG for efficiency. Progressively reduces size until
-        it fits within max_bytes.
-        """
-        img = Image.open(io.BytesIO(data))
-
-        # Convert to RGB (handles RGBA PNGs, palette images, etc.)
-        if img.mode in ("RGBA", "P", "LA"):
-            bg = Image.new("RGB", img.size, (255, 255, 255))
-            if img.mode == "P":
-                img = img.convert("RGBA")
-            bg.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
-            img = bg
-        elif img.mode != "RGB":
-            img = img.convert("RGB")
-
-        # Downscale if dimensions exceed max
-        w, h = img.size
-        if w > max_dim or h > max_dim:
-            ratio = min(max_dim / w, max_dim / h)
-            img = img.resize((int(w * ratio), int(h * ratio)), Image.LANCZOS)
-
-        # Encode as JPEG, reduce quality until it fits
-        for quality in (85, 70, 50, 30):
-            buf = io.BytesIO()
-            img.save(buf, format="JPEG", quality=quality, optimize=True)
-            result = buf.getvalue()
-            if len(result) <= max_bytes:
-                return result, "image/jpeg"
-
-        # Last resort: shrink dimensions further
-        w, h = img.size
-        for scale in (0.5, 0.25):
-            small = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
-            buf = io.BytesIO()
-            small.save(buf, format="JPEG", quality=50, optimize=True)
-            result = buf.getvalue()
-            if len(result) <= max_bytes:
-                return result, "image/jpeg"
-
-        # Give up and return whatever we have
-        return result, "image/jpeg"
-
     async def _download_url(self, url: str, probe: bool = False) -> tuple[bytes | None, str | None]:
         """Download an image URL and return (bytes, mime_type) or (None, None).
 
@@ -116,156 +172,213 @@ class Copilot(commands.Cog):
         text where we don't know if they're images.
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                    if resp.status != 200:
+            async with self.http.request("GET", url, timeout=PROBE_TIMEOUT, retries=0) as resp:
+                if resp.status != 200:
+                    return None, None
+                if probe:
+                    # Check content-length before downloading
+                    cl = resp.content_length
+                    if cl and cl > 20_000_000:
                         return None, None
-                    if probe:
-                        # Check content-length before downloading
-                        cl = resp.content_length
-                        if cl and cl > 20_000_000:
+                    # Check content-type hint (but don't trust it blindly)
+                    ct = resp.content_type or ""
+                    ct_clean = ct.split(";")[0].strip()
+                    if ct_clean and not ct_clean.startswith("image/") and ct_clean != "application/octet-stream":
+                        # Content-type says non-image — read first 16 bytes
+                        # and check magic bytes as final arbiter
+                        head = await resp.content.read(16)
+                        if not ContextGatherer._sniff_mime(head):
                             return None, None
-                        # Check content-type hint (but don't trust it blindly)
-                        ct = resp.content_type or ""
-                        ct_clean = ct.split(";")[0].strip()
-                        if ct_clean and not ct_clean.startswith("image/") and ct_clean != "application/octet-stream":
-                            # Content-type says non-image — read first 16 bytes
-                            # and check magic bytes as final arbiter
-                            head = await resp.content.read(16)
-                            if not ContextGatherer._sniff_mime(head):
-                                return None, None
-                            # Magic bytes say it IS an image despite content-type
-                            data = head + await resp.content.read()
-                        else:
-                            data = await resp.read()
+                        # Magic bytes say it IS an image despite content-type
+                        data = head + await resp.content.read()
                     else:
-                        cl = resp.content_length
-                        if cl and cl > 20_000_000:
-                            return None, None
                         data = await resp.read()
-                    if len(data) < 100:  # too small to be a real image
-                        return None, None
-                    mime = ContextGatherer._sniff_mime(data)
-                    if not mime:
-                        ct = resp.content_type or ""
-                        ct_clean = ct.split(";")[0].strip()
-                        if ct_clean in ContextGatherer.IMAGE_CONTENT_TYPES:
-                            mime = ct_clean
-                    if not mime:
+                else:
+                    cl = resp.content_length
+                    if cl and cl > 20_000_000:
                         return None, None
-                    return data, mime
+                    data = await resp.read()
+                if len(data) < 100:  # too small to be a real image
+                    return None, None
+                mime = ContextGatherer._sniff_mime(data)
+                if not mime:
+                    ct = resp.content_type or ""
+                    ct_clean = ct.split(";")[0].strip()
+                    if ct_clean in ContextGatherer.IMAGE_CONTENT_TYPES:
+                        mime = ct_clean
+                if not mime:
+                    return None, None
+                return data, mime
         except Exception:
             return None, None
 
-    def _process_image_bytes(self, img_bytes: bytes, mime: str) -> tuple[bytes, str]:
-        """Downscale if needed, convert GIFs to JPEG, return (bytes, mime)."""
+    async def _process_image_bytes(self, img_bytes: bytes, mime: str) -> tuple[bytes, str]:
+        """Downscale if needed, convert GIFs to JPEG, return (bytes, mime).
+
+        Runs in the image worker pool; images that already fit skip it.
+        """
         needs_convert = len(img_bytes) > self.MAX_IMAGE_BYTES or mime == "image/gif"
         if needs_convert and HAS_PIL:
-            img_bytes, mime = self._downscale_image(
+            img_bytes, mime = await self.image_pool.downscale(
                 img_bytes, self.MAX_IMAGE_BYTES, self.MAX_IMAGE_DIMENSION)
         return img_bytes, mime
 
+    async def _load_image(self, keys: list, download) -> tuple[bytes, str, int] | None:
+        """(bytes, mime, token estimate) of a processed image, or None.
+
+        Served from the image cache when any of keys (or the downloaded
+        bytes) was seen before; download() -> (bytes, mime) or (None, None)
+        only runs on a miss.
+        """
+        async def process(img_bytes, mime):
+            img_bytes, mime = await self._process_image_bytes(img_bytes, mime)
+            return img_bytes, mime, self.context_gatherer._estimate_image_tokens(img_bytes)
+
+        async def checked_download():
+            img_bytes, mime = await download()
+            return (img_bytes, mime) if img_bytes and mime else (None, None)
+
+        loaded = await self.image_cache.fetch(keys, checked_download, process)
+        if loaded is None:
+            return None
+        img_bytes, mime, img_tokens, outcome = loaded
+        self._img_cache[outcome] += 1
+        return img_bytes, mime, img_tokens
+
+    def _image_candidates(self, msg) -> list:
+        """Images a message may carry, in prompt order, as
+        (sender, sources) where sources are (keys, url, download, filename)
+        alternatives tried in turn until one loads."""
+        candidates = []
+        sender = msg.author.display_name
+
+        # Direct attachments
+        for att in msg.attachments:
+            ct = att.content_type or ""
+            if ct.split(";")[0].strip() in ContextGatherer.IMAGE_CONTENT_TYPES:
+                async def download(att=att, ct=ct):
+                    img_bytes = await att.read()
+                    return img_bytes, ContextGatherer._sniff_mime(img_bytes) or ct.split(";")[0].strip()
+                candidates.append((sender, [([f"attachment:{att.id}"], att.url, download, att.filename)]))
+
+        # Embed images (link previews, etc.) — one image per embed is enough
+        embed_urls = set()  # track URLs already handled by embeds
+        for embed in msg.embeds:
+            self._img_diag.append(f"embed:{embed.type}({'img' if embed.image else ''}{'thumb' if embed.thumbnail else ''})")
+            sources = []
+            for img_obj in (embed.image, embed.thumbnail):
+                if not img_obj:
+                    continue
+                # Prefer Discord's proxy URL (works reliably) over original
+                img_url = getattr(img_obj, 'proxy_url', None) or img_obj.url
+                if not img_url or not img_url.startswith("http"):
+                    continue
+                # Track both URLs so we don't re-download from text
+                if img_obj.url:
+                    embed_urls.add(img_obj.url)
+                if getattr(img_obj, 'proxy_url', None):
+                    embed_urls.add(img_obj.proxy_url)
+                sources.append((
+                    [img_obj.url and f"url:{img_obj.url}", f"url:{img_url}"], img_url,
+                    lambda url=img_url: self._download_url(url),
+                    (img_obj.url or img_url).split("/")[-1].split("?")[0] or "embed"))
+            if sources:
+                candidates.append((sender, sources))
+
+        # Raw URLs in message text — probe for images (not already covered by embeds)
+        if msg.content:
+            url_count = 0
+            for url_match in ContextGatherer.IMAGE_URL_PATTERN.finditer(msg.content):
+                if url_count >= 3:  # cap probing to avoid excessive requests
+                    break
+                raw_url = url_match.group(0).strip("<>)\"'")  # strip wrapping chars
+                url_label = raw_url.split("//")[-1].split("?")[0][:40]
+                if raw_url in embed_urls:
+                    self._img_diag.append(f"url:dup({url_label})")
+                    continue
+                url_count += 1
+
+                async def download(url=raw_url, label=url_label):
+                    try:
+                        img_bytes, mime = await self._download_url(url, probe=True)
+                    except Exception as e:
+                        self._img_diag.append(f"url:err({label},{type(e).__name__})")
+                        raise
+                    if img_bytes and mime:
+                        self._img_diag.append(f"url:ok({label},{len(img_bytes)}B)")
+                    else:
+                        self._img_diag.append(f"url:skip({label})")
+                    return img_bytes, mime
+                candidates.append((sender, [([f"url:{raw_url}"], raw_url, download,
+                                             raw_url.split("/")[-1].split("?")[0] or "url")]))
+        return candidates
+
     async def _collect_recent_images(self, ctx, lookback: int) -> list:
         """Scan the last `lookback` messages for image attachments and embeds.
 
         Returns list of {"url": data_uri, "sender": name, "filename": name}
-        dicts, oldest first.  Skips images that fail to download.
+        dicts, oldest first, trigger message last. All candidates are
+        fetched concurrently (IMAGE_FETCHES at a time, at most
+        IMAGE_FETCHES_PER_HOST per host); whatever hasn't loaded after
+        IMAGE_DEADLINE seconds is left out. Skips images that fail to download.
         """
         if lookback <= 0:
             return []
 
-        images = []
         self._img_diag = []  # diagnostics for debug output
         self._img_tokens = 0  # estimated image token cost
+        self._img_cache = {"hit": 0, "raw": 0, "miss": 0}  # image cache outcomes
 
-        async def _add_from_message(msg):
-            # Direct attachments
-            for att in msg.attachments:
-                ct = att.content_type or ""
-                if ct.split(";")[0].strip() in ContextGatherer.IMAGE_CONTENT_TYPES:
-                    try:
-                        img_bytes = await att.read()
-                        mime = ContextGatherer._sniff_mime(img_bytes) or ct.split(";")[0].strip()
-                        img_bytes, mime = self._process_image_bytes(img_bytes, mime)
-                        self._img_tokens += self.context_gatherer._estimate_image_tokens(img_bytes)
-                        b64 = base64.b64encode(img_bytes).decode("ascii")
-                        images.append({
-                            "url": f"data:{mime};base64,{b64}",
-                            "sender": msg.author.display_name,
-                            "filename": att.filename,
-                        })
-                    except Exception:
-                        continue
-
-            # Embed images (link previews, etc.)
-            embed_urls = set()  # track URLs already handled by embeds
-            for embed in msg.embeds:
-                self._img_diag.append(f"embed:{embed.type}({'img' if embed.image else ''}{'thumb' if embed.thumbnail else ''})")
-                for img_obj in (embed.image, embed.thumbnail):
-                    if not img_obj:
-                        continue
-                    # Prefer Discord's proxy URL (works reliably) over original
-                    img_url = getattr(img_obj, 'proxy_url', None) or img_obj.url
-                    if not img_url or not img_url.startswith("http"):
-                        continue
-                    try:
-                        img_bytes, mime = await self._download_url(img_url)
-                        if img_bytes and mime:
-                            img_bytes, mime = self._process_image_bytes(img_bytes, mime)
-                            self._img_tokens += self.context_gatherer._estimate_image_tokens(img_bytes)
-                            b64 = base64.b64encode(img_bytes).decode("ascii")
-                            images.append({
-                                "url": f"data:{mime};base64,{b64}",
-                                "sender": msg.author.display_name,
-                                "filename": (img_obj.url or img_url).split("/")[-1].split("?")[0] or "embed",
-                            })
-                            # Track both URLs so we don't re-download from text
-                            if img_obj.url:
-                                embed_urls.add(img_obj.url)
-                            if getattr(img_obj, 'proxy_url', None):
-                                embed_urls.add(img_obj.proxy_url)
-                            break  # one image per embed is enough
-                    except Exception:
-                        continue
-
-            # Raw URLs in message text — probe for images (not already covered by embeds)
-            if msg.content:
-                url_count = 0
-                for url_match in ContextGatherer.IMAGE_URL_PATTERN.finditer(msg.content):
-                    if url_count >= 3:  # cap probing to avoid excessive requests
-                        break
-                    raw_url = url_match.group(0).strip("<>)\"'")  # strip wrapping chars
-                    url_label = raw_url.split("//")[-1].split("?")[0][:40]
-                    if raw_url in embed_urls:
-                        self._img_diag.append(f"url:dup({url_label})")
-                        continue
-                    url_count += 1
-                    try:
-                        img_bytes, mime = await self._download_url(raw_url, probe=True)
-                        if img_bytes and mime:
-                            self._img_diag.append(f"url:ok({url_label},{len(img_bytes)}B)")
-                            img_bytes, mime = self._process_image_bytes(img_bytes, mime)
-                            self._img_tokens += self.context_gatherer._estimate_image_tokens(img_bytes)
-                            b64 = base64.b64encode(img_bytes).decode("ascii")
-                            images.append({
-                                "url": f"data:{mime};base64,{b64}",
-                                "sender": msg.author.display_name,
-                                "filename": raw_url.split("/")[-1].split("?")[0] or "url",
-                            })
-                        else:
-                            self._img_diag.append(f"url:skip({url_label})")
-                    except Exception as e:
-                        self._img_diag.append(f"url:err({url_label},{type(e).__name__})")
-                        continue
+        # history() is newest first
+        msgs = [msg async for msg in ctx.channel.history(limit=lookback, before=ctx.message)]
+        msgs.reverse()
+        # Also check the trigger message itself
+        msgs.append(ctx.message)
+        candidates = [c for msg in msgs for c in self._image_candidates(msg)]
+        if not candidates:
+            return []
 
-        async for msg in ctx.channel.history(limit=lookback, before=ctx.message):
-            await _add_from_message(msg)
+        fetch_slots = asyncio.Semaphore(IMAGE_FETCHES)
+        host_slots = collections.defaultdict(lambda: asyncio.Semaphore(IMAGE_FETCHES_PER_HOST))
 
-        # Also check the trigger message itself
-        await _add_from_message(ctx.message)
+        async def load(sources):
+            for keys, url, download, filename in sources:
+                try:
+                    async with host_slots[urlsplit(url).hostname], fetch_slots:
+                        loaded = await self._load_image(keys, download)
+                except Exception:
+                    continue
+                if loaded:
+                    return loaded, filename
+            return None
 
+        tasks = [asyncio.create_task(load(sources)) for _, sources in candidates]
+        done, pending = await asyncio.wait(tasks, timeout=IMAGE_DEADLINE)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._img_diag.append(f"deadline({len(pending)} dropped)")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        images = []
+        for (sender, _), task in zip(candidates, tasks):
+            if task not in done or task.result() is None:
+                continue
+            (img_bytes, mime, img_tokens), filename = task.result()
+            self._img_tokens += img_tokens
+            b64 = base64.b64encode(img_bytes).decode("ascii")
+            images.append({
+                "url": f"data:{mime};base64,{b64}",
+                "sender": sender,
+                "filename": filename,
+            })
         return images  # oldest first from history, trigger msg last
 
+    def _format_img_cache(self) -> str:
+        """Image cache hits for the debug line, e.g. `cache=2/3`."""
+        outcomes = getattr(self, '_img_cache', {})
+        return f"cache={outcomes.get('hit', 0)}/{sum(outcomes.values())}"
+
     def _build_user_content(self, ask: str, images: list) -> str | list:
         """Build user message content — plain string or multimodal array.
 
@@ -336,7 +449,7 @@ class Copilot(commands.Cog):
                 system_prompt += _IMAGE_HINT
                 if show_debug:
                     img_tok = getattr(self, '_img_tokens', 0)
-                    debug_parts.append(f"imgs={len(images)}(~{img_tok}tok)")
+                    debug_parts.append(f"imgs={len(images)}(~{img_tok}tok,{self._format_img_cache()})")
 
             # Wrap context in XML tags
             combined_context = self.context_gatherer.wrap_context(channel_context, user_context)
@@ -361,8 +474,10 @@ class Copilot(commands.Cog):
                 "max_tokens": max_output,
             }
 
+            sender = self._stream_sender(ctx, settings, t0)
             try:
-                data = await self.provider.chat(payload)
+                http_stats = CallStats()
+                data = await self._chat(self.provider, payload, sender, http_stats)
                 elapsed = time.monotonic() - t0
                 response_text = data["choices"][0]["message"]["content"]
 
@@ -380,15 +495,16 @@ class Copilot(commands.Cog):
                     cached_tokens=cached_tok)
                 if show_debug:
                     cost = self.provider.calculate_cost(answer_model, in_tok, out_tok, cached_tok)
-                    self._add_usage_debug(debug_parts, usage, answer_model, cost, elapsed, cached_tok)
+                    self._add_usage_debug(debug_parts, usage, answer_model, cost, elapsed, cached_tok, http_stats)
+                self._log_first_visible(ctx, "clai", sender, debug_parts, show_debug)
             except Exception as e:
-                await ctx.send(f"❌ API error: {e}")
+                await (sender.finish if sender else ctx.send)(f"❌ API error: {e}")
                 self.bot.logger.error(f"LLM API error: {e}")
                 return
 
         # Restore mentions so users get pinged
         output = self.context_gatherer.restore_mentions(ctx, response_text)
-        await self._send_with_debug(ctx, output, debug_parts, show_debug)
+        await self._send_with_debug(ctx, output, debug_parts, show_debug, sender)
     async def brave_search(self, query: str, api_key: str, count: int = 5) -> list:
         """Search using Brave Search API. Returns list of {title, link, snippet}.
 
@@ -398,13 +514,12 @@ class Copilot(commands.Cog):
         headers = {"Accept": "application/json", "X-Subscription-Token": api_key}
         params = {"q": query, "count": count}
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params,
-                                   timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status != 200:
-                    body = await resp.text()
-                    raise RuntimeError(f"Brave HTTP {resp.status}: {body[:200]}")
-                data = await resp.json()
+        async with self.http.request("GET", url, headers=headers, params=params,
+                                     timeout=PROBE_TIMEOUT, retries=1) as resp:
+            if resp.status != 200:
+                body = await resp.text()
+                raise RuntimeError(f"Brave HTTP {resp.status}: {body[:200]}")
+            data = await resp.json()
 
         results = []
         for item in (data.get("web", {}).get("results", []))[:count]:
@@ -416,62 +531,116 @@ class Copilot(commands.Cog):
         return results
 
     async def fetch_page_text(self, url: str, max_chars: int = 4000) -> str:
-        """Fetch a URL and extract readable text content"""
-        try:
-            page = await self.bot.utils.bs_from_url(self.bot, url)
-            if not page:
-                return ""
-
-            # Remove script, style, nav, header, footer elements
-            for tag in page(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form', 'iframe']):
-                tag.decompose()
+        """Fetch a URL and extract readable text content
 
-            # Get text from article or main content, fall back to body
-            content = page.find('article') or page.find('main') or page.find('body')
-            if not content:
+        Text is cached per normalized URL for web_content.PAGE_TTL. Pages
+        are read up to web_content.MAX_PAGE_BYTES and parsed off the
+        event loop.
+        """
+        key = web_content.normalize_url(url)
+        cached = self.page_cache.get(key)
+        # (text, max_chars it was extracted with); shorter text is the whole page
+        if cached is not None and (cached[1] >= max_chars or len(cached[0]) < cached[1]):
+            return cached[0][:max_chars]
+        try:
+            html = await self._download_page(url)
+            if html is None:
                 return ""
-
-            # Extract text and clean up whitespace
-            text = content.get_text(separator=' ', strip=True)
-            # Collapse multiple spaces/newlines
-            text = re.sub(r'\s+', ' ', text)
-
-            return text[:max_chars]
+            text = await asyncio.get_running_loop().run_in_executor(
+                self.extract_pool, web_content.extract_text, html, max_chars)
+            self.page_cache.put(key, (text, max_chars))
+            return text
         except Exception as e:
             self.bot.logger.debug(f"Failed to fetch {url}: {e}")
             return ""
 
+    async def _download_page(self, url: str) -> bytes | None:
+        """HTML of a page, at most web_content.MAX_PAGE_BYTES of it, or
+        None if it isn't an HTML/text page."""
+        async with self.http.request("GET", url, headers={"User-Agent": "Mozilla/5.0 PalBot"},
+                                     timeout=PROBE_TIMEOUT, retries=0) as resp:
+            if resp.status != 200:
+                return None
+            ct = resp.content_type or ""
+            if ct and "html" not in ct and not ct.startswith("text/"):
+                return None
+            chunks = []
+            size = 0
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= web_content.MAX_PAGE_BYTES:
+                    break
+            return b"".join(chunks)[:web_content.MAX_PAGE_BYTES]
+
+    async def _cached_search(self, engine: str, query: str, search):
+        """search() -> results, cached per engine and query for
+        web_content.SEARCH_TTL. Empty results aren't cached."""
+        key = (engine, " ".join(query.lower().split()))
+        results = self.search_cache.get(key)
+        if results is None:
+            results = await search()
+            if results:
+                self.search_cache.put(key, results)
+        return results
+
     async def _web_search(self, ctx, query: str, settings: dict, debug_parts: list,
                            show_debug: bool, search_max_tokens: int = None) -> str:
-        """Perform web search and fetch top results. Returns formatted web context string or empty."""
+        """Perform web search and fetch top results. Returns formatted web context string or empty.
+
+        Identical searches in a guild that overlap, or come within
+        SEARCH_REUSE_SECONDS of each other, share one search and fetch.
+        """
         if search_max_tokens is None:
             search_max_tokens = settings.get("search_max_tokens", 5000)
 
+        key = (ctx.guild.id, " ".join(query.lower().split()), search_max_tokens)
+        try:
+            (web_context, search_debug), shared = await self.search_flight.do(
+                key, lambda: self._search_and_fetch(ctx.guild.id, query, search_max_tokens))
+        except Exception as e:
+            if show_debug:
+                debug_parts.append(f"search:{getattr(e, 'search_engine', '?')}_err({e})")
+            self.bot.logger.error(f"Web search failed: {e}")
+            return ""
+
+        if show_debug:
+            debug_parts.extend(search_debug)
+            if shared:
+                debug_parts.append("search:shared")
+        return web_context
+
+    async def _search_and_fetch(self, guild_id: int, query: str,
+                                search_max_tokens: int) -> tuple[str, list]:
+        """The work behind _web_search(): (web context or "", debug parts).
+
+        Exceptions are tagged with the search_engine that was in use.
+        """
+        search_debug = []
         search_engine = None
         try:
-            brave_key = await self.ai_cache.get_setting(ctx.guild.id, None, "brave_api_key")
+            brave_key = await self.ai_cache.get_setting(guild_id, None, "brave_api_key")
             if brave_key:
                 search_engine = "brave"
                 try:
-                    search_results = await self.brave_search(query, brave_key, count=5)
+                    search_results = await self._cached_search(
+                        "brave", query, lambda: self.brave_search(query, brave_key, count=5))
                 except Exception as e:
-                    if show_debug:
-                        debug_parts.append(f"search:brave_err({e})")
+                    search_debug.append(f"search:brave_err({e})")
                     search_results = None
                     search_engine = "google"
-                    search_results = await self.bot.utils.google_for_urls(
-                        self.bot, query, return_full_data=True
-                    )
+                    search_results = await self._cached_search(
+                        "google", query, lambda: self.bot.utils.google_for_urls(
+                            self.bot, query, return_full_data=True))
             else:
                 search_engine = "google"
-                search_results = await self.bot.utils.google_for_urls(
-                    self.bot, query, return_full_data=True
-                )
+                search_results = await self._cached_search(
+                    "google", query, lambda: self.bot.utils.google_for_urls(
+                        self.bot, query, return_full_data=True))
 
             if not search_results:
-                if show_debug:
-                    debug_parts.append(f"search:{search_engine}=0")
-                return ""
+                search_debug.append(f"search:{search_engine}=0")
+                return "", search_debug
 
             async def fetch_result(i, result):
                 title = result.get('title', '')
@@ -485,36 +654,31 @@ class Copilot(commands.Cog):
 
             top_n = 5 if brave_key else 3
             tasks = [fetch_result(i, r) for i, r in enumerate(search_results[:top_n])]
-            web_content = await asyncio.gather(*tasks)
+            pages = await asyncio.gather(*tasks)
 
-            if not web_content:
-                if show_debug:
-                    debug_parts.append(f"search:{search_engine}=0")
-                return ""
+            if not pages:
+                search_debug.append(f"search:{search_engine}=0")
+                return "", search_debug
 
-            combined_web = "\n\n".join(web_content)
+            combined_web = "\n\n".join(pages)
             web_tokens = self.provider.estimate_tokens(combined_web)
             if web_tokens > search_max_tokens:
                 truncated = []
                 running_tokens = 0
-                for wc in web_content:
+                for wc in pages:
                     wc_tokens = self.provider.estimate_tokens(wc)
                     if running_tokens + wc_tokens > search_max_tokens:
                         break
                     truncated.append(wc)
                     running_tokens += wc_tokens
-                combined_web = "\n\n".join(truncated) if truncated else web_content[0][:search_max_tokens * 4]
-
-            if show_debug:
-                debug_parts.append(f"search:{search_engine}={self.provider.estimate_tokens(combined_web)}tok")
+                combined_web = "\n\n".join(truncated) if truncated else pages[0][:search_max_tokens * 4]
 
-            return f'<web_search_results>\n{combined_web}\n</web_search_results>'
+            search_debug.append(f"search:{search_engine}={self.provider.estimate_tokens(combined_web)}tok")
+            return f'<web_search_results>\n{combined_web}\n</web_search_results>', search_debug
 
         except Exception as e:
-            if show_debug:
-                debug_parts.append(f"search:{search_engine or '?'}_err({e})")
-            self.bot.logger.error(f"Web search failed: {e}")
-            return ""
+            e.search_engine = search_engine or "?"
+            raise
 
     @commands.command()
     async def sclai(self, ctx, *, ask: str):
@@ -583,7 +747,7 @@ class Copilot(commands.Cog):
                 system_prompt += _IMAGE_HINT
                 if show_debug:
                     img_tok = getattr(self, '_img_tokens', 0)
-                    debug_parts.append(f"imgs={len(images)}(~{img_tok}tok)")
+                    debug_parts.append(f"imgs={len(images)}(~{img_tok}tok,{self._format_img_cache()})")
 
             # Build final prompt — stable context first for prefix caching
             context_sections = stable_sections + volatile_sections
@@ -637,8 +801,10 @@ RULES:
                 "max_tokens": max_output,
             }
 
+            sender = self._stream_sender(ctx, settings, t0)
             try:
-                data = await self.provider.chat(payload)
+                http_stats = CallStats()
+                data = await self._chat(self.provider, payload, sender, http_stats)
                 elapsed = time.monotonic() - t0
                 response_text = data["choices"][0]["message"]["content"]
 
@@ -657,15 +823,16 @@ RULES:
 
                 if show_debug:
                     cost = self.provider.calculate_cost(answer_model, in_tok, out_tok, cached_tok)
-                    self._add_usage_debug(debug_parts, usage, answer_model, cost, elapsed, cached_tok)
+                    self._add_usage_debug(debug_parts, usage, answer_model, cost, elapsed, cached_tok, http_stats)
+                self._log_first_visible(ctx, "sclai", sender, debug_parts, show_debug)
             except Exception as e:
-                await ctx.send(f"❌ API error: {e}")
+                await (sender.finish if sender else ctx.send)(f"❌ API error: {e}")
                 self.bot.logger.error(f"LLM API error: {e}")
                 return
 
         # Restore mentions so users get pinged
         output = self.context_gatherer.restore_mentions(ctx, response_text)
-        await self._send_with_debug(ctx, output, debug_parts, show_debug)
+        await self._send_with_debug(ctx, output, debug_parts, show_debug, sender)
 
     async def _should_debug(self, ctx, settings):
         """Check if debug output should be shown."""
@@ -677,7 +844,8 @@ RULES:
             return None
         return f"-# 🔧 {' | '.join(debug_parts)}"
 
-    def _add_usage_debug(self, debug_parts, usage, model, cost, elapsed, cached_tok=0):
+    def _add_usage_debug(self, debug_parts, usage, model, cost, elapsed, cached_tok=0,
+                         http_stats=None):
         """Add standard usage stats to debug parts."""
         in_tok = usage.get("prompt_tokens", 0)
         out_tok = usage.get("completion_tokens", 0)
@@ -689,19 +857,52 @@ RULES:
         if cost is not None:
             debug_parts.append(f"${cost:.4f}")
         debug_parts.append(f"{elapsed:.1f}s")
+        if http_stats is not None:
+            debug_parts.append(http_stats.debug_label())
         # Short model name
         short = model.split("-")[1] if "-" in model else model
         if len(short) > 20:
             short = short[:17] + "..."
         debug_parts.append(short)
 
-    async def _send_with_debug(self, ctx, output, debug_parts, show_debug):
-        """Send output with optional debug line prepended."""
+    async def _send_with_debug(self, ctx, output, debug_parts, show_debug, sender=None):
+        """Send output with optional debug line prepended.
+
+        With a _StreamSender the streamed reply is edited into the final
+        text instead of sending a new message.
+        """
         if show_debug and debug_parts:
             debug_line = self._format_debug_line(debug_parts)
-            await ctx.send(f"{debug_line}\n{output}"[:1980])
+            content = f"{debug_line}\n{output}"[:1980]
         else:
-            await ctx.send(output[:1980])
+            content = output[:1980]
+        if sender is not None:
+            await sender.finish(content)
+        else:
+            await ctx.send(content)
+
+    def _stream_sender(self, ctx, settings, t0):
+        """A _StreamSender for this reply, or None if streaming is off."""
+        if str(settings.get("stream", "on")).lower() in ("off", "false", "no", "0"):
+            return None
+        return _StreamSender(
+            ctx, lambda text: self.context_gatherer.restore_mentions(ctx, text), t0)
+
+    async def _chat(self, provider, payload, sender, http_stats):
+        """provider.chat(), streamed through sender when there is one."""
+        if sender is None:
+            return await provider.chat(payload, stats=http_stats)
+        return await provider.chat_stream(payload, sender.on_delta, stats=http_stats)
+
+    def _log_first_visible(self, ctx, command, sender, debug_parts, show_debug):
+        """Log (and show in debug) how long until the answer started appearing."""
+        if sender is None or sender.first_visible is None:
+            return
+        self.bot.logger.info(
+            f"{command}: first text visible after {sender.first_visible:.2f}s "
+            f"in #{ctx.channel} ({ctx.guild.id})")
+        if show_debug:
+            debug_parts.append(f"first={sender.first_visible:.1f}s")
 
     @commands.command()
     async def glm(self, ctx, *, ask: str):
@@ -717,6 +918,7 @@ RULES:
                     glm_enabled = await self.ai_cache.get_setting(ctx.guild.id, ctx.channel.id, "glm_enabled")
                     if str(glm_enabled).lower() in ("off", "false", "no", "0"):
                         return
+        sender = None
         try:
 
             async with ctx.channel.typing():
@@ -766,7 +968,9 @@ RULES:
                     "max_tokens": max_output,
                 }
 
-                data = await self.glm_provider.chat(payload)
+                http_stats = CallStats()
+                sender = self._stream_sender(ctx, settings, t0)
+                data = await self._chat(self.glm_provider, payload, sender, http_stats)
 
                 # Get both content and reasoning_content
                 message = data["choices"][0]["message"]
@@ -787,7 +991,8 @@ RULES:
                 )
 
                 if show_debug:
-                    self._add_usage_debug(debug_parts, usage, model, cost, elapsed)
+                    self._add_usage_debug(debug_parts, usage, model, cost, elapsed, http_stats=http_stats)
+                self._log_first_visible(ctx, "glm", sender, debug_parts, show_debug)
 
                 if not response_text.strip():
                     # Don't send an error — model chose not to respond (refusal/empty output)
@@ -802,7 +1007,7 @@ RULES:
                     if reasoning_text.strip():
                         output += f"\n\n**Reasoning:** {reasoning_text}"
 
-                await self._send_with_debug(ctx, output, debug_parts, show_debug)
+                await self._send_with_debug(ctx, output, debug_parts, show_debug, sender)
 
         except Exception as e:
             self.bot.logger.error(f"GLM command error: {e}")
@@ -819,7 +1024,7 @@ RULES:
                 error_msg += "\n⚠️ Authentication failed - check API credentials"
             elif "404" in str(e) or "not found" in str(e).lower():
                 error_msg += "\n⚠️ Model or endpoint not found - check configuration"
-            await ctx.send(error_msg)
+            await (sender.finish if sender else ctx.send)(error_msg)
 
     @commands.command()
     async def sglm(self, ctx, *, ask: str):
@@ -835,6 +1040,7 @@ RULES:
                     glm_enabled = await self.ai_cache.get_setting(ctx.guild.id, ctx.channel.id, "glm_enabled")
                     if str(glm_enabled).lower() in ("off", "false", "no", "0"):
                         return
+        sender = None
         try:
             async with ctx.channel.typing():
                 original_ask = ask
@@ -897,7 +1103,9 @@ RULES:
                     "max_tokens": max_output,
                 }
 
-                data = await self.glm_provider.chat(payload)
+                http_stats = CallStats()
+                sender = self._stream_sender(ctx, settings, t0)
+                data = await self._chat(self.glm_provider, payload, sender, http_stats)
 
                 message = data["choices"][0]["message"]
                 response_text = message.get("content") or ""
@@ -916,7 +1124,8 @@ RULES:
                 )
 
                 if show_debug:
-                    self._add_usage_debug(debug_parts, usage, model, cost, elapsed)
+                    self._add_usage_debug(debug_parts, usage, model, cost, elapsed, http_stats=http_stats)
+                self._log_first_visible(ctx, "sglm", sender, debug_parts, show_debug)
 
                 if not response_text.strip():
                     return
@@ -928,7 +1137,7 @@ RULES:
                     if reasoning_text.strip():
                         output += f"\n\n**Reasoning:** {reasoning_text}"
 
-                await self._send_with_debug(ctx, output, debug_parts, show_debug)
+                await self._send_with_debug(ctx, output, debug_parts, show_debug, sender)
 
         except Exception as e:
             self.bot.logger.error(f"sGLM command error: {e}")
@@ -937,7 +1146,7 @@ RULES:
                 error_msg += "\n⚠️ Rate limit hit - try again later"
             elif "connection" in str(e).lower() or "timeout" in str(e).lower():
                 error_msg += "\n⚠️ Connection issue - check if endpoint is reachable"
-            await ctx.send(error_msg)
+            await (sender.finish if sender else ctx.send)(error_msg)
 
     @commands.command()
     @is_bot_admin()
@@ -1179,10 +1388,9 @@ RULES:
                 results = []
                 for ch_id in channel_ids:
                     try:
-                        await self.ai_cache.delete_cache(ch_id)
-                        # Build a minimal fake ctx for the channel
                         chan = self.bot.get_channel(ch_id)
                         if chan is None:
+                            await self.ai_cache.delete_cache(ch_id)
                             results.append(f"<#{ch_id}>: ❌ channel not found")
                             continue
                         ch_settings = await self.ai_cache.get_all_settings(ctx.guild.id, ch_id)
@@ -1196,7 +1404,6 @@ RULES:
                 await ctx.send("🔄 **Cache rebuild complete:**\n" + "\n".join(results))
             else:
                 # Rebuild this channel only
-                await self.ai_cache.delete_cache(ctx.channel.id)
                 try:
                     summary_info = await self._rebuild_channel_cache(
                         ctx, ctx.channel, settings, token, base_url)
@@ -1206,77 +1413,51 @@ RULES:
                     self.bot.logger.error(f"claireset failed: {e}")
 
     async def _rebuild_channel_cache(self, ctx, channel, settings, token, base_url) -> str:
-        """Rebuild compaction cache for a channel. Returns info string."""
+        """Drop and rebuild the compaction cache for a channel. Returns info string.
+
+        Goes through ContextGatherer.rebuild_channel(), so it waits for a
+        background compaction already running in the channel instead of
+        racing it, and live requests meanwhile join the rebuild.
+        """
         compact_days = settings["compact_days"]
         raw_hours = settings["raw_hours"]
         compact_max_tokens = settings["compact_max_tokens"]
-        compact_model = settings["compact_model"]
         bot_user_id = self.bot.user.id
-        guild_id = ctx.guild.id
 
         now = time.time()
         compact_window_start = self.context_gatherer._ts_to_snowflake(now - compact_days * 86400)
         raw_window_start = self.context_gatherer._ts_to_snowflake(now - raw_hours * 3600)
 
-        # Fetch all messages in compact window from Logger
         if "Logger" not in self.bot.cogs:
             raise Exception("Logger cog not available")
 
-        logger_cog = self.bot.cogs['Logger']
-        db = await logger_cog.get_db(ctx.guild)
-
-        cursor = await db.execute(
-            """SELECT m.user_id, u.canon_nick, m.message, m.snowflake FROM messages m
-               JOIN users u ON m.user_id = u.user_id
-               WHERE m.channel_id = ? AND m.snowflake > ?
-               AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
-               ORDER BY m.snowflake ASC""",
-            [channel.id, compact_window_start],
-        )
-        all_msgs = await cursor.fetchall()
+        result = await self.context_gatherer.rebuild_channel(channel, settings, token, base_url)
 
+        # Fetch all messages in compact window from Logger to describe the rebuild
+        all_msgs = await self.context_gatherer._fetch_channel_messages(channel, compact_window_start)
         if not all_msgs:
             return "no messages in compact window"
 
         # Split at raw_hours boundary
-        older_msgs = [m for m in all_msgs if m[3] <= raw_window_start]
+        window = await self.context_gatherer._window(all_msgs, bot_user_id)
+        split = window.split(raw_window_start)
         total_msgs = len(all_msgs)
 
-        if not older_msgs:
+        if not split:
             return f"{total_msgs} messages, all within raw window — no compaction needed"
 
-        older_text = self.context_gatherer._format_messages(older_msgs, bot_user_id)
-        older_tokens = self.provider.estimate_tokens(older_text)
-
-        if older_tokens < compact_max_tokens:
-            return f"{total_msgs} messages, older portion ({older_tokens} tokens) small enough — no compaction needed"
-
-        # Cap input to avoid exceeding model context limit
-        max_compaction_input = settings.get("max_compaction_input", 120000)
-        if older_tokens > max_compaction_input:
-            older_msgs = self.context_gatherer._trim_messages_to_budget(older_msgs, bot_user_id, max_compaction_input)
-            older_text = self.context_gatherer._format_messages(older_msgs, bot_user_id)
-
-        # Compact
-        summary, in_tok, out_tok, cached_comp = await self.context_gatherer._do_compaction(
-            ctx, older_text, compact_max_tokens, compact_model, token, base_url)
-
-        # Log compaction usage
-        await self.ai_cache.log_usage(
-            channel.id, guild_id, "compaction",
-            in_tok, out_tok, compact_model,
-            cached_tokens=cached_comp)
-
-        # Store cache
-        newest_older = older_msgs[-1][3]
-        oldest_older = older_msgs[0][3]
-        await self.ai_cache.set_cache(
-            channel.id, guild_id, oldest_older, newest_older,
-            summary, compact_model)
+        if result is None:
+            older_tokens = window.tokens(0, split)
+            if older_tokens < compact_max_tokens:
+                return f"{total_msgs} messages, older portion ({older_tokens} tokens) small enough — no compaction needed"
+            return f"{total_msgs} messages, older portion small enough — no compaction needed"
+        summary, compacted = result
+        segments = compaction_tiers.load(await self.ai_cache.get_cache(channel.id))
 
         summary_tokens = self.provider.estimate_tokens(summary)
-        days_covered = (self.context_gatherer._snowflake_to_ts(newest_older) - self.context_gatherer._snowflake_to_ts(oldest_older)) / 86400
-        return f"{summary_tokens} token summary covering {days_covered:.1f} days ({len(older_msgs)} msgs compacted, {total_msgs - len(older_msgs)} raw)"
+        days_covered = (self.context_gatherer._snowflake_to_ts(segments[-1].newest) - self.context_gatherer._snowflake_to_ts(segments[0].oldest)) / 86400
+        return (f"{summary_tokens} token summary covering {days_covered:.1f} days in {len(segments)} segments "
+                f"({compacted} msgs compacted, {total_msgs - split} raw)")
 
     @commands.command()
     async def claiuserprompt(self, ctx, target: str = None, *, prompt: str = None):
@@ -1481,21 +1662,22 @@ RULES:
                 # Count raw messages since cache boundary
                 raw_msgs = await self.context_gatherer._fetch_messages_range(ctx, cache["newest_snowflake"])
                 raw_count = len(raw_msgs)
-                raw_text = self.context_gatherer._format_messages(raw_msgs, self.bot.user.id)
                 raw_hours_elapsed = (time.time() - self.context_gatherer._snowflake_to_ts(cache["newest_snowflake"])) / 3600
 
                 settings = await self.ai_cache.get_all_settings(guild_id, channel.id)
                 recompact_tokens = settings["recompact_raw_tokens"]
                 raw_window_start = self.context_gatherer._ts_to_snowflake(time.time() - settings["raw_hours"] * 3600)
-                overflow_msgs = [m for m in raw_msgs if m[3] <= raw_window_start]
-                overflow_tokens = self.provider.estimate_tokens(self.context_gatherer._format_messages(overflow_msgs, self.bot.user.id)) if overflow_msgs else 0
+                raw = await self.context_gatherer._window(raw_msgs, self.bot.user.id)
+                overflow_tokens = raw.tokens(0, raw.split(raw_window_start))
 
                 lines.append(f"Cache: **warm** (built {age_hours:.1f}h ago)")
-                lines.append(f"  Summary: {summary_tokens:,} tokens covering {days_covered:.1f} days")
+                lines.append(f"  Summary: {summary_tokens:,} tokens covering {days_covered:.1f} days "
+                             f"({compaction_tiers.describe(compaction_tiers.load(cache))} segments)")
                 lines.append(f"  Raw window: {raw_hours_elapsed:.1f} hours ({raw_count} messages)")
                 lines.append(f"  Overflow: {overflow_tokens:,}/{recompact_tokens:,} tokens until re-compaction")
             else:
                 lines.append("Cache: **cold**")
+            lines.append(f"Background compaction: {self.context_gatherer.scheduler.status(channel.id)}")
 
             lines.append("")
             lines.append(self._format_stats_table(stats))
@@ -1518,6 +1700,13 @@ RULES:
                     lines.append(f"  {cp}")
             else:
                 lines.append("Cache: no active caches")
+            lines.append(self.context_gatherer.scheduler.describe())
+            lines.append(f"Dedup: compactions {self.context_gatherer.compactions.describe()} | "
+                         f"web searches {self.search_flight.describe()}")
+            lines.append(self.tokenizer.describe())
+            lines.append(self.image_cache.describe())
+            lines.append(f"Web cache: pages {self.page_cache.describe()} | "
+                         f"searches {self.search_cache.describe()}")
 
             lines.append("")
             lines.append(self._format_stats_table(stats))
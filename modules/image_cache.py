@@ -0,0 +1,224 @@
+"""Disk cache of processed images for vision requests.
+
+Every !clai with image lookback re-reads the last N messages, so the same
+attachments and embeds get downloaded and downscaled again for each
+follow-up question. This caches the processed result (the bytes actually
+sent to the API, their mime type and token estimate) on disk.
+
+Entries are content-addressed: the processed bytes are stored once, in a
+file named by their sha256, and any number of keys point at them. Keys are
+whatever identifies an image before fetching it (attachment ID, URL) plus
+the sha256 of the raw download, so a repost under a new URL skips
+processing even though it had to be downloaded. Entries expire after TTL
+and the least recently used go first once the store is over MAX_BYTES.
+
+Layout under logfiles/image_cache/:
+  index.db              keys → digest, and per-digest metadata
+  ab/abcdef….img        processed bytes
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+
+import aiosqlite
+
+MAX_BYTES = 256_000_000     # processed bytes kept on disk
+TTL = 7 * 86400             # seconds an entry lives after it was stored
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    mime TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS image_keys (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_image_keys_digest ON image_keys(digest);
+CREATE INDEX IF NOT EXISTS idx_blobs_used ON blobs(used_at);
+"""
+
+
+def raw_key(data: bytes) -> str:
+    """Cache key for downloaded bytes."""
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _remove(paths: list):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ImageCache:
+    """Async content-addressed store of processed images."""
+
+    def __init__(self, cache_dir: str = os.path.join("logfiles", "image_cache"),
+                 max_bytes: int = MAX_BYTES, ttl: float = TTL):
+        self.cache_dir = cache_dir
+        self.db_path = os.path.join(cache_dir, "index.db")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._db = None
+        self._total = 0             # bytes on disk, per the index
+        # per image fetched: no download / downloaded but not reprocessed / neither
+        self.stats = {"hit": 0, "raw": 0, "miss": 0}
+
+    async def get_db(self) -> aiosqlite.Connection:
+        if self._db is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._db = await aiosqlite.connect(self.db_path)
+            self._db.row_factory = aiosqlite.Row
+            await self._db.executescript(SCHEMA)
+            await self._db.commit()
+            cursor = await self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs")
+            self._total = (await cursor.fetchone())[0]
+        return self._db
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.img")
+
+    async def fetch(self, keys: list, download, process) -> tuple | None:
+        """The processed image for keys, from the cache if possible.
+
+        On a miss, download() -> (raw bytes, mime) or (None, None) fetches
+        the image; if those bytes were processed before (under another key)
+        that result is reused, otherwise process(raw, mime) -> (bytes, mime,
+        tokens) runs. The result is stored under keys and the raw digest.
+
+        Returns (bytes, mime, tokens, outcome) with outcome 'hit', 'raw' or
+        'miss' as counted in stats, or None if the download failed.
+        """
+        found = await self.get(keys)
+        if found is not None:
+            self.stats["hit"] += 1
+            return (*found, "hit")
+        raw, mime = await download()
+        if not raw:
+            return None
+        digest_key = raw_key(raw)
+        found = await self.get([digest_key])
+        outcome = "raw"
+        if found is None:
+            found = await process(raw, mime)
+            outcome = "miss"
+        self.stats[outcome] += 1
+        await self.put(keys + [digest_key], *found)
+        return (*found, outcome)
+
+    async def get(self, keys: list) -> tuple[bytes, str, int] | None:
+        """(bytes, mime, tokens) for the first of keys that is cached, or None."""
+        keys = [k for k in keys if k]
+        if not keys:
+            return None
+        db = await self.get_db()
+        cursor = await db.execute(
+            f"""SELECT b.digest, b.mime, b.tokens, b.size, b.created_at FROM image_keys k
+                JOIN blobs b ON b.digest = k.digest
+                WHERE k.key IN ({','.join('?' * len(keys))}) LIMIT 1""",
+            keys,
+        )
+        row = await cursor.fetchone()
+        if row is None or row["created_at"] < time.time() - self.ttl:
+            return None
+        try:
+            data = await asyncio.to_thread(_read, self._path(row["digest"]))
+        except FileNotFoundError:
+            # Removed behind our back; forget it
+            await self._drop(db, [(row["digest"], row["size"])])
+            return None
+        await db.execute("UPDATE blobs SET used_at = ? WHERE digest = ?",
+                         [time.time(), row["digest"]])
+        await db.commit()
+        return data, row["mime"], row["tokens"]
+
+    async def put(self, keys: list, data: bytes, mime: str, tokens: int):
+        """Store processed bytes under all of keys."""
+        keys = [k for k in keys if k]
+        digest = hashlib.sha256(data).hexdigest()
+        db = await self.get_db()
+        now = time.time()
+        cursor = await db.execute("SELECT 1 FROM blobs WHERE digest = ?", [digest])
+        if await cursor.fetchone() is None:
+            await asyncio.to_thread(_write, self._path(digest), data)
+            self._total += len(data)
+        await db.execute(
+            """INSERT INTO blobs (digest, mime, tokens, size, created_at, used_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(digest) DO UPDATE SET created_at = excluded.created_at,
+                                                 used_at = excluded.used_at""",
+            [digest, mime, tokens, len(data), now, now],
+        )
+        await db.executemany(
+            "INSERT OR REPLACE INTO image_keys (key, digest) VALUES (?, ?)",
+            [(k, digest) for k in keys],
+        )
+        await db.commit()
+        await self._evict(db)
+
+    async def _evict(self, db):
+        """Drop expired entries, then least recently used ones over max_bytes."""
+        cutoff = time.time() - self.ttl
+        cursor = await db.execute("SELECT digest, size FROM blobs WHERE created_at < ?", [cutoff])
+        doomed = [tuple(row) for row in await cursor.fetchall()]
+        total = self._total - sum(size for _, size in doomed)
+        if total > self.max_bytes:
+            cursor = await db.execute(
+                "SELECT digest, size FROM blobs WHERE created_at >= ? ORDER BY used_at", [cutoff])
+            async for digest, size in cursor:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((digest, size))
+                total -= size
+        if doomed:
+            await self._drop(db, doomed)
+
+    async def _drop(self, db, entries: list):
+        digests = [d for d, _ in entries]
+        marks = ",".join("?" * len(digests))
+        await db.execute(f"DELETE FROM image_keys WHERE digest IN ({marks})", digests)
+        await db.execute(f"DELETE FROM blobs WHERE digest IN ({marks})", digests)
+        await db.commit()
+        self._total -= sum(size for _, size in entries)
+        await asyncio.to_thread(_remove, [self._path(d) for d in digests])
+
+    def describe(self) -> str:
+        """One-line summary for !claistatus."""
+        total = sum(self.stats.values())
+        rate = f"{self.stats['hit'] / total:.0%}" if total else "n/a"
+        return (f"Image cache: {self._total / 1e6:.1f}/{self.max_bytes / 1e6:.0f}MB | "
+                f"{rate} hit rate ({self.stats['hit']} hits, {self.stats['raw']} re-downloads, "
+                f"{self.stats['miss']} misses)")
+
+
+# Dummy setup since it's not a cog but an extra module used by one
+async def setup(bot):
+    pass
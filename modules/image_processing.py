@@ -0,0 +1,165 @@
+"""Image downscaling for AI prompts, off the event loop.
+
+downscale_image() turns an image into a JPEG that fits the API's size and
+dimension limits. It is CPU-heavy (decode, resize, JPEG encodes), so the
+Copilot cog runs it in an ImagePool of worker processes instead of on the
+bot's event loop. Keep this module free of discord imports: the workers
+import it on start.
+
+Big JPEGs are decoded with Image.draft(), which has libjpeg scale the DCT
+by 1/2, 1/4 or 1/8 while decoding, and other formats are box-reduced with
+Image.reduce() before the final LANCZOS resize, so a 6000px photo never
+gets fully decoded and resampled. JPEG quality is picked by interpolating
+between measured encode sizes rather than stepping through fixed levels.
+"""
+
+import asyncio
+import io
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+WORKERS = 2                 # worker processes; images are big, don't hog every core
+QUALITY_MAX = 85            # first (and usually only) JPEG encode
+QUALITY_MIN = 30            # below this, shrink the image instead
+QUALITY_STEP = 5            # stop searching once the bracket is this narrow
+QUALITY_TRIES = 3           # encodes per size while searching for a quality
+MIN_QUALITY_RATIO = 0.4     # rough size at QUALITY_MIN relative to QUALITY_MAX
+MAX_SHRINKS = 3             # dimension reductions when no quality fits
+
+
+def _encode(img, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def _fit_quality(img, max_bytes: int) -> tuple[bytes | None, bytes]:
+    """Highest JPEG quality (within QUALITY_STEP) that fits max_bytes.
+
+    Returns (fitting_bytes or None, smallest_bytes_tried).
+    """
+    data = _encode(img, QUALITY_MAX)
+    if len(data) <= max_bytes:
+        return data, data
+    # Interpolate between the closest sizes known so far; the size at
+    # QUALITY_MIN is a guess until it's been tried.
+    hi_q, hi_n = QUALITY_MAX, len(data)
+    lo_q, lo_n = QUALITY_MIN, len(data) * MIN_QUALITY_RATIO
+    best, smallest = None, data
+    for _ in range(QUALITY_TRIES):
+        q = lo_q + (hi_q - lo_q) * (max_bytes - lo_n) / max(hi_n - lo_n, 1)
+        q = int(max(lo_q, min(hi_q - 1, q)))
+        data = _encode(img, q)
+        if len(data) < len(smallest):
+            smallest = data
+        if len(data) <= max_bytes:
+            best, lo_q, lo_n = data, q, len(data)
+        else:
+            hi_q, hi_n = q, len(data)
+            if q == QUALITY_MIN:
+                break  # even the lowest quality doesn't fit
+        if best is not None and hi_q - lo_q <= QUALITY_STEP:
+            break
+    return best, smallest
+
+
+def downscale_image(data: bytes, max_bytes: int, max_dim: int) -> tuple[bytes, str]:
+    """Downscale image if too large. Returns (bytes, mime_type).
+
+    Converts to JPEG for efficiency, at most max_dim on either side and
+    max_bytes long if it can be done by lowering quality or, failing
+    that, shrinking further.
+    """
+    img = Image.open(io.BytesIO(data))
+
+    # Target size: fit within max_dim
+    w, h = img.size
+    ratio = min(1.0, max_dim / w, max_dim / h)
+    target = (max(1, int(w * ratio)), max(1, int(h * ratio)))
+
+    # JPEG fast path: let the decoder downscale (result is >= target)
+    if ratio < 1 and img.format == "JPEG":
+        img.draft("RGB", target)
+
+    # Convert to RGB (handles RGBA PNGs, palette images, etc.)
+    if img.mode in ("RGBA", "P", "LA"):
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode in ("P", "LA"):
+            img = img.convert("RGBA")
+        bg.paste(img, mask=img.split()[-1])
+        img = bg
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    if img.size != target:
+        # Cheap box reduction down to ~2x the target, then LANCZOS the rest
+        factor = int(min(img.size[0] / target[0], img.size[1] / target[1]) // 2)
+        if factor >= 2:
+            img = img.reduce(factor)
+        img = img.resize(target, Image.LANCZOS)
+
+    result, smallest = _fit_quality(img, max_bytes)
+    shrinks = 0
+    while result is None and shrinks < MAX_SHRINKS:
+        # Encoded size scales with pixel count; aim a little under
+        scale = min(0.9, math.sqrt(max_bytes / len(smallest)) * 0.9)
+        w, h = img.size
+        img = img.resize((max(1, int(w * scale)), max(1, int(h * scale))), Image.LANCZOS)
+        result, smallest = _fit_quality(img, max_bytes)
+        shrinks += 1
+
+    # Give up and return whatever we have
+    return result or smallest, "image/jpeg"
+
+
+class ImagePool:
+    """Runs downscale_image() in a small pool of worker processes.
+
+    The pool is started on first use and restarted if a worker dies (e.g.
+    killed for memory on a huge image); that job raises, later ones get a
+    fresh pool.
+    """
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._pool = None
+        self.jobs = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the bot process has threads (aiosqlite, executors).
+            # Workers import the main script as __mp_main__, so palbot.py
+            # only starts the bot under its __main__ guard.
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def downscale(self, data: bytes, max_bytes: int, max_dim: int) -> tuple[bytes, str]:
+        """downscale_image() in a worker process."""
+        pool = self._executor()
+        self.jobs += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, downscale_image, data, max_bytes, max_dim)
+        except BrokenProcessPool:
+            if self._pool is pool:
+                self._pool = None
+            raise
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Dummy setup since it's not a cog but an extra module used by one
+async def setup(bot):
+    pass
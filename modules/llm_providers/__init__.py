@@ -3,14 +3,26 @@
 Provides a common interface for different LLM providers.
 """
 
-from .base import LLMProvider, estimate_tokens, calculate_cost
+from .base import LLMProvider, estimate_tokens, calculate_cost, read_chat_stream
 from .copilot import CopilotProvider
 from .openai import OpenAIProvider
+from .http_client import (HTTPClient, CallStats, CHAT_TIMEOUT,
+                          COMPACTION_TIMEOUT, PROBE_TIMEOUT)
+from .tokenizer import HeuristicTokenizer, BPETokenizer, load_tokenizer
 
 __all__ = [
     "LLMProvider",
     "estimate_tokens",
     "calculate_cost",
+    "read_chat_stream",
     "CopilotProvider",
     "OpenAIProvider",
+    "HTTPClient",
+    "CallStats",
+    "CHAT_TIMEOUT",
+    "COMPACTION_TIMEOUT",
+    "PROBE_TIMEOUT",
+    "HeuristicTokenizer",
+    "BPETokenizer",
+    "load_tokenizer",
 ]
@@ -3,13 +3,19 @@
 Defines the interface that all providers must implement.
 """
 
+import json
 from abc import ABC, abstractmethod
-from typing import List, Dict, Tuple
+from typing import Awaitable, Callable, List, Dict, Tuple
+
+from .tokenizer import HeuristicTokenizer
 
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
+    # Token counter for budgets; providers take a shared one (see tokenizer.py)
+    tokenizer = HeuristicTokenizer()
+
     @abstractmethod
     async def get_auth(self) -> Tuple[str, str]:
         """Return (token, base_url) for API authentication.
@@ -20,20 +26,45 @@ class LLMProvider(ABC):
         pass
 
     @abstractmethod
-    async def chat(self, payload: Dict) -> Dict:
+    async def chat(self, payload: Dict, stats=None) -> Dict:
         """Send a chat completion request.
 
         Args:
             payload: Full request payload dict with 'messages', 'model', 'max_tokens' keys
+            stats: Optional http_client.CallStats to record connection reuse/retries
 
         Returns:
             dict: Response from API with 'choices' containing message content and usage info
         """
         pass
 
-    @abstractmethod
+    async def chat_stream(
+        self,
+        payload: Dict,
+        on_delta: Callable[[str], Awaitable[None]],
+        stats=None
+    ) -> Dict:
+        """Send a chat completion request, delivering content as it's generated.
+
+        Providers without streaming support fall back to chat() and deliver
+        the whole answer as a single delta.
+
+        Args:
+            payload: Full request payload dict with 'messages', 'model', 'max_tokens' keys
+            on_delta: Awaited with each new fragment of the answer text
+            stats: Optional http_client.CallStats to record connection reuse/retries
+
+        Returns:
+            dict: Same shape as chat(), assembled from the stream
+        """
+        data = await self.chat(payload, stats=stats)
+        content = data["choices"][0]["message"].get("content") or ""
+        if content:
+            await on_delta(content)
+        return data
+
     def estimate_tokens(self, text: str) -> int:
-        """Estimate token count for text.
+        """Estimate token count for text with the provider's tokenizer.
 
         Args:
             text: Text to estimate
@@ -41,7 +72,7 @@ class LLMProvider(ABC):
         Returns:
             int: Estimated token count
         """
-        pass
+        return self.tokenizer.count(text)
 
     @abstractmethod
     def calculate_cost(
@@ -65,6 +96,54 @@ class LLMProvider(ABC):
         pass
 
 
+async def read_chat_stream(resp, on_delta: Callable[[str], Awaitable[None]]) -> Dict:
+    """Read an OpenAI-style SSE chat stream into a chat()-shaped response.
+
+    Args:
+        resp: aiohttp response for a request made with "stream": true
+        on_delta: Awaited with each content fragment as it arrives
+
+    Returns:
+        dict: {'choices': [{'message': {...}, 'finish_reason': ...}], 'usage': {...}}
+        with content and reasoning_content joined from the deltas. usage
+        is only present if the server sent it (stream_options.include_usage).
+    """
+    content = []
+    reasoning = []
+    usage = {}
+    finish_reason = None
+    async for raw in resp.content:
+        line = raw.decode("utf-8", "replace").strip()
+        if not line.startswith("data:"):
+            continue  # blank separators, comments, event: lines
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if chunk.get("usage"):
+            usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("reasoning_content"):
+                reasoning.append(delta["reasoning_content"])
+            if delta.get("content"):
+                content.append(delta["content"])
+                await on_delta(delta["content"])
+            if choice.get("finish_reason"):
+                finish_reason = choice["finish_reason"]
+
+    message = {"role": "assistant", "content": "".join(content)}
+    if reasoning:
+        message["reasoning_content"] = "".join(reasoning)
+    return {
+        "choices": [{"message": message, "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
 # Token estimation utilities
 def estimate_tokens(text: str) -> int:
     """Rough token count heuristic.
@@ -6,9 +6,9 @@ import os
 import re
 import time
 from typing import Dict, Optional, Tuple
-from aiohttp import ClientSession
 
-from .base import LLMProvider, estimate_tokens, calculate_cost
+from .base import LLMProvider, calculate_cost, read_chat_stream
+from .http_client import HTTPClient, CallStats, PROBE_TIMEOUT
 
 # GitHub OAuth client ID used by Copilot editors for device code flow
 GITHUB_COPILOT_CLIENT_ID = "01ab8ac9400c4e429b23"
@@ -17,13 +17,18 @@ GITHUB_COPILOT_CLIENT_ID = "01ab8ac9400c4e429b23"
 class CopilotProvider(LLMProvider):
     """GitHub Copilot API provider."""
 
-    def __init__(self, bot):
+    def __init__(self, bot, http: Optional[HTTPClient] = None, tokenizer=None):
         """Initialize Copilot provider.
 
         Args:
             bot: Discord bot instance (for config and logging)
+            http: Shared HTTPClient (a private one is created if omitted)
+            tokenizer: Shared tokenizer for estimate_tokens (default: len/4 heuristic)
         """
         self.bot = bot
+        self.http = http or HTTPClient()
+        if tokenizer is not None:
+            self.tokenizer = tokenizer
         self.token_path = bot.config.github_copilot_token_path
         self.auth_profile_path = bot.config.github_copilot_auth_profile_path
         self._pending_device_flow = None  # tracks an in-progress device auth
@@ -80,28 +85,29 @@ class CopilotProvider(LLMProvider):
 
         # Exchange for new Copilot API token
         now_ms = time.time() * 1000
-        async with ClientSession() as session:
-            async with session.get(
-                "https://api.github.com/copilot_internal/v2/token",
-                headers={
-                    "Accept": "application/json",
-                    "Authorization": f"Bearer {github_token}",
-                    "Editor-Version": "vscode/1.96.2",
-                    "User-Agent": "GitHubCopilotChat/0.26.7",
-                }
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(f"Token refresh failed: {resp.status} - {error_text}")
-
-                data = await resp.json()
-                token = data["token"]
-                # GitHub returns seconds, convert to ms
-                expires_at_raw = data["expires_at"]
-                if expires_at_raw > 10_000_000_000:
-                    expires_at = expires_at_raw  # already ms
-                else:
-                    expires_at = expires_at_raw * 1000
+        async with self.http.request(
+            "GET",
+            "https://api.github.com/copilot_internal/v2/token",
+            headers={
+                "Accept": "application/json",
+                "Authorization": f"Bearer {github_token}",
+                "Editor-Version": "vscode/1.96.2",
+                "User-Agent": "GitHubCopilotChat/0.26.7",
+            },
+            timeout=PROBE_TIMEOUT,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"Token refresh failed: {resp.status} - {error_text}")
+
+            data = await resp.json()
+            token = data["token"]
+            # GitHub returns seconds, convert to ms
+            expires_at_raw = data["expires_at"]
+            if expires_at_raw > 10_000_000_000:
+                expires_at = expires_at_raw  # already ms
+            else:
+                expires_at = expires_at_raw * 1000
 
         # Save refreshed token
         new_token_data = {
@@ -124,21 +130,22 @@ class CopilotProvider(LLMProvider):
             dict: Contains 'device_code', 'user_code', 'verification_uri',
                   'interval', and 'expires_in' from GitHub.
         """
-        async with ClientSession() as session:
-            async with session.post(
-                "https://github.com/login/device/code",
-                headers={"Accept": "application/json"},
-                data={
-                    "client_id": GITHUB_COPILOT_CLIENT_ID,
-                    "scope": "read:user",
-                },
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(
-                        f"Failed to start device flow: {resp.status} - {error_text}"
-                    )
-                data = await resp.json()
+        async with self.http.request(
+            "POST",
+            "https://github.com/login/device/code",
+            headers={"Accept": "application/json"},
+            data={
+                "client_id": GITHUB_COPILOT_CLIENT_ID,
+                "scope": "read:user",
+            },
+            timeout=PROBE_TIMEOUT,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(
+                    f"Failed to start device flow: {resp.status} - {error_text}"
+                )
+            data = await resp.json()
 
         self._pending_device_flow = data
         return data
@@ -164,38 +171,39 @@ class CopilotProvider(LLMProvider):
         deadline = time.time() + expires_in
 
         try:
-            async with ClientSession() as session:
-                while time.time() < deadline:
-                    await asyncio.sleep(interval)
-
-                    async with session.post(
-                        "https://github.com/login/oauth/access_token",
-                        headers={"Accept": "application/json"},
-                        data={
-                            "client_id": GITHUB_COPILOT_CLIENT_ID,
-                            "device_code": device_code,
-                            "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
-                        },
-                    ) as resp:
-                        data = await resp.json()
-
-                    error = data.get("error")
-                    if error is None:
-                        # Success
-                        access_token = data["access_token"]
-                        self._save_oauth_token(access_token)
-                        self._pending_device_flow = None
-                        return access_token
-
-                    if error == "authorization_pending":
-                        continue
-                    if error == "slow_down":
-                        interval = data.get("interval", interval + 5)
-                        continue
-                    if error in ("expired_token", "access_denied"):
-                        raise Exception(f"Device flow {error.replace('_', ' ')}")
-
-                    raise Exception(f"Device flow error: {error}")
+            while time.time() < deadline:
+                await asyncio.sleep(interval)
+
+                async with self.http.request(
+                    "POST",
+                    "https://github.com/login/oauth/access_token",
+                    headers={"Accept": "application/json"},
+                    data={
+                        "client_id": GITHUB_COPILOT_CLIENT_ID,
+                        "device_code": device_code,
+                        "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
+                    },
+                    timeout=PROBE_TIMEOUT,
+                ) as resp:
+                    data = await resp.json()
+
+                error = data.get("error")
+                if error is None:
+                    # Success
+                    access_token = data["access_token"]
+                    self._save_oauth_token(access_token)
+                    self._pending_device_flow = None
+                    return access_token
+
+                if error == "authorization_pending":
+                    continue
+                if error == "slow_down":
+                    interval = data.get("interval", interval + 5)
+                    continue
+                if error in ("expired_token", "access_denied"):
+                    raise Exception(f"Device flow {error.replace('_', ' ')}")
+
+                raise Exception(f"Device flow error: {error}")
 
             raise Exception("Device flow expired (timed out)")
         finally:
@@ -269,47 +277,64 @@ class CopilotProvider(LLMProvider):
             "api_token_valid": api_token_valid,
         }
 
-    async def chat(self, payload: Dict) -> Dict:
+    def _chat_headers(self, token: str) -> Dict:
+        """Headers for the chat completions endpoint."""
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Copilot-Integration-Id": "vscode-chat",
+            "Editor-Version": "vscode/1.95.0",
+        }
+
+    async def chat(self, payload: Dict, stats: Optional[CallStats] = None) -> Dict:
         """Send a chat completion request to GitHub Copilot API.
 
         Args:
             payload: Full request payload with 'messages', 'model', 'max_tokens' keys
+            stats: Optional CallStats filled in with connection reuse/retries
 
         Returns:
             dict: API response
         """
         token, base_url = await self.get_auth()
 
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-            "Copilot-Integration-Id": "vscode-chat",
-            "Editor-Version": "vscode/1.95.0",
-        }
-
-        async with ClientSession() as session:
-            async with session.post(
-                f"{base_url}/chat/completions",
-                headers=headers,
-                json=payload
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(f"API error {resp.status}: {error_text[:200]}")
-                return await resp.json()
-
-    def estimate_tokens(self, text: str) -> int:
-        """Estimate token count for text.
-
-        Uses the same heuristic as the base class.
+        async with self.http.request(
+            "POST",
+            f"{base_url}/chat/completions",
+            headers=self._chat_headers(token),
+            json=payload,
+            stats=stats,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"API error {resp.status}: {error_text[:200]}")
+            return await resp.json()
+
+    async def chat_stream(self, payload: Dict, on_delta,
+                          stats: Optional[CallStats] = None) -> Dict:
+        """Streaming chat completion (SSE) against GitHub Copilot API.
 
         Args:
-            text: Text to estimate
+            payload: Full request payload with 'messages', 'model', 'max_tokens' keys
+            on_delta: Awaited with each new fragment of the answer text
+            stats: Optional CallStats filled in with connection reuse/retries
 
         Returns:
-            int: Estimated token count
+            dict: API response assembled from the stream (same shape as chat())
         """
-        return estimate_tokens(text)
+        token, base_url = await self.get_auth()
+
+        async with self.http.request(
+            "POST",
+            f"{base_url}/chat/completions",
+            headers=self._chat_headers(token),
+            json={**payload, "stream": True, "stream_options": {"include_usage": True}},
+            stats=stats,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"API error {resp.status}: {error_text[:200]}")
+            return await read_chat_stream(resp, on_delta)
 
     def calculate_cost(
         self,
@@ -0,0 +1,173 @@
+"""Shared HTTP client for LLM providers.
+
+One pooled aiohttp session (keep-alive, per-host connection limits) shared
+by the providers, compaction and the small probe requests, with per-call
+timeouts and jittered retry on 429/5xx.
+"""
+
+import asyncio
+import contextlib
+import random
+import time
+from typing import Optional
+
+import aiohttp
+
+# Per-call timeouts. CHAT matches aiohttp's own default so long answers
+# behave as before; PROBE is for search APIs and image downloads.
+CHAT_TIMEOUT = aiohttp.ClientTimeout(total=300)
+COMPACTION_TIMEOUT = aiohttp.ClientTimeout(total=120)
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5   # seconds; attempt n sleeps up to BACKOFF_BASE * 2**n
+BACKOFF_MAX = 8.0    # also caps a server's Retry-After
+
+# Connection errors that are safe to retry: the request never reached the
+# server, or a pooled keep-alive connection was closed under us.
+RETRY_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError)
+
+
+class CallStats:
+    """Connection details for one logical call (all attempts)."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.reused = 0
+        self.connect_ms = 0.0   # time spent opening new connections
+        self.saved_ms = 0.0     # handshake time avoided by reusing connections
+        self._connect_t0 = None
+        self._host = None
+
+    def debug_label(self) -> str:
+        """Short form for the 🔧 debug line, e.g. `conn:reuse-120ms`."""
+        if self.reused:
+            label = f"conn:reuse-{self.saved_ms:.0f}ms"
+        else:
+            label = f"conn:new+{self.connect_ms:.0f}ms"
+        if self.retries:
+            label += f" retry×{self.retries}"
+        return label
+
+
+class HTTPClient:
+    """Pooled aiohttp session with per-call timeouts and retries."""
+
+    def __init__(self, limit_per_host: int = 8, keepalive_timeout: float = 60):
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        # Moving average of new-connection setup time (TCP+TLS) per host,
+        # used to estimate what a reused connection saved.
+        self._connect_ms = {}
+        self.stats = {"requests": 0, "reused": 0, "retries": 0, "saved_ms": 0.0}
+
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use."""
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_start.append(self._on_connection_create_start)
+            trace.on_connection_create_end.append(self._on_connection_create_end)
+            trace.on_connection_reuseconn.append(self._on_connection_reuseconn)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                ),
+                timeout=CHAT_TIMEOUT,
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, *,
+                      timeout: aiohttp.ClientTimeout = CHAT_TIMEOUT,
+                      retries: int = MAX_RETRIES,
+                      stats: Optional[CallStats] = None, **kwargs):
+        """Make a request, retrying 429/5xx and dropped connections.
+
+        Yields the final aiohttp response (which may still be an error
+        status once retries run out); the caller reads it as usual.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            timeout: Timeout for each attempt
+            retries: Extra attempts after the first
+            stats: Optional CallStats to fill in for the debug line
+            **kwargs: Passed through to aiohttp (headers, json, params...)
+        """
+        if stats is None:
+            stats = CallStats()
+        session = self.session()
+        while True:
+            stats.attempts += 1
+            self.stats["requests"] += 1
+            try:
+                resp = await session.request(method, url, timeout=timeout,
+                                             trace_request_ctx=stats, **kwargs)
+            except RETRY_ERRORS:
+                if stats.retries >= retries:
+                    raise
+                delay = self._backoff(stats.retries)
+            else:
+                if resp.status not in RETRY_STATUSES or stats.retries >= retries:
+                    break
+                delay = self._backoff(stats.retries, resp.headers.get("Retry-After"))
+                resp.release()
+            stats.retries += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+        try:
+            yield resp
+        finally:
+            resp.release()
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After."""
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+
+    # ── Trace hooks ─────────────────────────────────────────────
+
+    async def _on_request_start(self, session, trace_ctx, params):
+        stats = trace_ctx.trace_request_ctx
+        if isinstance(stats, CallStats):
+            stats._host = params.url.host
+
+    async def _on_connection_create_start(self, session, trace_ctx, params):
+        stats = trace_ctx.trace_request_ctx
+        if isinstance(stats, CallStats):
+            stats._connect_t0 = time.monotonic()
+
+    async def _on_connection_create_end(self, session, trace_ctx, params):
+        stats = trace_ctx.trace_request_ctx
+        if not isinstance(stats, CallStats) or stats._connect_t0 is None:
+            return
+        ms = (time.monotonic() - stats._connect_t0) * 1000
+        stats.connect_ms += ms
+        prev = self._connect_ms.get(stats._host)
+        self._connect_ms[stats._host] = ms if prev is None else prev * 0.8 + ms * 0.2
+
+    async def _on_connection_reuseconn(self, session, trace_ctx, params):
+        stats = trace_ctx.trace_request_ctx
+        if not isinstance(stats, CallStats):
+            return
+        saved = self._connect_ms.get(stats._host, 0.0)
+        stats.reused += 1
+        stats.saved_ms += saved
+        self.stats["reused"] += 1
+        self.stats["saved_ms"] += saved
@@ -4,24 +4,30 @@ Supports OpenAI API-compatible endpoints (e.g., llama.cpp server, GLM-4.7 Flash)
 """
 
 import time
-from typing import Dict, Tuple
-from aiohttp import ClientSession
+from typing import Dict, Optional, Tuple
 
-from .base import LLMProvider, estimate_tokens, calculate_cost
+from .base import LLMProvider, calculate_cost, read_chat_stream
+from .http_client import HTTPClient, CallStats
 
 
 class OpenAIProvider(LLMProvider):
     """OpenAI-compatible API provider."""
 
-    def __init__(self, bot, base_url: str = "https://llm.00id.net/v1", api_key: str = None):
+    def __init__(self, bot, base_url: str = "https://llm.00id.net/v1", api_key: str = None,
+                 http: Optional[HTTPClient] = None, tokenizer=None):
         """Initialize OpenAI provider.
 
         Args:
             bot: Discord bot instance
             base_url: Base URL for API (default: https://llm.00id.net/v1)
             api_key: API key for authentication (optional)
+            http: Shared HTTPClient (a private one is created if omitted)
+            tokenizer: Shared tokenizer for estimate_tokens (default: len/4 heuristic)
         """
         self.bot = bot
+        self.http = http or HTTPClient()
+        if tokenizer is not None:
+            self.tokenizer = tokenizer
         self.base_url = base_url
         self.api_key = api_key or "sk-no-key-required"  # Some servers don't require auth
 
@@ -34,41 +40,62 @@ class OpenAIProvider(LLMProvider):
         """
         return self.api_key, self.base_url
 
-    async def chat(self, payload: Dict) -> Dict:
+    def _chat_headers(self, api_key: str) -> Dict:
+        """Headers for the chat completions endpoint."""
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+
+    async def chat(self, payload: Dict, stats: Optional[CallStats] = None) -> Dict:
         """Send a chat completion request to OpenAI-compatible API.
 
         Args:
             payload: Full request payload with 'messages', 'model', 'max_tokens' keys
+            stats: Optional CallStats filled in with connection reuse/retries
 
         Returns:
             dict: API response
         """
         api_key, base_url = await self.get_auth()
 
-        async with ClientSession() as session:
-            async with session.post(
-                f"{base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json=payload
-            ) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    raise Exception(f"API error {resp.status}: {error_text[:200]}")
-                return await resp.json()
-
-    def estimate_tokens(self, text: str) -> int:
-        """Estimate token count for text.
+        async with self.http.request(
+            "POST",
+            f"{base_url}/chat/completions",
+            headers=self._chat_headers(api_key),
+            json=payload,
+            stats=stats,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"API error {resp.status}: {error_text[:200]}")
+            return await resp.json()
+
+    async def chat_stream(self, payload: Dict, on_delta,
+                          stats: Optional[CallStats] = None) -> Dict:
+        """Streaming chat completion (SSE) against the OpenAI-compatible API.
 
         Args:
-            text: Text to estimate
+            payload: Full request payload with 'messages', 'model', 'max_tokens' keys
+            on_delta: Awaited with each new fragment of the answer text
+            stats: Optional CallStats filled in with connection reuse/retries
 
         Returns:
-            int: Estimated token count
+            dict: API response assembled from the stream (same shape as chat())
         """
-        return estimate_tokens(text)
+        api_key, base_url = await self.get_auth()
+
+        async with self.http.request(
+            "POST",
+            f"{base_url}/chat/completions",
+            headers=self._chat_headers(api_key),
+            json={**payload, "stream": True, "stream_options": {"include_usage": True}},
+            stats=stats,
+        ) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                raise Exception(f"API error {resp.status}: {error_text[:200]}")
+            return await read_chat_stream(resp, on_delta)
 
     def calculate_cost(
         self,
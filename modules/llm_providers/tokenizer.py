@@ -0,0 +1,171 @@
+"""Token counting for context budgets.
+
+HeuristicTokenizer is the old len(text)/4 estimate. BPETokenizer counts
+real tokens with a BPE vocabulary loaded from a local tiktoken-format file
+(e.g. cl100k_base.tiktoken), if tiktoken is installed. Neither vocabulary
+is exactly what Claude or GLM use, but BPE counts are close enough to
+drop most of the safety margin the heuristic needs.
+
+BPE counts are cached per text, so a channel's messages are tokenized
+once rather than on every request that budgets them. count_many_async()
+encodes large batches of cache misses (a channel's first request) in a
+worker thread rather than on the event loop.
+"""
+
+import asyncio
+import os
+from typing import List, Optional
+
+try:
+    import tiktoken
+    from tiktoken.load import load_tiktoken_bpe
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+# Pre-tokenizer patterns that go with each published vocabulary, picked
+# by the vocab file's name. Anything else gets the cl100k one.
+CL100K_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""
+O200K_PATTERN = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+PATTERNS = {"cl100k_base": CL100K_PATTERN, "o200k_base": O200K_PATTERN}
+
+CACHE_SIZE = 200_000    # texts per cache generation (see BPETokenizer)
+BATCH_MIN = 64          # cache misses worth handing to tiktoken's threaded batch encoder
+BATCH_THREADS = min(8, os.cpu_count() or 1)   # one thread per text is a loss on a single core
+OFFLOAD_MIN = 1000      # cache misses worth encoding off the event loop (~7ms of BPE)
+
+
+class HeuristicTokenizer:
+    """len(text)/4. Can undercount by 20-30% on code, URLs, or non-English
+    text, hence the 1.2x margin for budgets."""
+
+    name = "len/4"
+    margin = 1.2
+
+    def count(self, text: str) -> int:
+        return int(len(text) / 4)
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        return [int(len(t) / 4) for t in texts]
+
+    async def count_many_async(self, texts: List[str]) -> List[int]:
+        return self.count_many(texts)
+
+    def describe(self) -> str:
+        return f"Tokenizer: {self.name} heuristic"
+
+
+class BPETokenizer:
+    """Exact BPE token counts from a local tiktoken vocab file.
+
+    Counts are cached in two generations of CACHE_SIZE texts: lookups
+    check the current generation, then the previous one (promoting hits),
+    and when the current one fills up it becomes the previous one. That
+    keeps recently used texts like an LRU at plain-dict cost.
+    """
+
+    # The vocab isn't the answering model's own, so keep a small margin
+    margin = 1.05
+
+    def __init__(self, vocab_path: str, cache_size: int = CACHE_SIZE):
+        self.name = os.path.basename(vocab_path).split(".")[0]
+        self._enc = tiktoken.Encoding(
+            name=self.name,
+            pat_str=PATTERNS.get(self.name, CL100K_PATTERN),
+            mergeable_ranks=load_tiktoken_bpe(vocab_path),
+            special_tokens={},
+        )
+        self.cache_size = cache_size
+        self._cache = {}
+        self._old = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, text: str) -> Optional[int]:
+        n = self._cache.get(text)
+        if n is None:
+            n = self._old.get(text)
+            if n is not None:
+                self._store(text, n)
+        return n
+
+    def _store(self, text: str, n: int):
+        if len(self._cache) >= self.cache_size:
+            self._old = self._cache
+            self._cache = {}
+        self._cache[text] = n
+
+    def count(self, text: str) -> int:
+        n = self._lookup(text)
+        if n is None:
+            self.misses += 1
+            n = len(self._enc.encode_ordinary(text))
+            self._store(text, n)
+        else:
+            self.hits += 1
+        return n
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        """count() for each text; cache misses are encoded in one batch."""
+        counts, missing = self._lookup_many(texts)
+        if missing:
+            todo = [texts[i] for i in missing]
+            self._fill(counts, missing, todo, self._encode_lengths(todo))
+        return counts
+
+    async def count_many_async(self, texts: List[str]) -> List[int]:
+        """count_many(), but OFFLOAD_MIN or more cache misses are encoded
+        in the default executor so the event loop keeps running. The cache
+        itself is only touched on the loop."""
+        counts, missing = self._lookup_many(texts)
+        if missing:
+            todo = [texts[i] for i in missing]
+            if len(todo) >= OFFLOAD_MIN:
+                lengths = await asyncio.get_running_loop().run_in_executor(
+                    None, self._encode_lengths, todo)
+            else:
+                lengths = self._encode_lengths(todo)
+            self._fill(counts, missing, todo, lengths)
+        return counts
+
+    def _lookup_many(self, texts: List[str]):
+        """Cached counts (None for misses) and the indexes of the misses."""
+        counts = [self._lookup(t) for t in texts]
+        missing = [i for i, n in enumerate(counts) if n is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return counts, missing
+
+    def _encode_lengths(self, texts: List[str]) -> List[int]:
+        if len(texts) >= BATCH_MIN and BATCH_THREADS > 1:
+            tokens = self._enc.encode_ordinary_batch(texts, num_threads=BATCH_THREADS)
+        else:
+            tokens = [self._enc.encode_ordinary(t) for t in texts]
+        return [len(toks) for toks in tokens]
+
+    def _fill(self, counts, missing, todo, lengths):
+        for i, text, n in zip(missing, todo, lengths):
+            counts[i] = n
+            self._store(text, n)
+
+    def describe(self) -> str:
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return (f"Tokenizer: {self.name} BPE | cache {len(self._cache) + len(self._old):,} texts, "
+                f"{rate} hit rate")
+
+
+def load_tokenizer(vocab_path: Optional[str] = None):
+    """A BPETokenizer for vocab_path, or the heuristic if there's no path
+    or tiktoken isn't installed. Raises if the vocab file can't be loaded."""
+    if vocab_path and HAS_TIKTOKEN:
+        return BPETokenizer(vocab_path)
+    return HeuristicTokenizer()
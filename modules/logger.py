@@ -3,7 +3,14 @@ import discord
 from datetime import datetime, timezone
 import os
 import aiosqlite
+import asyncio
+import contextlib
+import functools
 import re
+import time
+from collections import Counter
+
+from modules.singleflight import SingleFlight
 
 NEW_CHANNEL = "INSERT OR IGNORE INTO channels VALUES (?, ?, ?, ?);"
 NEW_TOPIC = "INSERT OR IGNORE INTO channel_topics VALUES (?, ?, ?);"
@@ -18,9 +25,81 @@ DEL_MESSAGE = "UPDATE messages SET deleted = (?) WHERE snowflake = (?);"
 NEW_MENTION = "INSERT OR IGNORE INTO message_mentions VALUES (?, ?);"
 NEW_REACTION = "INSERT OR IGNORE INTO message_reactions VALUES (?, ?, ?, ?);"
 
+BUMP_WORD_COUNT = """INSERT INTO word_counts VALUES (?, ?, ?, ?)
+ON CONFLICT (token, channel_id, user_id)
+DO UPDATE SET messages = messages + excluded.messages;"""
+
+# Writes are queued and flushed in batches. Within a batch each statement
+# is run with executemany in this order, so a message row always lands
+# before any mention, edit, delete or reaction that refers to it.
+# Rows for the same statement keep the order they were queued in.
+WRITE_ORDER = (NEW_CHANNEL, NEW_USER, NEW_MESSAGE, NEW_MENTION,
+               EDIT_MESSAGE, DEL_MESSAGE, NEW_REACTION,
+               NEW_NICK, NEW_TAG, NEW_TOPIC)
+
+# Flush when this many rows are queued, or after this many seconds
+FLUSH_MAX_ROWS = 200
+FLUSH_INTERVAL = 0.5
+# A batch that fails to commit (db locked, disk hiccup) is put back at the
+# head of its guild's queue and retried on later flushes, this many times
+FLUSH_RETRIES = 5
+
+# WAL lets the read pool run alongside the writer. synchronous=NORMAL is
+# safe under WAL (only the last commits can be lost on power failure).
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",      # ~16MB
+    "PRAGMA mmap_size = 268435456;",    # 256MB
+    "PRAGMA temp_store = MEMORY;",
+)
+READER_PRAGMAS = (
+    "PRAGMA cache_size = -32000;",      # ~32MB, readers do the big scans
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA temp_store = MEMORY;",
+)
+READ_POOL_SIZE = 3
+
+# messages_fts and word_counts backfills: messages per chunk, and seconds
+# to yield between
+MAX_TOKEN_LEN = 32
+BACKFILL_CHUNK = 500
+BACKFILL_PAUSE = 0.05
+
+# Own cache for REGEXP patterns: re's internal cache is shared with the
+# rest of the bot and re.compile still pays a lookup on every row.
+@functools.lru_cache(maxsize=256)
+def _compile_regexp(expr):
+    return re.compile(expr)
+
 def regexp(expr, item):
-    reg = re.compile(expr)
-    return reg.search(item) is not None
+    """SQLite REGEXP (`item REGEXP expr`). Put flags such as (?i) in the
+    pattern, they're compiled in once. NULL on either side gives NULL."""
+    if expr is None or item is None:
+        return None
+    return _compile_regexp(expr).search(item) is not None
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+def message_tokens(text):
+    r"""Distinct lowercased tokens of a message for word_counts.
+
+    Mirrors the WOTD full word regex `(?<!\S)word\b`: a token is any
+    prefix of a whitespace separated chunk that ends on a word boundary,
+    so "pizza-party!" gives pizza, pizza- and pizza-party.
+    """
+    tokens = set()
+    for chunk in text.lower().split():
+        # keep one extra char so the boundary at MAX_TOKEN_LEN is still seen
+        chunk = chunk[:MAX_TOKEN_LEN + 1]
+        for i in range(1, min(len(chunk), MAX_TOKEN_LEN) + 1):
+            left = _is_word_char(chunk[i - 1])
+            right = i < len(chunk) and _is_word_char(chunk[i])
+            if left != right:
+                tokens.add(chunk[:i])
+    return tokens
+
 
 NEWGUILD = """
 CREATE TABLE IF NOT EXISTS 'messages' (
@@ -91,29 +170,479 @@ CREATE TABLE IF NOT EXISTS 'channel_topics' (
     );    
     """
 
+# Versioned schema changes for guild log dbs, applied in order on open.
+# The db's PRAGMA user_version records the last one applied. Append only -
+# never edit or reorder an entry once it has shipped.
+MIGRATIONS = [
+    # 1: covering indexes for the per-channel and per-user history scans.
+    # The filter columns ride along so deleted/ephemeral rows are skipped
+    # without touching the table.
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_channel
+        ON messages (channel_id, snowflake, deleted, ephemeral, user_id);
+    CREATE INDEX IF NOT EXISTS idx_messages_user
+        ON messages (user_id, snowflake, channel_id, deleted, ephemeral);
+    ANALYZE;
+    """,
+    # 2: trigram full-text shadow of messages.message for WOTD counting.
+    # External content, so the text is stored once; triggers keep it in
+    # step with inserts, edits and (hard) deletes. Soft deletes are
+    # filtered by joining back to messages.deleted. Rows logged before
+    # this migration are indexed by a background backfill up to
+    # end_snowflake; the triggers leave the rows it hasn't reached alone
+    # (an FTS 'delete' of text that was never indexed corrupts it).
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+        message, content='messages', content_rowid='snowflake',
+        tokenize='trigram'
+    );
+    CREATE TABLE IF NOT EXISTS messages_fts_backfill (
+        "cursor" integer,
+        "end_snowflake" integer
+    );
+    INSERT INTO messages_fts_backfill
+        SELECT 0, coalesce(max(snowflake), 0) FROM messages
+        WHERE NOT EXISTS (SELECT 1 FROM messages_fts_backfill);
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages
+    WHEN new.snowflake <= (SELECT cursor FROM messages_fts_backfill)
+      OR new.snowflake > (SELECT end_snowflake FROM messages_fts_backfill)
+    BEGIN
+        INSERT INTO messages_fts (rowid, message) VALUES (new.snowflake, new.message);
+    END;
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF message ON messages
+    WHEN old.snowflake <= (SELECT cursor FROM messages_fts_backfill)
+      OR old.snowflake > (SELECT end_snowflake FROM messages_fts_backfill)
+    BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, message)
+            VALUES ('delete', old.snowflake, old.message);
+        INSERT INTO messages_fts (rowid, message) VALUES (new.snowflake, new.message);
+    END;
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages
+    WHEN old.snowflake <= (SELECT cursor FROM messages_fts_backfill)
+      OR old.snowflake > (SELECT end_snowflake FROM messages_fts_backfill)
+    BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, message)
+            VALUES ('delete', old.snowflake, old.message);
+    END;
+    """,
+    # 3: per channel/user token counts (messages containing each token,
+    # see message_tokens). Maintained by Logger.flush; rows logged before
+    # this migration are counted by a background backfill that walks
+    # snowflakes up to end_snowflake.
+    """
+    CREATE TABLE IF NOT EXISTS word_counts (
+        "token" text,
+        "channel_id" integer,
+        "user_id" integer,
+        "messages" integer,
+        PRIMARY KEY (token, channel_id, user_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_word_counts_channel
+        ON word_counts (channel_id, token, messages);
+    CREATE INDEX IF NOT EXISTS idx_word_counts_user
+        ON word_counts (user_id, token, messages);
+    CREATE TABLE IF NOT EXISTS word_counts_backfill (
+        "cursor" integer,
+        "end_snowflake" integer
+    );
+    INSERT INTO word_counts_backfill
+        SELECT 0, coalesce(max(snowflake), 0) FROM messages
+        WHERE NOT EXISTS (SELECT 1 FROM word_counts_backfill);
+    """,
+]
+
+
+async def migrate(conn: aiosqlite.Connection):
+    """Bring a guild log db up to the latest MIGRATIONS version."""
+    async with conn.execute("PRAGMA user_version") as c:
+        version = (await c.fetchone())[0]
+    for target, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        await conn.executescript(script)
+        await conn.execute(f"PRAGMA user_version = {target}")
+        await conn.commit()
+
+
+class ReadPool:
+    """A few read-only connections to one guild log db.
+
+    Every aiosqlite connection runs on its own thread, so long scans on a
+    reader never hold up the writer (or each other, up to `size`).
+    """
+    def __init__(self, path, size=READ_POOL_SIZE):
+        self.path = path
+        self._idle = []
+        self._conns = []
+        self._sem = asyncio.Semaphore(size)
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True)
+        await conn.create_function("REGEXP", 2, regexp, deterministic=True)
+        for pragma in READER_PRAGMAS:
+            await conn.execute(pragma)
+        self._conns.append(conn)
+        return conn
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        async with self._sem:
+            conn = self._idle.pop() if self._idle else await self._connect()
+            try:
+                yield conn
+            finally:
+                self._idle.append(conn)
+
+    async def close(self):
+        for conn in self._conns:
+            await conn.close()
+        self._conns = []
+        self._idle = []
+
+
 class Logger(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.stat_dbs = {}
+        self.read_pools = {}
+        # One open (connect + migrate) per gid, however many callers race it
+        self._opening = SingleFlight()
+        # gid -> [cursor, end_snowflake] of the messages_fts and word_counts backfills
+        self.fts_backfill = {}
+        self.word_backfill = {}
+        # gid -> its backfill task; never more than one per guild, or the
+        # same rows would be counted twice
+        self._backfills = {}
         self.logdir = "logfiles"
         os.makedirs(self.logdir, exist_ok=True)
+        # gid -> {statement: [params, ...]} waiting for the next flush
+        self.pending = {}
+        self.queue_depth = 0
+        # gid -> failed flushes in a row
+        self.flush_failures = {}
+        self.flush_stats = {"flushes": 0, "rows": 0, "last_ms": 0.0, "max_ms": 0.0}
+        self._flush_wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher = None
+        self._closing = False
+
+    async def cog_load(self):
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    @staticmethod
+    def _gid(guild):
+        return guild.id if guild else "None"
+
+    def _db_path(self, gid):
+        return f"{self.logdir}/guild_{gid}_log.sqlite"
 
     async def get_db(self, guild: discord.Guild) -> aiosqlite.Connection:
-        if guild:
-            gid = guild.id
-        else:
-            gid = "None"
-        
+        """The writer connection. Use reader() for queries."""
+        return await self._get_db_by_id(self._gid(guild))
+
+    @contextlib.asynccontextmanager
+    async def reader(self, guild: discord.Guild):
+        """Borrow a read-only connection to the guild log db.
+
+            async with logger_cog.reader(ctx.guild) as db:
+                cursor = await db.execute(...)
+        """
+        gid = self._gid(guild)
+        if gid not in self.read_pools:
+            # The writer creates the file and schema; ro connections can't
+            await self._get_db_by_id(gid)
+            self.read_pools.setdefault(gid, ReadPool(self._db_path(gid)))
+        async with self.read_pools[gid].acquire() as db:
+            yield db
+
+    async def _get_db_by_id(self, gid) -> aiosqlite.Connection:
         if gid in self.stat_dbs:
             return self.stat_dbs[gid]
-        else:
-            conn = await aiosqlite.connect(f"{self.logdir}/guild_{gid}_log.sqlite")
+        conn, _ = await self._opening.do(gid, functools.partial(self._open_db, gid))
+        return conn
+
+    async def _open_db(self, gid) -> aiosqlite.Connection:
+        """Connect and migrate the guild's writer. Only cached once that's
+        done, so nobody writes to a half-migrated db."""
+        conn = await aiosqlite.connect(self._db_path(gid))
+        try:
+            for pragma in WRITER_PRAGMAS:
+                await conn.execute(pragma)
             await conn.create_function("REGEXP", 2, regexp, deterministic=True)
             c = await conn.cursor()
             await c.executescript(NEWGUILD)
             await conn.commit()
-            self.stat_dbs[gid] = conn
-            return self.stat_dbs[gid]
+            await migrate(conn)
+            async with conn.execute("SELECT cursor, end_snowflake FROM messages_fts_backfill") as c:
+                self.fts_backfill[gid] = list(await c.fetchone())
+            async with conn.execute("SELECT cursor, end_snowflake FROM word_counts_backfill") as c:
+                self.word_backfill[gid] = list(await c.fetchone())
+        except BaseException:
+            await conn.close()
+            raise
+        self.stat_dbs[gid] = conn
+        self._start_backfill(gid)
+        return conn
+
+    def _start_backfill(self, gid):
+        """Start the backfills for gid unless they're done or running."""
+        running = self._backfills.get(gid)
+        if running and not running.done():
+            return
+        if any(p[0] < p[1] for p in (self.fts_backfill[gid], self.word_backfill[gid])):
+            self._backfills[gid] = asyncio.create_task(self._backfill(gid))
+
+    def _queue(self, guild, statement, params):
+        """Queue a write for the guild's log db. Flushed by _flush_loop."""
+        if self._closing:
+            return
+        gid = self._gid(guild)
+        self.pending.setdefault(gid, {}).setdefault(statement, []).append(params)
+        self.queue_depth += 1
+        if self.queue_depth >= FLUSH_MAX_ROWS:
+            self._flush_wake.set()
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_wake.wait(), FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.bot.logger.error(f"Logger flush failed: {e}")
+
+    async def flush(self):
+        """Write everything queued so far, one transaction per guild db."""
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            batches = self.pending
+            self.pending = {}
+            self.queue_depth = 0
+            for gid, batch in batches.items():
+                t0 = time.monotonic()
+                rows = sum(len(v) for v in batch.values())
+                try:
+                    db = await self._get_db_by_id(gid)
+                    word_deltas = await self._word_count_deltas(db, gid, batch)
+                    for statement in WRITE_ORDER:
+                        if statement in batch:
+                            await db.executemany(statement, batch[statement])
+                    if word_deltas:
+                        await db.executemany(BUMP_WORD_COUNT, word_deltas)
+                    await db.commit()
+                except aiosqlite.ProgrammingError:
+                    # This means the db connection is closed...
+                    continue
+                except Exception as e:
+                    if gid in self.stat_dbs:
+                        await self.stat_dbs[gid].rollback()
+                    self._requeue(gid, batch, rows, e)
+                    continue
+                self.flush_failures.pop(gid, None)
+                elapsed = (time.monotonic() - t0) * 1000
+                self.flush_stats["flushes"] += 1
+                self.flush_stats["rows"] += rows
+                self.flush_stats["last_ms"] = elapsed
+                self.flush_stats["max_ms"] = max(self.flush_stats["max_ms"], elapsed)
+                if gid != "None" and NEW_MESSAGE in batch:
+                    # Let other cogs (the AI compactor) see how much each channel grew
+                    logged = Counter()
+                    for params in batch[NEW_MESSAGE]:
+                        logged[params[2]] += len(params[3])
+                    self.bot.dispatch("messages_logged", gid, dict(logged))
+
+    def _requeue(self, gid, batch, rows, error):
+        """Put a batch that failed to commit back ahead of anything queued
+        for the guild since, unless it has used up its FLUSH_RETRIES."""
+        failures = self.flush_failures.get(gid, 0) + 1
+        if failures > FLUSH_RETRIES:
+            self.flush_failures.pop(gid, None)
+            self.bot.logger.error(f"Logger flush for guild {gid} dropped {rows} rows "
+                                  f"after {FLUSH_RETRIES} retries: {error}")
+            return
+        self.flush_failures[gid] = failures
+        self.bot.logger.error(f"Logger flush for guild {gid} failed ({error}), "
+                              f"retrying {rows} rows ({failures}/{FLUSH_RETRIES})")
+        queued = self.pending.get(gid, {})
+        for statement, params in queued.items():
+            batch[statement] = batch.get(statement, []) + params
+        self.pending[gid] = batch
+        self.queue_depth += rows
+
+    def _word_counted(self, gid, snowflake):
+        """Whether word_counts already includes this message's tokens."""
+        cursor, end = self.word_backfill.get(gid, (0, 0))
+        return snowflake <= cursor or snowflake > end
+
+    async def _word_count_deltas(self, db, gid, batch):
+        """word_counts changes for a batch, as BUMP_WORD_COUNT params.
+
+        Must run before the batch is written: it replays the batch's
+        inserts, edits and deletes (in WRITE_ORDER) over the rows as they
+        are now to see which tokens each message gains or loses.
+        """
+        new_msgs = batch.get(NEW_MESSAGE, [])
+        edits = batch.get(EDIT_MESSAGE, [])
+        deletes = batch.get(DEL_MESSAGE, [])
+        wanted = [p[0] for p in new_msgs] + [p[2] for p in edits] + [p[1] for p in deletes]
+        if not wanted:
+            return []
+
+        # snowflake -> [user_id, channel_id, message, deleted]
+        state = {}
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i:i + 500]
+            marks = ", ".join("?" * len(chunk))
+            async with db.execute(
+                    "SELECT snowflake, user_id, channel_id, message, deleted FROM messages "
+                    f"WHERE snowflake IN ({marks})", chunk) as c:
+                for row in await c.fetchall():
+                    state[row[0]] = list(row[1:])
+
+        deltas = Counter()
+        def count(snowflake, sign):
+            user_id, channel_id, message, deleted = state[snowflake]
+            if deleted or not message or not self._word_counted(gid, snowflake):
+                return
+            for token in message_tokens(message):
+                deltas[(token, channel_id, user_id)] += sign
+
+        for p in new_msgs:
+            if p[0] in state:
+                continue  # INSERT OR IGNORE
+            state[p[0]] = [p[1], p[2], p[3], p[6]]
+            count(p[0], 1)
+        for content, _, snowflake in edits:
+            if snowflake in state:
+                count(snowflake, -1)
+                state[snowflake][2] = content
+                count(snowflake, 1)
+        for deleted, snowflake in deletes:
+            if snowflake in state:
+                count(snowflake, -1)
+                state[snowflake][3] = deleted
+                count(snowflake, 1)
+        return [(*key, n) for key, n in deltas.items() if n]
+
+    async def _backfill(self, gid):
+        """Index, then count, the messages logged before messages_fts and
+        word_counts existed. Full-text first: it's quick, and WOTD counts
+        stay on the slow LIKE scan until it's done."""
+        await self._backfill_rows(
+            gid, "messages_fts_backfill", self.fts_backfill[gid],
+            "SELECT snowflake, message FROM messages "
+            "WHERE snowflake > ? AND snowflake <= ? ORDER BY snowflake LIMIT ?",
+            self._index_rows)
+        await self._backfill_rows(
+            gid, "word_counts_backfill", self.word_backfill[gid],
+            "SELECT snowflake, user_id, channel_id, message FROM messages "
+            "WHERE snowflake > ? AND snowflake <= ? AND deleted = 0 "
+            "ORDER BY snowflake LIMIT ?",
+            self._count_rows)
+
+    async def _backfill_rows(self, gid, table, progress, query, apply):
+        """Walk messages up to progress's end_snowflake, apply()ing each chunk.
+
+        Works in small chunks under the flush lock (so live edits can't
+        slip in between reading a chunk and applying it) and sleeps
+        between chunks to leave the event loop and writer free.
+        """
+        db = self.stat_dbs[gid]
+        while progress[0] < progress[1] and not self._closing:
+            async with self._flush_lock:
+                async with db.execute(query, [progress[0], progress[1], BACKFILL_CHUNK]) as c:
+                    rows = await c.fetchall()
+                cursor = rows[-1][0] if len(rows) == BACKFILL_CHUNK else progress[1]
+                try:
+                    await apply(db, rows)
+                    await db.execute(f"UPDATE {table} SET cursor = ?", [cursor])
+                    await db.commit()
+                except aiosqlite.ProgrammingError:
+                    return
+                progress[0] = cursor
+            await asyncio.sleep(BACKFILL_PAUSE)
+        if progress[0] >= progress[1]:
+            self.bot.logger.info(f"{table} finished for guild {gid}")
+
+    @staticmethod
+    async def _index_rows(db, rows):
+        await db.executemany("INSERT INTO messages_fts (rowid, message) VALUES (?, ?)", rows)
+
+    @staticmethod
+    async def _count_rows(db, rows):
+        deltas = Counter()
+        for _, user_id, channel_id, message in rows:
+            for token in message_tokens(message or ""):
+                deltas[(token, channel_id, user_id)] += 1
+        await db.executemany(BUMP_WORD_COUNT, [(*key, n) for key, n in deltas.items()])
+
+    async def word_count(self, guild, channel_id, word):
+        """Non-bot, non-deleted messages in a channel containing word as a
+        full word (same matching as the WOTD full word regex).
+
+        Returns None if word_counts can't answer yet (backfill still running)
+        or the word is longer than MAX_TOKEN_LEN.
+        """
+        if len(word) > MAX_TOKEN_LEN or not await self.word_counts_ready(guild):
+            return None
+        async with self.reader(guild) as db:
+            async with db.execute(
+                    """SELECT coalesce(sum(messages), 0) FROM word_counts
+                       JOIN users ON word_counts.user_id = users.user_id
+                       WHERE token = ? AND channel_id = ? AND is_bot = 0""",
+                    [word.lower(), channel_id]) as c:
+                return (await c.fetchone())[0]
+
+    async def top_words(self, guild, *, channel_id=None, user_id=None,
+                        limit=10, min_len=4, exclude=()):
+        """Most used plain words (letters/digits only) for a channel and/or
+        user as [(word, messages), ...]. Bots are left out of channel totals.
+        """
+        where = ["length(token) >= ?", "token NOT GLOB '*[^a-z0-9]*'", "is_bot = 0"]
+        args = [min_len]
+        if channel_id is not None:
+            where.append("channel_id = ?")
+            args.append(channel_id)
+        if user_id is not None:
+            where.append("word_counts.user_id = ?")
+            args.append(user_id)
+        if exclude:
+            where.append(f"token NOT IN ({', '.join('?' * len(exclude))})")
+            args.extend(exclude)
+        args.append(limit)
+        async with self.reader(guild) as db:
+            async with db.execute(
+                    f"""SELECT token, sum(messages) AS n FROM word_counts
+                        JOIN users ON word_counts.user_id = users.user_id
+                        WHERE {' AND '.join(where)}
+                        GROUP BY token ORDER BY n DESC LIMIT ?""", args) as c:
+                return await c.fetchall()
+
+    async def fts_ready(self, guild) -> bool:
+        """False while messages_fts is still being filled in."""
+        gid = self._gid(guild)
+        await self._get_db_by_id(gid)
+        cursor, end = self.fts_backfill[gid]
+        return cursor >= end
+
+    async def word_counts_ready(self, guild) -> bool:
+        """False while the word_counts backfill is still running."""
+        gid = self._gid(guild)
+        await self._get_db_by_id(gid)
+        cursor, end = self.word_backfill[gid]
+        return cursor >= end
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def logstatus(self, ctx):
+        """Show the logger write queue depth and flush latency"""
+        st = self.flush_stats
+        avg = st["rows"] / st["flushes"] if st["flushes"] else 0
+        await ctx.send(f"Queue depth: {self.queue_depth} | "
+                       f"flushes: {st['flushes']} ({avg:.1f} rows avg) | "
+                       f"last: {st['last_ms']:.1f}ms | max: {st['max_ms']:.1f}ms")
 
 
     @commands.Cog.listener()
@@ -126,7 +655,7 @@ class Logger(commands.Cog):
         # the message.channel.guild will also be None in that case
         # to associate them with the right guild I have to try get the guild.
         tchan = self.bot.get_channel(chan.id)
-        db = await self.get_db(tchan.guild if tchan else None)
+        guild = tchan.guild if tchan else None
 
         flags = ""
         chtypes = [discord.TextChannel, discord.GroupChannel, discord.Thread]
@@ -142,14 +671,8 @@ class Logger(commands.Cog):
         else:
             gid = "None"
 
-        try:
-            await db.execute(NEW_CHANNEL, [chan.id, gid, chname, flags])
-        except aiosqlite.ProgrammingError:
-            # This means the db connection is closed...
-            return
-            
-
-        await db.execute(NEW_USER, [user.id, user.name, user.bot])
+        self._queue(guild, NEW_CHANNEL, [chan.id, gid, chname, flags])
+        self._queue(guild, NEW_USER, [user.id, user.name, user.bot])
         attachments = str(message.attachments)
         ref = None
         content = message.clean_content
@@ -162,14 +685,13 @@ class Logger(commands.Cog):
         # if not content.strip() and not message.attachments:
         #     return
         
-        await db.execute(NEW_MESSAGE, [message.id, user.id, chan.id, 
+        self._queue(guild, NEW_MESSAGE, [message.id, user.id, chan.id, 
                                 content, attachments, 
                                 ref, False, message.flags.ephemeral,
                                 ])
         
         for ment in message.mentions:
-            await db.execute(NEW_MENTION, [message.id, ment.id])
-        await db.commit()
+            self._queue(guild, NEW_MENTION, [message.id, ment.id])
 
 
     @commands.Cog.listener()
@@ -177,19 +699,14 @@ class Logger(commands.Cog):
         if before.clean_content != after.clean_content or \
                     before.attachments != after.attachments:
             tchan = self.bot.get_channel(before.channel.id)
-            db = await self.get_db(tchan.guild if tchan else None)
             attch = str(after.attachments)
-            await db.execute(EDIT_MESSAGE, [after.clean_content, 
-                                        attch,
-                                        after.id])
-            await db.commit()
+            self._queue(tchan.guild if tchan else None, EDIT_MESSAGE,
+                        [after.clean_content, attch, after.id])
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
         tchan = self.bot.get_channel(message.channel.id)
-        db = await self.get_db(tchan.guild if tchan else None)
-        await db.execute(DEL_MESSAGE, [True, message.id])
-        await db.commit()
+        self._queue(tchan.guild if tchan else None, DEL_MESSAGE, [True, message.id])
 
 
     @commands.Cog.listener()
@@ -197,28 +714,25 @@ class Logger(commands.Cog):
         msg = reaction.message
         ts = int(datetime.now(timezone.utc).timestamp() * 1000)
         tchan = self.bot.get_channel(msg.channel.id)
-        db = await self.get_db(tchan.guild if tchan else None)
-        await db.execute(NEW_REACTION, [ts, msg.id, user.id, str(reaction.emoji)])
-        await db.commit()
+        self._queue(tchan.guild if tchan else None, NEW_REACTION,
+                    [ts, msg.id, user.id, str(reaction.emoji)])
 
 
     @commands.Cog.listener()
     async def on_member_update(self, old, new):
         if (old.roles != new.roles) or (old.nick != new.nick):
             ts = int(datetime.now(timezone.utc).timestamp() * 1000)
-            db = await self.get_db(new.guild)
             if old.nick != new.nick:
-                await db.execute(NEW_NICK, [ts, new.id, new.nick])
+                self._queue(new.guild, NEW_NICK, [ts, new.id, new.nick])
             if old.roles != new.roles:
                 if len(new.roles) > len(old.roles):
                     diff = list(set(new.roles).difference(old.roles))
                     for tag in diff:
-                        await db.execute(NEW_TAG, [ts, new.id, tag.name, True])
+                        self._queue(new.guild, NEW_TAG, [ts, new.id, tag.name, True])
                 else:
                     diff = list(set(old.roles).difference(new.roles))
                     for tag in diff:
-                        await db.execute(NEW_TAG, [ts, new.id, tag.name, False])
-            await db.commit()
+                        self._queue(new.guild, NEW_TAG, [ts, new.id, tag.name, False])
 
 
     @commands.Cog.listener()
@@ -229,12 +743,23 @@ class Logger(commands.Cog):
             return
         # only doing topics for now
         ts = int(datetime.now(timezone.utc).timestamp() * 1000)
-        db = await self.get_db(after.guild)
-        await db.execute(NEW_TOPIC, [ts, after.id, after.topic])
-        await db.commit()
+        self._queue(after.guild, NEW_TOPIC, [ts, after.id, after.topic])
 
 
     async def cog_unload(self):
+        # Let the flusher finish its current batch, then drain what's left
+        self._closing = True
+        self._flush_wake.set()
+        if self._flusher:
+            await self._flusher
+        for task in self._backfills.values():
+            await task
+        # Failed batches are requeued, so keep going until they land or run
+        # out of retries
+        while self.pending:
+            await self.flush()
+        for pool in self.read_pools.values():
+            await pool.close()
         for db in self.stat_dbs:
             await self.stat_dbs[db].close()
 
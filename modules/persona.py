@@ -11,6 +11,7 @@ from datetime import datetime
 from discord.ext import commands
 
 from modules.ai_cache import AICache
+from modules.llm_providers import CallStats
 
 
 BOT_ADMIN_ROLE = "Bot Admin"
@@ -141,19 +142,19 @@ class Persona(commands.Cog):
             return "", 0
 
         logger_cog = self.bot.cogs['Logger']
-        db = await logger_cog.get_db(guild)
 
         target_chars = target_tokens * CHARS_PER_TOKEN
 
         # Pull messages across all channels, newest first
-        cursor = await db.execute(
-            """SELECT u.canon_nick, m.message, m.channel_id FROM messages m
-               JOIN users u ON m.user_id = u.user_id
-               WHERE m.user_id = ? AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
-               AND m.message NOT LIKE '!%'
-               ORDER BY m.snowflake DESC""",
-            [user_id])
-        rows = await cursor.fetchall()
+        async with logger_cog.reader(guild) as db:
+            cursor = await db.execute(
+                """SELECT u.canon_nick, m.message, m.channel_id FROM messages m
+                   JOIN users u ON m.user_id = u.user_id
+                   WHERE m.user_id = ? AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
+                   AND m.message NOT LIKE '!%'
+                   ORDER BY m.snowflake DESC""",
+                [user_id])
+            rows = await cursor.fetchall()
 
         if not rows:
             return "", 0
@@ -298,7 +299,8 @@ class Persona(commands.Cog):
             }
 
             try:
-                data = await provider.chat(payload)
+                http_stats = CallStats()
+                data = await provider.chat(payload, stats=http_stats)
                 elapsed = time.monotonic() - t0
 
                 message = data["choices"][0]["message"]
@@ -318,7 +320,7 @@ class Persona(commands.Cog):
 
                 if show_debug:
                     cost = provider.calculate_cost(model, in_tok, out_tok, cached_tok)
-                    copilot._add_usage_debug(debug_parts, usage, model, cost, elapsed, cached_tok)
+                    copilot._add_usage_debug(debug_parts, usage, model, cost, elapsed, cached_tok, http_stats)
 
             except Exception as e:
                 await ctx.send(f"❌ Persona error: {e}")
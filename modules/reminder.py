@@ -1,17 +1,31 @@
-from discord.ext import commands, tasks
+from discord.ext import commands
 import discord
 from discord import app_commands
 import asyncio
+import heapq
 import aiosqlite
 from datetime import datetime, timezone
 from dataclasses import dataclass
 import dateparser
 from zoneinfo import ZoneInfo
 # 'when' is not stricyly necessary here, just a convenience thing
-# timestamp | Channel | userid | when | remindertext
+# id | timestamp | Channel | userid | when | remindertext
 
-# TODO: change Reminder.reminders to a dict keyed by timestamp
-# then I don't need the task thing at all in the EditReminderView
+DB_PATH = "data/reminders.sqlite"
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY, "timestamp" integer NOT NULL, "channel" integer,
+    "user" integer, "when" text, "reminder" text
+);
+CREATE INDEX IF NOT EXISTS reminders_due ON reminders ("timestamp", id);
+'''
+
+# The scheduler holds only the soonest reminders and pages in this many
+# more from the table as they run out
+LOAD_BATCH = 500
+# Re-check at least this often in case the clock jumped
+MAX_SLEEP = 3600
 
 @dataclass
 class ReminderItem:
@@ -19,9 +33,14 @@ class ReminderItem:
     user: int
     when: datetime
     message: str
+    id: int = None
 
 UTC = ZoneInfo("UTC")
 
+def utcnow() -> datetime:
+    """The scheduler's clock."""
+    return datetime.now(UTC)
+
 class TimePrompt(discord.ui.Modal, title="New reminder time"):
     new_time = None
     reminder: ReminderItem = None
@@ -48,7 +67,6 @@ class EditReminderView(discord.ui.View):
     reminder_item: ReminderItem = None
     reminder = None
     message = None
-    task = None
     @discord.ui.button(label="Change time", emoji="⏱️", style=discord.ButtonStyle.gray)
     async def on_click_change(self, interaction: discord.Interaction, button):
         if interaction.user.id == self.reminder_item.user:
@@ -59,12 +77,8 @@ class EditReminderView(discord.ui.View):
             if time.new_time:
                 await self.reminder.delete_timer(self.reminder_item)
                 self.reminder_item.when = time.new_time
-                if self.task:
-                    self.reminder.reminders.remove(self.task)
-                    self.task.cancel()
                 out, editbutton = await self.reminder.make_reminder(self.reminder_item)
                 self.message.content = out
-                self.task = editbutton.task
                 await interaction.followup.edit_message(self.message.id, content=out, view=self)
         else:
             await interaction.response.send_message("You didn't create this reminder", ephemeral=True)
@@ -73,9 +87,6 @@ class EditReminderView(discord.ui.View):
     async def on_click_delete(self, interaction: discord.Interaction, button):
         if interaction.user.id == self.reminder_item.user:
             await self.reminder.delete_timer(self.reminder_item)
-            if self.task:
-                self.reminder.reminders.remove(self.task)
-                self.task.cancel()
             await interaction.response.edit_message(content="Reminder deleted.", view=None)
             self.stop()
         else:
@@ -90,63 +101,120 @@ class EditReminderView(discord.ui.View):
 
 
 class Reminder(commands.Cog):
-    reminders = set()
+    db_path = DB_PATH
+
     def __init__(self, bot):
         self.bot = bot
+        # (timestamp, id) of stored reminders up to _loaded_until, soonest first.
+        # Deleted or rescheduled ones are skipped when they come up.
+        self._heap = []
+        # (timestamp, id) keyset bound of what's been read from the table,
+        # None once all of it has
+        self._loaded_until = (float("-inf"), 0)
+        self._loading = False
+        self._wake = asyncio.Event()
+        self.scheduler = None
 
     async def cog_load(self):
-        self.conn = await aiosqlite.connect("data/reminders.sqlite")
-
-        q = '''CREATE TABLE IF NOT EXISTS 'reminders' (
-                "timestamp" integer, "channel" integer, 
-                "user" integer, "when" text, "reminder" text
-            );'''
+        self.conn = await aiosqlite.connect(self.db_path)
+        await self._migrate()
+        await self.conn.executescript(SCHEMA)
+        await self.conn.commit()
+        self.scheduler = asyncio.create_task(self._scheduler())
+
+    async def _migrate(self):
+        """Give a table from before the id column a real primary key.
+        Deletes used to go by timestamp, so same-second reminders collided."""
+        res = await self.conn.execute("PRAGMA table_info(reminders)")
+        columns = [row[1] for row in await res.fetchall()]
+        if not columns or "id" in columns:
+            return
+        self.bot.logger.info("Adding ids to the reminders table")
+        await self.conn.execute("ALTER TABLE reminders RENAME TO reminders_old")
+        await self.conn.executescript(SCHEMA)
+        q = '''INSERT INTO reminders ("timestamp", "channel", "user", "when", "reminder")
+               SELECT "timestamp", "channel", "user", "when", "reminder"
+               FROM reminders_old ORDER BY "timestamp"'''
         await self.conn.execute(q)
+        await self.conn.execute("DROP TABLE reminders_old")
         await self.conn.commit()
-        self.check_timers.start()
-
-    async def start_timer(self, reminder):
-        seconds = max(0,int((reminder.when - datetime.now(UTC)).total_seconds()))
-        await asyncio.sleep(seconds)
-        await self.call_reminder(reminder)
-
 
     async def save_timer(self, reminder: ReminderItem):
-        q = "INSERT INTO reminders VALUES (?, ?, ?, ?, ?)"
-        await self.conn.execute(q, (int(reminder.when.timestamp()), 
-                           reminder.channel, reminder.user, 
+        q = '''INSERT INTO reminders ("timestamp", "channel", "user", "when", "reminder")
+               VALUES (?, ?, ?, ?, ?)'''
+        res = await self.conn.execute(q, (int(reminder.when.timestamp()),
+                           reminder.channel, reminder.user,
                            str(reminder.when), reminder.message))
         await self.conn.commit()
+        reminder.id = res.lastrowid
+        self._schedule(int(reminder.when.timestamp()), reminder.id)
 
     async def delete_timer(self, reminder: ReminderItem):
-        q = "DELETE FROM reminders WHERE timestamp = (?)"
-        await self.conn.execute(q, [int(reminder.when.timestamp())])
+        # Its heap entry is dropped when it comes up and the row is gone
+        q = "DELETE FROM reminders WHERE id = (?)"
+        await self.conn.execute(q, [reminder.id])
         await self.conn.commit()
 
-
-    @tasks.loop(minutes=(60 * 24))
-    async def check_timers(self):
-        self.bot.logger.info("remindme loop")
-        # first we have to cancel all the reminders so that we don't re-create one already on a timer 
-        for reminder in self.reminders:
-            reminder.cancel()
-        self.reminders.clear()
-        ts = int(datetime.now(UTC).timestamp())
-        ts += 24*60*60
-        q = 'SELECT timestamp, channel, user, reminder FROM reminders WHERE timestamp <= ?'
-        res = await self.conn.execute(q, [(ts)])
-        #then create any reminder with less than 24hr time
-        async for row in res:
-            when = datetime.fromtimestamp(row[0], tz=UTC)
-            reminder = ReminderItem(row[1], row[2], when, row[3])
-            await self.set_timer(reminder)
-
-
-    async def set_timer(self, reminder):
-        task = asyncio.create_task(self.start_timer(reminder))
-        self.reminders.add(task)
-        task.add_done_callback(self.reminders.discard)
-        return task
+    def _schedule(self, timestamp: int, reminder_id: int):
+        """Track a new reminder if it's within what's been loaded (later ones
+        get paged in when their turn comes) and wake the scheduler."""
+        key = (timestamp, reminder_id)
+        # Mid-load it may or may not be in the page being read; a duplicate
+        # entry is harmless since the row is gone once it has fired
+        if self._loading or self._loaded_until is None or key <= self._loaded_until:
+            heapq.heappush(self._heap, key)
+        self._wake.set()
+
+    async def _load_more(self):
+        """Page the next LOAD_BATCH reminders, in due order, into the heap."""
+        q = '''SELECT "timestamp", id FROM reminders WHERE ("timestamp", id) > (?, ?)
+               ORDER BY "timestamp", id LIMIT ?'''
+        self._loading = True
+        try:
+            res = await self.conn.execute(q, (*self._loaded_until, LOAD_BATCH))
+            rows = [tuple(row) for row in await res.fetchall()]
+        finally:
+            self._loading = False
+        for row in rows:
+            heapq.heappush(self._heap, row)
+        self._loaded_until = rows[-1] if len(rows) == LOAD_BATCH else None
+
+    async def _scheduler(self):
+        """Sleep until the soonest reminder is due or a new one is added,
+        firing due ones in order. One task no matter how many are stored."""
+        while True:
+            try:
+                if not self._heap and self._loaded_until is not None:
+                    await self._load_more()
+                    continue
+                now = utcnow().timestamp()
+                delay = self._heap[0][0] - now if self._heap else MAX_SLEEP
+                if delay > 0:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), min(delay, MAX_SLEEP))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                timestamp, reminder_id = heapq.heappop(self._heap)
+                reminder = await self.get_timer(reminder_id, timestamp)
+                if reminder:
+                    await self.call_reminder(reminder)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.bot.logger.exception(f"Reminder scheduler error: {e}")
+                await asyncio.sleep(1)
+
+    async def get_timer(self, reminder_id: int, timestamp: int):
+        """The stored reminder, or None if it's been deleted or moved since."""
+        q = 'SELECT channel, user, reminder FROM reminders WHERE id = ? AND "timestamp" = ?'
+        res = await self.conn.execute(q, [reminder_id, timestamp])
+        row = await res.fetchone()
+        if not row:
+            return None
+        when = datetime.fromtimestamp(timestamp, tz=UTC)
+        return ReminderItem(row[0], row[1], when, row[2], reminder_id)
 
 
     def reminder_parser(self, line, tz):
@@ -252,20 +320,16 @@ class Reminder(commands.Cog):
     async def make_reminder(self, reminder: ReminderItem):
         if reminder.when.tzinfo:
             reminder.when = reminder.when.astimezone(tz=UTC)
-        seconds = int((reminder.when - datetime.now(UTC)).total_seconds())
-        task = None
+        seconds = int((reminder.when - utcnow()).total_seconds())
         if seconds < 0:
             out = "I can't remind you of something in the past"
         else:
             out = f"I will remind you on <t:{int(reminder.when.timestamp())}>: {reminder.message}"
-            if seconds < (24 * 60 * 60):
-                task = await self.set_timer(reminder)
-        await self.save_timer(reminder)
+            await self.save_timer(reminder)
 
         editbutton = EditReminderView(timeout=60)
         editbutton.reminder = self
         editbutton.reminder_item = reminder
-        editbutton.task = task
 
         return (out, editbutton)
 
@@ -277,19 +341,17 @@ class Reminder(commands.Cog):
         allowed_mentions = discord.AllowedMentions(users=[user], 
                                                    everyone=False, 
                                                    roles=False)
-        await channel.send(msg, allowed_mentions=allowed_mentions)
-
-        q = 'DELETE FROM reminders WHERE timestamp <= ?'
-        await self.conn.execute(q, [(int(reminder.when.timestamp()))])
-        await self.conn.commit()
+        try:
+            await channel.send(msg, allowed_mentions=allowed_mentions)
+        finally:
+            # Sent or not (say the channel is gone), it doesn't fire again
+            await self.delete_timer(reminder)
 
 
     async def cog_unload(self):
+        if self.scheduler:
+            self.scheduler.cancel()
         await self.conn.close()
-        self.check_timers.cancel()
-        # cancel all the timers here
-        for reminder in self.reminders:
-            reminder.cancel()
 
 async def setup(bot):
     await bot.add_cog(Reminder(bot))
@@ -0,0 +1,85 @@
+"""Singleflight: coalesce concurrent calls for the same key.
+
+Used for compactions (one per channel, whoever asks) and web searches
+(identical queries from several commands at once). Callers that arrive
+while a call for their key is running await it and get its result or
+exception instead of starting their own.
+"""
+
+import asyncio
+import time
+
+
+class SingleFlight:
+    """At most one in-flight call per key.
+
+    With ttl, a successful result is also handed to calls for the same key
+    that arrive within ttl seconds after it finished. Failures are never
+    kept. The call runs as its own task, so a caller giving up (e.g. a
+    cancelled command) doesn't cancel it for the others.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._flights = {}          # key -> Task
+        self._recent = {}           # key -> (finished_at, result), when ttl > 0
+        self.stats = {"calls": 0, "joined": 0, "reused": 0, "waited": 0}
+
+    def in_flight(self, key) -> bool:
+        return key in self._flights
+
+    async def do(self, key, fn):
+        """Return fn()'s result, sharing it with concurrent calls for key.
+
+        fn is a zero-argument coroutine function. Returns (result, shared),
+        where shared is True if this call didn't run fn itself.
+        """
+        task = self._flights.get(key)
+        if task is not None:
+            self.stats["joined"] += 1
+            return await asyncio.shield(task), True
+        if self.ttl:
+            now = time.monotonic()
+            self._recent = {k: v for k, v in self._recent.items() if now - v[0] < self.ttl}
+            if key in self._recent:
+                self.stats["reused"] += 1
+                return self._recent[key][1], True
+        self.stats["calls"] += 1
+        task = asyncio.ensure_future(fn())
+        self._flights[key] = task
+        task.add_done_callback(lambda t: self._landed(key, t))
+        return await asyncio.shield(task), False
+
+    async def do_after(self, key, fn):
+        """Like do(), but never joins: waits for a call already in flight
+        for key to finish (whatever its outcome), then runs fn.
+
+        For work that must start from the state a running call leaves
+        behind, such as rebuilding a cache it is about to write.
+        """
+        while key in self._flights:
+            self.stats["waited"] += 1
+            await asyncio.wait([self._flights[key]])
+        self._recent.pop(key, None)
+        result, _ = await self.do(key, fn)
+        return result
+
+    def _landed(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if self.ttl and not task.cancelled() and task.exception() is None:
+            self._recent[key] = (time.monotonic(), task.result())
+
+    def describe(self) -> str:
+        """Duplicate-work counters, e.g. `12 run, 3 joined, 1 reused`."""
+        parts = [f"{self.stats['calls']} run", f"{self.stats['joined']} joined"]
+        if self.ttl:
+            parts.append(f"{self.stats['reused']} reused")
+        if self.stats["waited"]:
+            parts.append(f"{self.stats['waited']} waited")
+        return ", ".join(parts)
+
+
+# Dummy setup since it's not a cog but an extra module used by others
+async def setup(bot):
+    pass
@@ -0,0 +1,192 @@
+"""Audio plumbing for voice TTS.
+
+StreamingAudio is the MP3 for one utterance while edge-tts is still
+producing it. The synthesizer write()s chunks as they arrive on the event
+loop; FFmpegPCMAudio(pipe=True) reads it from its stdin-writer thread,
+blocking until more data or the end arrives. Playback can therefore start
+with the first chunk, and nothing touches the disk.
+
+PhraseCache keeps synthesized MP3 for short phrases ("lol", "<name>
+says:") so repeats skip edge-tts. edge-tts sends bare MP3 frames, so
+cached clips and fresh audio can simply be concatenated.
+"""
+
+import asyncio
+import collections
+import hashlib
+import os
+import threading
+
+
+class StreamingAudio:
+    """Growing MP3 buffer, written on the loop and read by FFmpeg's thread."""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._pos = 0
+        self._finished = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def write(self, chunk: bytes):
+        with self._cond:
+            if self._closed:
+                return
+            self._data += chunk
+            self._cond.notify_all()
+
+    def finish(self):
+        """No more data is coming; readers get EOF after what's buffered."""
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+
+    def close(self):
+        """Playback is over (or skipped): unblock the reader with EOF now."""
+        with self._cond:
+            self._closed = True
+            self._finished = True
+            self._cond.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        """Up to size bytes, waiting for some if none are buffered yet.
+        b'' only once the stream is finished or closed."""
+        with self._cond:
+            while self._pos >= len(self._data) and not self._finished:
+                self._cond.wait()
+            if self._closed:
+                return b""
+            end = len(self._data) if size < 0 else self._pos + size
+            chunk = bytes(self._data[self._pos:end])
+            self._pos += len(chunk)
+            return chunk
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def __len__(self):
+        return len(self._data)
+
+    def getvalue(self) -> bytes:
+        """Everything written so far."""
+        with self._cond:
+            return bytes(self._data)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class PhraseCache:
+    """LRU of synthesized audio keyed by (voice, text), bounded by total bytes.
+
+    Text is only whitespace-normalized: case changes how edge-tts reads
+    things ("lol" vs "LOL"). With cache_dir set, clips are also kept on
+    disk as <sha1>.mp3 and picked up again after a restart; the byte bound
+    covers those too, and evicting an entry deletes its file.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: str | None = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        # digest -> (size, bytes, or None while only on disk), oldest first
+        self._items = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        if cache_dir and os.path.isdir(cache_dir):
+            self._scan()
+
+    @staticmethod
+    def key(voice: str, text: str) -> str:
+        return hashlib.sha1(f"{voice}\0{' '.join(text.split())}".encode()).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.mp3")
+
+    def _scan(self):
+        """Index clips left by a previous run, oldest written first."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, digest, size in sorted(entries):
+            self._items[digest] = (size, None)
+            self.size += size
+        self._evict()
+
+    def __len__(self):
+        return len(self._items)
+
+    async def get(self, voice: str, text: str) -> bytes | None:
+        digest = self.key(voice, text)
+        item = self._items.get(digest)
+        if item is not None and item[1] is None:
+            try:
+                data = await asyncio.to_thread(_read, self._path(digest))
+            except FileNotFoundError:
+                data = None
+            if digest in self._items:
+                if data is None:
+                    self._pop(digest)
+                else:
+                    self._items[digest] = (item[0], data)
+            item = (item[0], data) if data is not None else None
+        if item is None:
+            self.misses += 1
+            return None
+        if digest in self._items:
+            self._items.move_to_end(digest)
+        self.hits += 1
+        return item[1]
+
+    async def put(self, voice: str, text: str, data: bytes):
+        digest = self.key(voice, text)
+        if digest in self._items:
+            self._pop(digest)
+        if not data or len(data) > self.max_bytes:
+            return
+        self._items[digest] = (len(data), data)
+        self.size += len(data)
+        if self.cache_dir:
+            await asyncio.to_thread(_write, self._path(digest), data)
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._items)))
+
+    def _pop(self, digest: str):
+        size, _ = self._items.pop(digest)
+        self.size -= size
+        if self.cache_dir:
+            _remove(self._path(digest))
+
+    def describe(self) -> str:
+        """e.g. `120 phrases, 2.4MB, 35% hit rate`."""
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return f"{len(self._items)} phrases, {self.size / 1e6:.1f}MB, {rate} hit rate"
+
+
+# Dummy setup since it's not a cog but an extra module used by one
+async def setup(bot):
+    pass
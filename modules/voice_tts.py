@@ -10,17 +10,17 @@ Commands:
 """
 
 import asyncio
-import io
 import logging
 import re
-import tempfile
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 
 import discord
 import edge_tts
 from discord.ext import commands
 
+from modules.tts_audio import PhraseCache, StreamingAudio
+
 log = logging.getLogger(__name__)
 
 # Default voice per-guild, can be changed with !tts voice
@@ -50,17 +50,68 @@ VOICE_POOL = [
 DEFAULT_QUEUE_SIZE = 5
 DEFAULT_MSG_LENGTH = 1500
 
+# Messages synthesized ahead of the one playing. Each is at most max_length
+# chars of speech (a few hundred KB of MP3), which bounds prefetch memory.
+PREFETCH_DEPTH = 2
+# Recent utterances kept for the gap/latency figures in !tts status
+TIMING_SAMPLES = 50
+
+# Synthesized audio for short, often repeated phrases ("lol", "<name> says:")
+PHRASE_CACHE_BYTES = 32_000_000
+PHRASE_CACHE_DIR = "logfiles/tts_cache"
+PHRASE_MAX_CHARS = 100      # longer messages rarely repeat; don't let them churn the cache
+
 # Skip URL-only messages
 URL_PATTERN = re.compile(r'^https?://\S+$')
 
-# Clean message text for TTS
-MENTION_PATTERN = re.compile(r'<@!?(\d+)>')
-CHANNEL_MENTION_PATTERN = re.compile(r'<#(\d+)>')
-ROLE_MENTION_PATTERN = re.compile(r'<@&(\d+)>')
-EMOJI_PATTERN = re.compile(r'<a?:(\w+):\d+>')
-SPOILER_PATTERN = re.compile(r'\|\|.*?\|\|')
-CODE_BLOCK_PATTERN = re.compile(r'```.*?```', re.DOTALL)
-INLINE_CODE_PATTERN = re.compile(r'`[^`]+`')
+# Clean message text for TTS, in three scans:
+#
+# 1. Discord markup and mentions. At each position the first alternative
+#    that matches wins, in the order the separate passes used to run. The
+#    lookahead rejects positions that can't start any of them in one check.
+MARKUP_PATTERN = re.compile(
+    r'(?=[|`h🔧<])'
+    r'(?:(?P<spoiler>\|\|.*?\|\|)'
+    r'|(?P<code_block>```(?s:.*?)```)'
+    r'|(?P<inline_code>`[^`]+`)'
+    r'|(?P<url>https?://\S+)'
+    r'|(?P<debug>🔧[^\n]*)'                    # bot debug lines (🔧 ... | ... | ...)
+    r'|<@(?:(?P<role>&)|!)?(?P<mention>\d+)>'
+    r'|<#(?P<channel>\d+)>'
+    r'|(?P<emoji><a?:\w+:\d+>))'               # custom Discord emoji
+)
+MARKUP_REPLACEMENTS = {
+    "spoiler": "spoiler",
+    "code_block": "code block",
+    "inline_code": "code",
+    "url": "",
+    "debug": "",
+    "emoji": "",
+}
+# 2. Leftover markdown characters (this also covers bold, italic, underline,
+#    strikethrough and block quotes) and ALL unicode emoji. Plain ASCII
+#    text, most chat, only needs the markdown characters deleted.
+ASCII_STRIP = str.maketrans('', '', '*_~`|>')
+STRIP_PATTERN = re.compile(
+    r'[*_~`|>'
+    r'\U0001F600-\U0001F64F'   # emoticons
+    r'\U0001F300-\U0001F5FF'   # symbols & pictographs
+    r'\U0001F680-\U0001F6FF'   # transport & map
+    r'\U0001F700-\U0001F77F'   # alchemical
+    r'\U0001F780-\U0001F7FF'   # geometric shapes ext
+    r'\U0001F800-\U0001F8FF'   # supplemental arrows
+    r'\U0001F900-\U0001F9FF'   # supplemental symbols
+    r'\U0001FA00-\U0001FA6F'   # chess symbols
+    r'\U0001FA70-\U0001FAFF'   # symbols ext-A
+    r'\U00002702-\U000027B0'   # dingbats
+    r'\U0000FE00-\U0000FE0F'   # variation selectors
+    r'\U000024C2-\U0001F251'   # enclosed chars
+    r'\U0000200D'               # zero width joiner
+    r'\U00002600-\U000026FF'   # misc symbols
+    r'\U00002300-\U000023FF'   # misc technical
+    r'\U0000203C-\U00003299'   # CJK symbols + misc
+    r']+')
+# 3. Whitespace, collapsed with ' '.join(text.split()) (same characters as \s)
 
 
 class VoiceTTS(commands.Cog):
@@ -81,6 +132,13 @@ class VoiceTTS(commands.Cog):
         self.voice_pool_index = defaultdict(int)
         # guild_id -> bool (is currently speaking)
         self.speaking = {}
+        # guild_id -> asyncio.Queue of (StreamingAudio, queued_at) waiting to play
+        self.prefetched = {}
+        # guild_id -> seconds of silence between back-to-back utterances
+        self.gaps = defaultdict(lambda: deque(maxlen=TIMING_SAMPLES))
+        # guild_id -> seconds from a message arriving to it being spoken
+        self.latencies = defaultdict(lambda: deque(maxlen=TIMING_SAMPLES))
+        self.phrases = PhraseCache(PHRASE_CACHE_BYTES, PHRASE_CACHE_DIR)
         # guild_id -> settings dict
         self.settings = defaultdict(lambda: {
             "queue_size": DEFAULT_QUEUE_SIZE,
@@ -118,75 +176,24 @@ class VoiceTTS(commands.Cog):
         if URL_PATTERN.match(text.strip()):
             return ""
 
-        # Replace spoilers
-        text = SPOILER_PATTERN.sub("spoiler", text)
-
-        # Remove code blocks
-        text = CODE_BLOCK_PATTERN.sub("code block", text)
-        text = INLINE_CODE_PATTERN.sub("code", text)
-
-        # Strip URLs from mixed messages (keep surrounding text)
-        text = re.sub(r'https?://\S+', '', text)
-
-        # Strip bot debug lines (🔧 ... | ... | ...)
-        text = re.sub(r'🔧[^\n]*', '', text)
-
-        # Strip markdown formatting
-        text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)  # bold
-        text = re.sub(r'\*(.+?)\*', r'\1', text)      # italic
-        text = re.sub(r'__(.+?)__', r'\1', text)       # underline
-        text = re.sub(r'~~(.+?)~~', r'\1', text)       # strikethrough
-        text = re.sub(r'^>\s?', '', text, flags=re.MULTILINE)  # block quotes
-
-        # Replace user mentions with display names
-        def replace_mention(m):
-            uid = int(m.group(1))
-            member = message.guild.get_member(uid)
-            return member.display_name if member else "someone"
-        text = MENTION_PATTERN.sub(replace_mention, text)
-
-        # Replace channel mentions
-        def replace_channel(m):
-            cid = int(m.group(1))
-            ch = message.guild.get_channel(cid)
-            return ch.name if ch else "a channel"
-        text = CHANNEL_MENTION_PATTERN.sub(replace_channel, text)
-
-        # Replace role mentions
-        def replace_role(m):
-            rid = int(m.group(1))
-            role = message.guild.get_role(rid)
-            return role.name if role else "a role"
-        text = ROLE_MENTION_PATTERN.sub(replace_role, text)
-
-        # Strip custom Discord emoji entirely
-        text = EMOJI_PATTERN.sub('', text)
-
-        # Strip remaining Discord markdown artifacts
-        text = re.sub(r'[*_~`|>]', '', text)
-
-        # Strip ALL unicode emoji (covers every emoji, not just a hardcoded list)
-        text = re.sub(
-            r'[\U0001F600-\U0001F64F'   # emoticons
-            r'\U0001F300-\U0001F5FF'     # symbols & pictographs
-            r'\U0001F680-\U0001F6FF'     # transport & map
-            r'\U0001F700-\U0001F77F'     # alchemical
-            r'\U0001F780-\U0001F7FF'     # geometric shapes ext
-            r'\U0001F800-\U0001F8FF'     # supplemental arrows
-            r'\U0001F900-\U0001F9FF'     # supplemental symbols
-            r'\U0001FA00-\U0001FA6F'     # chess symbols
-            r'\U0001FA70-\U0001FAFF'     # symbols ext-A
-            r'\U00002702-\U000027B0'     # dingbats
-            r'\U0000FE00-\U0000FE0F'     # variation selectors
-            r'\U000024C2-\U0001F251'     # enclosed chars
-            r'\U0000200D'                # zero width joiner
-            r'\U00002600-\U000026FF'     # misc symbols
-            r'\U00002300-\U000023FF'     # misc technical
-            r'\U0000203C-\U00003299'     # CJK symbols + misc
-            r']+', '', text)
-
-        # Collapse whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
+        guild = message.guild
+
+        def replace_markup(m):
+            kind = m.lastgroup
+            if kind == "mention":
+                if m.group("role"):
+                    role = guild.get_role(int(m.group("mention")))
+                    return role.name if role else "a role"
+                member = guild.get_member(int(m.group("mention")))
+                return member.display_name if member else "someone"
+            if kind == "channel":
+                ch = guild.get_channel(int(m.group("channel")))
+                return ch.name if ch else "a channel"
+            return MARKUP_REPLACEMENTS[kind]
+
+        text = MARKUP_PATTERN.sub(replace_markup, text)
+        text = text.translate(ASCII_STRIP) if text.isascii() else STRIP_PATTERN.sub('', text)
+        text = ' '.join(text.split())
 
         # Skip if nothing left after cleaning
         if not text:
@@ -198,75 +205,137 @@ class VoiceTTS(commands.Cog):
 
         return text
 
-    async def _generate_tts(self, text: str, voice: str) -> io.BytesIO:
-        """Generate TTS audio as MP3 bytes using edge-tts."""
+    async def _generate_tts(self, text: str, voice: str):
+        """Generate TTS audio with edge-tts, yielding MP3 chunks as they arrive."""
         communicate = edge_tts.Communicate(text, voice)
-        audio_data = io.BytesIO()
         async for chunk in communicate.stream():
             if chunk["type"] == "audio":
-                audio_data.write(chunk["data"])
-        audio_data.seek(0)
-        return audio_data
-
-    async def _consumer(self, guild_id: int):
-        """Process the message queue for a guild, playing TTS one at a time."""
-        queue = self.queues[guild_id]
+                yield chunk["data"]
+
+    async def _phrase_audio(self, text: str, voice: str):
+        """Yield MP3 for a phrase, from the phrase cache or streamed from
+        edge-tts (and then cached, if it's short enough to be worth it)."""
+        cached = await self.phrases.get(voice, text)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for chunk in self._generate_tts(text, voice):
+            parts.append(chunk)
+            yield chunk
+        if len(text) <= PHRASE_MAX_CHARS:
+            await self.phrases.put(voice, text, b"".join(parts))
+
+    async def _synthesizer(self, guild_id: int, queue: asyncio.Queue,
+                           ready: asyncio.Queue, slots: asyncio.Semaphore):
+        """Synthesize queued messages ahead of playback, at most PREFETCH_DEPTH
+        of them not yet playing."""
         while True:
+            await slots.acquire()
+            author_name, text, user_id, queued_at = await queue.get()
+            voice = self._get_voice(guild_id, user_id)
+            audio = StreamingAudio()
+            queued = False
             try:
-                author_name, text, user_id = await queue.get()
-                config = self.guild_config.get(guild_id)
-                if not config:
-                    continue
-
-                vc: discord.VoiceClient = config.get("voice_client")
-                if not vc or not vc.is_connected():
-                    continue
-
-                voice = self._get_voice(guild_id, user_id)
-                full_text = f"{author_name} says: {text}"
+                # The "<name> says:" prefix is its own phrase, so it is synthesized
+                # once per name and voice and only the body goes to edge-tts
+                for phrase in (f"{author_name} says:", text):
+                    async for chunk in self._phrase_audio(phrase, voice):
+                        audio.write(chunk)
+                        # Hand it to the player with the first chunk; the rest streams in
+                        if not queued:
+                            await ready.put((audio, queued_at))
+                            queued = True
+            except Exception as e:
+                log.error(f"TTS generation failed: {e}")
+            finally:
+                # Also on cancellation, so FFmpeg's reader never waits forever
+                audio.finish()
+            if not queued:
+                slots.release()
 
+    async def _consumer(self, guild_id: int):
+        """Play a guild's messages one at a time while the next ones are
+        synthesized in the background."""
+        queue = self.queues[guild_id]
+        ready = self.prefetched[guild_id] = asyncio.Queue()
+        slots = asyncio.Semaphore(PREFETCH_DEPTH)
+        synthesizer = asyncio.create_task(self._synthesizer(guild_id, queue, ready, slots))
+        ended_at = None
+        try:
+            while True:
                 try:
-                    audio_data = await self._generate_tts(full_text, voice)
-                except Exception as e:
-                    log.error(f"TTS generation failed: {e}")
-                    continue
+                    audio, queued_at = await ready.get()
+                    slots.release()
+                    config = self.guild_config.get(guild_id)
+                    if not config:
+                        continue
 
-                # Write to temp file (ffmpeg needs seekable input)
-                with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp:
-                    tmp.write(audio_data.read())
-                    tmp_path = tmp.name
+                    vc: discord.VoiceClient = config.get("voice_client")
+                    if not vc or not vc.is_connected():
+                        continue
 
-                try:
-                    self.speaking[guild_id] = True
-                    source = discord.FFmpegPCMAudio(
-                        tmp_path,
-                        options="-loglevel quiet"
-                    )
-
-                    # Play and wait for completion
-                    done = asyncio.Event()
-
-                    def after_playing(error):
-                        if error:
-                            log.error(f"Player error: {error}")
-                        self.bot.loop.call_soon_threadsafe(done.set)
-
-                    vc.play(source, after=after_playing)
-                    await done.wait()
-                finally:
-                    self.speaking[guild_id] = False
-                    # Clean up temp file
                     try:
-                        import os
-                        os.unlink(tmp_path)
-                    except OSError:
-                        pass
-
-            except asyncio.CancelledError:
-                return
-            except Exception as e:
-                log.error(f"Voice TTS consumer error: {e}")
-                await asyncio.sleep(1)
+                        self.speaking[guild_id] = True
+                        # MP3 decodes fine from a pipe, so feed FFmpeg's stdin
+                        # straight from the buffer synthesis is still filling
+                        source = discord.FFmpegPCMAudio(
+                            audio,
+                            pipe=True,
+                            options="-loglevel quiet"
+                        )
+
+                        # Play and wait for completion
+                        done = asyncio.Event()
+
+                        def after_playing(error):
+                            if error:
+                                log.error(f"Player error: {error}")
+                            self.bot.loop.call_soon_threadsafe(done.set)
+
+                        vc.play(source, after=after_playing)
+                        self._record_timing(guild_id, queued_at, ended_at)
+                        await done.wait()
+                        ended_at = time.monotonic()
+                    finally:
+                        self.speaking[guild_id] = False
+                        audio.close()
+
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.error(f"Voice TTS consumer error: {e}")
+                    await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            return
+        finally:
+            # Drops whatever was prefetched along with the in-flight synthesis
+            synthesizer.cancel()
+            if self.prefetched.get(guild_id) is ready:
+                del self.prefetched[guild_id]
+
+    def _record_timing(self, guild_id: int, queued_at: float, ended_at: float | None):
+        """Note how long a message waited to be spoken and, if it was already
+        queued when the previous one finished, the silence in between."""
+        now = time.monotonic()
+        self.latencies[guild_id].append(now - queued_at)
+        if ended_at is not None and queued_at <= ended_at:
+            self.gaps[guild_id].append(now - ended_at)
+
+    def _format_timing(self, guild_id: int) -> str:
+        gaps = self.gaps.get(guild_id)
+        latencies = self.latencies.get(guild_id)
+        if not latencies:
+            return "⏱️ No messages spoken yet"
+        out = f"⏱️ Message → speech: avg {sum(latencies) / len(latencies):.2f}s"
+        if gaps:
+            out += (f" | gap between messages: avg {sum(gaps) / len(gaps):.2f}s, "
+                    f"max {max(gaps):.2f}s (last {len(gaps)})")
+        return out
+
+    def _start_consumer(self, guild_id: int):
+        self.queues[guild_id] = asyncio.Queue()
+        self.consumers[guild_id] = self.bot.loop.create_task(self._consumer(guild_id))
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -299,7 +368,7 @@ class VoiceTTS(commands.Cog):
             return
 
         author_name = message.author.display_name
-        await queue.put((author_name, text, message.author.id))
+        await queue.put((author_name, text, message.author.id, time.monotonic()))
 
     @commands.group(name="tts", invoke_without_command=True)
     async def tts_group(self, ctx):
@@ -309,6 +378,7 @@ class VoiceTTS(commands.Cog):
             "`!tts join [#text-channel] [voice-channel-name]` — Start TTS\n"
             "`!tts leave` — Disconnect\n"
             "`!tts skip` — Skip current message\n"
+            "`!tts skip all` — Skip everything queued\n"
             "`!tts voice <name>` — Force one voice for all\n"
             "`!tts voice auto` — Per-user voices (default)\n"
             "`!tts voices` — List voices\n"
@@ -370,7 +440,6 @@ class VoiceTTS(commands.Cog):
             return await ctx.send(f"Failed to connect: {e}")
 
         # Set up queue and consumer
-        self.queues[guild_id] = asyncio.Queue()
         self.guild_config[guild_id] = {
             "voice_client": vc,
             "text_channel_id": text_channel.id,
@@ -378,7 +447,7 @@ class VoiceTTS(commands.Cog):
             "voice_channel_name": voice_channel.name,
         }
         self.speaking[guild_id] = False
-        self.consumers[guild_id] = self.bot.loop.create_task(self._consumer(guild_id))
+        self._start_consumer(guild_id)
 
         await ctx.send(
             f"🔊 Joined **{voice_channel.name}** — reading **#{text_channel.name}** aloud\n"
@@ -413,15 +482,24 @@ class VoiceTTS(commands.Cog):
         await ctx.send("👋 Disconnected from voice. TTS stopped.")
 
     @tts_group.command(name="skip")
-    async def tts_skip(self, ctx):
-        """Skip the currently playing TTS message."""
+    async def tts_skip(self, ctx, what: str = None):
+        """Skip the currently playing TTS message, or `all` to also drop everything queued."""
         guild_id = ctx.guild.id
         config = self.guild_config.get(guild_id)
         if not config:
             return await ctx.send("Not connected.")
 
         vc = config.get("voice_client")
-        if vc and vc.is_playing():
+        if what and what.lower() == "all":
+            # Restarting the consumer cancels the prefetched audio with it
+            ahead = self.prefetched.get(guild_id)
+            dropped = self.queues[guild_id].qsize() + (ahead.qsize() if ahead else 0)
+            self.consumers[guild_id].cancel()
+            self._start_consumer(guild_id)
+            if vc and vc.is_playing():
+                vc.stop()
+            await ctx.send(f"⏭️ Skipped everything ({dropped} queued)")
+        elif vc and vc.is_playing():
             vc.stop()
             await ctx.send("⏭️ Skipped")
         else:
@@ -508,6 +586,7 @@ class VoiceTTS(commands.Cog):
         queue = self.queues.get(guild_id)
         queue_size = queue.qsize() if queue else 0
         is_speaking = self.speaking.get(guild_id, False)
+        ahead = self.prefetched.get(guild_id)
 
         global_voice = self.voices.get(guild_id)
         if global_voice:
@@ -531,6 +610,9 @@ class VoiceTTS(commands.Cog):
             f"{voice_info}\n"
             f"{'🔈 Currently speaking' if is_speaking else '🔇 Idle'}\n"
             f"📋 Queue: {queue_size}/{self.settings[guild_id]['queue_size']} messages"
+            f" ({ahead.qsize() if ahead else 0} synthesized ahead)\n"
+            f"{self._format_timing(guild_id)}\n"
+            f"🗃️ Phrase cache: {self.phrases.describe()}"
         )
         await ctx.send(status)
 
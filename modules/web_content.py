@@ -0,0 +1,131 @@
+"""Web page text for search-augmented answers.
+
+!sclai / !sglm fetch the top search results and paste their text into the
+prompt. extract_text() pulls readable text out of HTML with lxml alone
+(no BeautifulSoup tree) and stops walking the document once it has
+max_chars, so the Copilot cog can run it in a small thread pool (lxml
+drops the GIL while parsing) instead of on the event loop.
+
+TTLCache is a byte-bounded LRU with expiry, used for extracted page text
+(keyed by normalize_url()) and for search results (keyed by engine and
+query), so repeat questions don't refetch and reparse the same pages.
+"""
+
+import collections
+import re
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import lxml.html
+from lxml import etree
+
+MAX_PAGE_BYTES = 2_000_000      # stop downloading a page after this much HTML
+PAGE_TTL = 3600                 # seconds extracted page text stays cached
+PAGE_CACHE_BYTES = 16_000_000   # characters of page text kept
+SEARCH_TTL = 900                # seconds search results stay cached
+SEARCH_CACHE_BYTES = 2_000_000
+EXTRACT_WORKERS = 2
+
+# Same tags fetch_page_text used to decompose before taking the text
+SKIP_TAGS = ("script", "style", "nav", "header", "footer", "aside", "form", "iframe",
+             "noscript", "template")
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref_src)$")
+_WS = re.compile(r"\s+")
+
+
+def normalize_url(url: str) -> str:
+    """Cache key for a URL: lowercased scheme/host, no fragment, default
+    port or tracking parameters, query parameters sorted."""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not TRACKING_PARAMS.match(k))
+    return urlunsplit((parts.scheme.lower(), host, parts.path or "/", urlencode(query), ""))
+
+
+def extract_text(html: bytes, max_chars: int) -> str:
+    """Readable text of a page: the <article>, else <main>, else <body>,
+    without scripts, navigation and other chrome, whitespace collapsed,
+    at most max_chars long."""
+    if not html.strip():
+        return ""
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return ""
+    content = None
+    for path in ("//article", "//main", "//body"):
+        found = doc.xpath(path)
+        if found:
+            content = found[0]
+            break
+    if content is None:
+        return ""
+    etree.strip_elements(content, *SKIP_TAGS, with_tail=False)
+
+    parts = []
+    length = 0
+    for text in content.itertext():
+        text = _WS.sub(" ", text).strip()
+        if not text:
+            continue
+        parts.append(text)
+        length += len(text) + 1
+        if length > max_chars:
+            break
+    return " ".join(parts)[:max_chars]
+
+
+class TTLCache:
+    """LRU cache bounded by total size (sizeof of the values) and age."""
+
+    def __init__(self, max_bytes: int, ttl: float, sizeof=len):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._items = collections.OrderedDict()   # key -> (stored_at, size, value)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """The cached value for key, or None if absent or expired."""
+        item = self._items.get(key)
+        if item is None or item[0] < time.monotonic() - self.ttl:
+            if item is not None:
+                self._pop(key)
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[2]
+
+    def put(self, key, value):
+        if key in self._items:
+            self._pop(key)
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        self._items[key] = (time.monotonic(), size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._items)))
+
+    def _pop(self, key):
+        self.size -= self._items.pop(key)[1]
+
+    def describe(self) -> str:
+        """e.g. `42 entries, 1.2MB, 60% hit rate`."""
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return f"{len(self._items)} entries, {self.size / 1e6:.1f}MB, {rate} hit rate"
+
+
+# Dummy setup since it's not a cog but an extra module used by one
+async def setup(bot):
+    pass
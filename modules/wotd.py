@@ -32,6 +32,32 @@ WCLIMIT = 1
 # TODO This is currently written to assume only 1 channel does WOTD and the word is the same across all servers
 # The DB is designed to support multiple channels/servers but code assumes 1 specific channel
 
+# The trigram index (Logger messages_fts) finds every message containing
+#  the word as a case-insensitive substring, so only those rows are
+#  joined back and, for full word matches, regexed.
+FTS_WOTD_COUNT = """SELECT count()
+FROM messages_fts
+JOIN messages ON messages.snowflake = messages_fts.rowid
+JOIN users ON messages.user_id = users.user_id
+WHERE messages_fts MATCH (?)
+  AND channel_id = (?)
+  AND is_bot = 0
+  AND deleted = 0
+;"""
+
+F_FTS_WOTD_COUNT = """SELECT count()
+FROM messages_fts
+JOIN messages ON messages.snowflake = messages_fts.rowid
+JOIN users ON messages.user_id = users.user_id
+WHERE messages_fts MATCH (?)
+  AND channel_id = (?)
+  AND is_bot = 0
+  AND deleted = 0
+  AND messages.message REGEXP (?)
+;"""
+
+# Trigrams need at least 3 characters, shorter words use a plain scan
+#  (as does everything while the Logger is still filling in the index).
 # Doing a LIKE first is more efficient as it "fast-fails"
 #  and filters how many results need to be regexed
 F_WOTD_COUNT = """SELECT count()
@@ -492,20 +518,61 @@ The next hint will be {nexthint}")
         
         word = word.lower()
         channel = self.bot.get_channel(self.bot.config.wotd_whitelist[0])
-        db = await self.bot.cogs['Logger'].get_db(channel.guild)
+        logger = self.bot.cogs['Logger']
+        if fullword:
+            # Full word counts come straight out of the Logger's word_counts
+            # table once it's built. Substring matches still need the index.
+            count = await logger.word_count(channel.guild, channel.id, word)
+            if count is not None:
+                return count
         l_word = f"%{word}%"
         r_word = rf"(?i)(?<!\S){re.escape(word)}\b"
-        if fullword:
+        # FTS5 string literal: the whole word as one substring "phrase"
+        m_word = '"{}"'.format(word.replace('"', '""'))
+        if len(word) >= 3 and await logger.fts_ready(channel.guild):
+            if fullword:
+                q = F_FTS_WOTD_COUNT
+                args = [m_word, channel.id, r_word]
+            else:
+                q = FTS_WOTD_COUNT
+                args = [m_word, channel.id]
+        elif fullword:
             q = F_WOTD_COUNT
             args = [channel.id, l_word, r_word]
         else:
             q = WOTD_COUNT
             args = [channel.id, l_word]
-        async with db.execute(q, args) as c:
-            count = await c.fetchone()
+        async with logger.reader(channel.guild) as db:
+            async with db.execute(q, args) as c:
+                count = await c.fetchone()
         return int(count[0])
 
 
+    @commands.command()
+    async def topwords(self, ctx, target: discord.TextChannel | discord.Member = None):
+        """Most used words in a channel or by a user
+        !topwords            — this channel
+        !topwords #channel   — another channel
+        !topwords @user      — a user, across the server"""
+        if "Logger" not in self.bot.cogs or not ctx.guild:
+            return
+        logger = self.bot.cogs['Logger']
+        target = target or ctx.channel
+        if isinstance(target, discord.Member):
+            rows = await logger.top_words(ctx.guild, user_id=target.id, exclude=common_words)
+            name = f"from **{target.display_name}**"
+        else:
+            rows = await logger.top_words(ctx.guild, channel_id=target.id, exclude=common_words)
+            name = f"in {target.mention}"
+        if not rows:
+            await ctx.send(f"No words counted for {target.mention} yet.")
+            return
+        words = ", ".join(f"{word} ({count:,})" for word, count in rows)
+        out = f"Top words {name}: {words}"
+        if not await logger.word_counts_ready(ctx.guild):
+            out += "\n-# Still counting older messages, these will change."
+        await ctx.send(out)
+
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.channel.id not in self.bot.config.wotd_whitelist or \
@@ -60,6 +60,7 @@ class PalBot(commands.Bot):
                 )
         except Exception as e:
             print(e)
+        await self.utils.AuthorInfo.store.load()
         for module in Path(self.moddir).glob('*.py'):
             try:
                 await self.load_extension("{}.{}".format(self.moddir,module.stem))
@@ -133,8 +134,11 @@ class PalBot(commands.Bot):
 
     async def close(self):
         await super().close()
+        await self.utils.AuthorInfo.store.close()
+        await self.utils.Location.cache.close()
         sys.exit()
 
 
-bot = PalBot()
-bot.run()
+if __name__ == "__main__":
+    bot = PalBot()
+    bot.run()
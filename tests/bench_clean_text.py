@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-message cost of VoiceTTS._clean_text, old passes vs three scans.
+
+Runs the old pass-per-rule cleaner (kept in test_clean_text.py as the
+reference) and the current one over the test corpus, plus a few typical
+lengths of chat and bot output, and reports microseconds per message.
+
+    python tests/bench_clean_text.py [--repeat 2000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from modules import voice_tts  # noqa: E402
+from test_clean_text import CORPUS, FakeMessage, old_clean_text  # noqa: E402
+
+SAMPLES = {
+    "short chat": "lol <@10> that's **wild** 😂",
+    "chat + link": "look at this https://example.com/a?b=c it's from <#20> ||spoiler||",
+    "bot answer": ("Here's the **summary** you asked for:\n> quoted context\n"
+                   "- first point with `inline code`\n- second point, see <@11>\n"
+                   "```py\nprint('hello')\n```\n") * 4
+                  + "🔧 claude-sonnet | 1234 tok | $0.01 | 2.1s",
+    "corpus (avg)": None,
+}
+
+
+def per_message_us(fn, messages, repeat):
+    seconds = timeit.timeit(lambda: [fn(m) for m in messages], number=repeat)
+    return seconds / (repeat * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    cog = voice_tts.VoiceTTS(None)
+    print(f"{'':16s} {'chars':>7s} {'old':>10s} {'new':>10s} {'speedup':>8s}")
+    print("─" * 56)
+    for label, content in SAMPLES.items():
+        contents = CORPUS if content is None else [content]
+        messages = [FakeMessage(c) for c in contents]
+        repeat = max(1, args.repeat // len(messages))
+        old = per_message_us(old_clean_text, messages, repeat)
+        new = per_message_us(cog._clean_text, messages, repeat)
+        chars = sum(len(c) for c in contents) // len(contents)
+        print(f"{label:16s} {chars:>7d} {old:>8.1f}µs {new:>8.1f}µs {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
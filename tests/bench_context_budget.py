@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark: context budgeting over a large channel, before/after MessageWindow.
+
+Builds a synthetic channel (default 100k messages over a week) and times
+the cold-path budgeting in _build_compacted_context — the older/recent
+split, the compaction-input cap, the overflow count and the final trim —
+once the old way (filter rows, re-format and re-count on every binary
+search probe) and once with a MessageWindow. Token counts differ slightly: the window
+counts per message, the old code counted the joined text.
+
+    python tests/bench_context_budget.py [--messages 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.context_gatherer import MessageWindow, _format_line  # noqa: E402
+from modules.llm_providers import HeuristicTokenizer, estimate_tokens  # noqa: E402
+
+BOT = 1
+TOKENIZER = HeuristicTokenizer()
+USERS = 200
+WORDS = ("lol the a game tonight anyone pizza why is this broken ok sure "
+         "weather cat dog coffee meeting later yes no maybe python discord").split()
+MAX_CONTEXT_TOKENS = 20000
+MAX_COMPACTION_INPUT = 120000
+RAW_MAX_TOKENS = 5000
+
+
+def build(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        user = BOT if rng.random() < 0.05 else rng.randint(2, USERS)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 40)))
+        if user == BOT:
+            text = "-# 🔧 model=x 120tok\n" + text
+        rows.append((user, f"user{user}", text, (1 << 22) * (i + 1)))
+    return rows
+
+
+# The functions as they were before MessageWindow
+def old_format(rows):
+    return "\n".join(line for line in (_format_line(r, BOT) for r in rows) if line is not None)
+
+
+def old_trim(msgs, max_tokens):
+    if estimate_tokens(old_format(msgs)) * 1.2 <= max_tokens:
+        return msgs
+    lo, hi = 0, len(msgs)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if estimate_tokens(old_format(msgs[mid:])) * 1.2 <= max_tokens:
+            hi = mid
+        else:
+            lo = mid + 1
+    return msgs[lo:]
+
+
+def old_budget(rows, raw_window_start):
+    older = [m for m in rows if m[3] <= raw_window_start]
+    older_text = old_format(older)
+    if estimate_tokens(older_text) > MAX_COMPACTION_INPUT:
+        older = old_trim(older, MAX_COMPACTION_INPUT)
+        older_text = old_format(older)
+    older_tokens = estimate_tokens(older_text)
+    raw = old_trim(rows, RAW_MAX_TOKENS)
+    overflow = [m for m in raw if m[3] <= raw_window_start]
+    overflow_tokens = estimate_tokens(old_format(overflow)) if overflow else 0
+    text = old_format(old_trim(rows, MAX_CONTEXT_TOKENS))
+    return older_tokens, overflow_tokens, text
+
+
+def new_budget(rows, raw_window_start):
+    return window_budget(MessageWindow(rows, BOT, TOKENIZER), raw_window_start)
+
+
+def window_budget(window, raw_window_start):
+    split = window.split(raw_window_start)
+    start = 0
+    if window.tokens(0, split) > MAX_COMPACTION_INPUT:
+        start = window.trim(MAX_COMPACTION_INPUT, 0, split)
+    older_tokens = window.tokens(start, split)
+    raw = window.trim(RAW_MAX_TOKENS)
+    overflow_tokens = window.tokens(raw, window.split(raw_window_start, raw))
+    text = window.text(window.trim(MAX_CONTEXT_TOKENS))
+    return older_tokens, overflow_tokens, text
+
+
+def run(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = build(args.messages)
+    # raw_hours boundary ~100 messages from the end, inside the raw budget
+    raw_window_start = rows[-min(100, len(rows))][3]
+
+    (old_older, old_overflow, old_text), old_ms = run(old_budget, rows, raw_window_start)
+    (new_older, new_overflow, new_text), new_ms = run(new_budget, rows, raw_window_start)
+    window = MessageWindow(rows, BOT, TOKENIZER)
+    _, query_ms = run(window_budget, window, raw_window_start)
+
+    print(f"{args.messages:,} messages\n")
+    print(f"{'':16s} {'old':>10s} {'window':>10s}")
+    print("─" * 38)
+    print(f"{'older tokens':16s} {old_older:>10,} {new_older:>10,}")
+    print(f"{'overflow tokens':16s} {old_overflow:>10,} {new_overflow:>10,}")
+    print(f"{'context chars':16s} {len(old_text):>10,} {len(new_text):>10,}")
+    print(f"{'time':16s} {old_ms:>8.1f}ms {new_ms:>8.1f}ms  ({old_ms / new_ms:.1f}x)")
+    print(f"{'  of which lookups':16s} {'':>10s} {query_ms:>8.2f}ms  (rest is formatting once)")
+
+
+if __name__ == "__main__":
+    main()
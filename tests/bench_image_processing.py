@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop blocking from image downscaling, inline vs worker pool.
+
+Processes a batch of synthetic images the way _collect_recent_images does
+(a large phone photo, a big PNG screenshot with alpha, a GIF, ...) while a
+heartbeat task on the same loop measures how late it gets to run. Runs
+once with the old inline _downscale_image and once through ImagePool with
+the draft/reduce fast path, and also times both functions per image.
+
+    python tests/bench_image_processing.py [--rounds 3] [--workers 2]
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import image_processing as ip  # noqa: E402
+from PIL import Image  # noqa: E402
+
+MAX_IMAGE_BYTES = 3_500_000
+MAX_IMAGE_DIMENSION = 2048
+HEARTBEAT = 0.005
+
+
+def noisy(size, mode="RGB", seed=0):
+    rng = random.Random(seed)
+    w, h = size
+    small = Image.frombytes("RGB", (w // 4, h // 4), rng.randbytes((w // 4) * (h // 4) * 3))
+    return small.resize(size, Image.BILINEAR).convert(mode)
+
+
+def encode(img, fmt, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def samples():
+    return [
+        ("photo 6000x4000 jpeg", encode(noisy((6000, 4000)), "JPEG", quality=95)),
+        ("photo 4032x3024 jpeg", encode(noisy((4032, 3024), seed=1), "JPEG", quality=92)),
+        ("screenshot 3840x2160 png", encode(noisy((3840, 2160), "RGBA", seed=2), "PNG")),
+        ("meme 800x600 gif", encode(noisy((800, 600), "P", seed=3), "GIF")),
+    ]
+
+
+# The function as it was before the pool
+def old_downscale(data, max_bytes, max_dim):
+    img = Image.open(io.BytesIO(data))
+    if img.mode in ("RGBA", "P", "LA"):
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        bg.paste(img, mask=img.split()[-1] if img.mode == "RGBA" else None)
+        img = bg
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    w, h = img.size
+    if w > max_dim or h > max_dim:
+        ratio = min(max_dim / w, max_dim / h)
+        img = img.resize((int(w * ratio), int(h * ratio)), Image.LANCZOS)
+    for quality in (85, 70, 50, 30):
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+        result = buf.getvalue()
+        if len(result) <= max_bytes:
+            return result, "image/jpeg"
+    w, h = img.size
+    for scale in (0.5, 0.25):
+        small = img.resize((int(w * scale), int(h * scale)), Image.LANCZOS)
+        buf = io.BytesIO()
+        small.save(buf, format="JPEG", quality=50, optimize=True)
+        result = buf.getvalue()
+        if len(result) <= max_bytes:
+            return result, "image/jpeg"
+    return result, "image/jpeg"
+
+
+async def heartbeat(lags, stop):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(time.perf_counter() - t0 - HEARTBEAT)
+
+
+async def measure(process, images, rounds):
+    lags = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT * 2)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for _, data in images:
+            await process(data)
+            await asyncio.sleep(0)  # the next download would yield here
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await beat
+    lags.sort()
+    return elapsed, lags[-1], sum(lag for lag in lags if lag > 0.05), lags[len(lags) * 99 // 100]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=ip.WORKERS)
+    args = parser.parse_args()
+
+    images = samples()
+    print(f"{'':26s} {'size':>9s} {'old':>9s} {'new':>9s} {'old out':>10s} {'new out':>10s}")
+    print("─" * 78)
+    for label, data in images:
+        t0 = time.perf_counter()
+        old, _ = old_downscale(data, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION)
+        t1 = time.perf_counter()
+        new, _ = ip.downscale_image(data, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION)
+        t2 = time.perf_counter()
+        print(f"{label:26s} {len(data) / 1e6:>7.1f}MB {(t1 - t0) * 1000:>7.0f}ms {(t2 - t1) * 1000:>7.0f}ms "
+              f"{len(old) / 1e3:>8.0f}KB {len(new) / 1e3:>8.0f}KB")
+
+    async def inline(data):
+        old_downscale(data, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION)
+
+    pool = ip.ImagePool(args.workers)
+    # Start the workers outside the measurement
+    await pool.downscale(images[-1][1], MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION)
+
+    async def pooled(data):
+        await pool.downscale(data, MAX_IMAGE_BYTES, MAX_IMAGE_DIMENSION)
+
+    print(f"\nEvent loop while processing {len(images) * args.rounds} images "
+          f"(heartbeat every {HEARTBEAT * 1000:.0f}ms):\n")
+    print(f"{'':22s} {'total':>9s} {'max stall':>10s} {'p99 stall':>10s} {'stalled >50ms':>14s}")
+    print("─" * 70)
+    for label, process in (("inline (old)", inline), (f"pool, {args.workers} workers", pooled)):
+        elapsed, worst, stalled, p99 = await measure(process, images, args.rounds)
+        print(f"{label:22s} {elapsed:>8.2f}s {worst * 1000:>8.1f}ms {p99 * 1000:>8.1f}ms {stalled:>13.2f}s")
+    pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
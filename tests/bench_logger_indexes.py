@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: guild log query latency before/after the Logger MIGRATIONS.
+
+Builds a synthetic guild log (default 2M messages over 20 channels and
+500 users), times the hot history queries on the bare schema, applies
+the migrations and times them again.
+
+    python tests/bench_logger_indexes.py [--rows 2000000] [--keep path]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.logger import NEWGUILD, MIGRATIONS, regexp  # noqa: E402
+
+DISCORD_EPOCH = 1420070400000
+CHANNELS = 20
+USERS = 500
+WORDS = ("lol the a game tonight anyone pizza why is this broken ok sure "
+         "weather cat dog coffee meeting later yes no maybe python discord").split()
+
+# (label, sql, params-factory) — copies of the queries in context_gatherer,
+# persona and wotd so the benchmark doesn't need a bot to run them.
+QUERIES = [
+    ("channel_context (24h)",
+     """SELECT m.user_id, u.canon_nick, m.message FROM messages m
+        JOIN users u ON m.user_id = u.user_id
+        WHERE m.channel_id = ? AND m.snowflake > ? AND m.message != ''
+        AND m.deleted = 0 AND m.ephemeral = 0
+        ORDER BY m.snowflake ASC""",
+     lambda ctx: [ctx["channel"], ctx["day_ago"]]),
+    ("user_context (1000)",
+     """SELECT u.canon_nick, m.message FROM messages m
+        JOIN users u ON m.user_id = u.user_id
+        WHERE m.user_id = ? AND m.channel_id = ? AND m.message != '' AND m.deleted = 0
+        ORDER BY m.snowflake DESC
+        LIMIT ?""",
+     lambda ctx: [ctx["user"], ctx["channel"], 1000]),
+    ("fetch_messages_range (7d)",
+     """SELECT m.user_id, u.canon_nick, m.message, m.snowflake FROM messages m
+        JOIN users u ON m.user_id = u.user_id
+        WHERE m.channel_id = ? AND m.snowflake > ?
+        AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
+        ORDER BY m.snowflake ASC""",
+     lambda ctx: [ctx["channel"], ctx["week_ago"]]),
+    ("voice_sample",
+     """SELECT u.canon_nick, m.message, m.channel_id FROM messages m
+        JOIN users u ON m.user_id = u.user_id
+        WHERE m.user_id = ? AND m.message != '' AND m.deleted = 0 AND m.ephemeral = 0
+        AND m.message NOT LIKE '!%'
+        ORDER BY m.snowflake DESC""",
+     lambda ctx: [ctx["user"]]),
+    ("wotd_count",
+     """SELECT count() FROM messages
+        JOIN users ON messages.user_id = users.user_id
+        WHERE channel_id = (?) AND is_bot = 0 AND deleted = 0
+        AND message LIKE (?) COLLATE NOCASE""",
+     lambda ctx: [ctx["channel"], "%pizza%"]),
+]
+
+
+def snowflake(ts_s):
+    return (int(ts_s * 1000) - DISCORD_EPOCH) << 22
+
+
+def build(path, rows):
+    conn = sqlite3.connect(path)
+    conn.create_function("REGEXP", 2, regexp, deterministic=True)
+    conn.executescript(NEWGUILD)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                     [(u, f"user{u}", u == 0) for u in range(USERS)])
+    conn.executemany("INSERT INTO channels VALUES (?, ?, ?, ?)",
+                     [(c, 1, f"chan{c}", "") for c in range(CHANNELS)])
+    rng = random.Random(1)
+    now = time.time()
+    start = now - 3 * 365 * 86400  # three years of history
+    step = (now - start) / rows
+    batch = []
+    for i in range(rows):
+        text = " ".join(rng.choices(WORDS, k=rng.randint(1, 12)))
+        batch.append((snowflake(start + i * step) + i % 4096,
+                      rng.randrange(USERS), rng.randrange(CHANNELS), text, "[]",
+                      None, rng.random() < 0.02, rng.random() < 0.01))
+        if len(batch) >= 50_000:
+            conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    return conn
+
+
+def time_queries(conn, ctx, repeat=3):
+    results = {}
+    for label, sql, params in QUERIES:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            conn.execute(sql, params(ctx)).fetchall()
+            best = min(best, time.perf_counter() - t0)
+        results[label] = best * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--keep", help="write the db here instead of a temp file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = args.keep or os.path.join(tmpdir, "bench_log.sqlite")
+        print(f"Building {args.rows:,} message synthetic log...")
+        t0 = time.perf_counter()
+        conn = build(path, args.rows)
+        print(f"  built in {time.perf_counter() - t0:.1f}s")
+
+        now = time.time()
+        ctx = {"channel": 3, "user": 42,
+               "day_ago": snowflake(now - 86400),
+               "week_ago": snowflake(now - 7 * 86400)}
+
+        before = time_queries(conn, ctx)
+        t0 = time.perf_counter()
+        for script in MIGRATIONS:
+            conn.executescript(script)
+        print(f"  migrations applied in {time.perf_counter() - t0:.1f}s")
+        after = time_queries(conn, ctx)
+        conn.close()
+
+    print(f"\n{'query':28s} {'before':>10s} {'after':>10s} {'speedup':>8s}")
+    print("─" * 59)
+    for label in before:
+        b, a = before[label], after[label]
+        print(f"{label:28s} {b:>8.1f}ms {a:>8.1f}ms {b / a:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the Logger's REGEXP SQL function on the WOTD full word count.
+
+Runs wotd.F_WOTD_COUNT (LIKE prefilter + REGEXP) and a REGEXP-only count
+over a synthetic messages table, once with the old compile-per-row
+function and once with logger.regexp.
+
+    python tests/bench_regexp.py [--rows 1000000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.logger import regexp  # noqa: E402
+from modules.wotd import F_WOTD_COUNT  # noqa: E402
+from bench_logger_indexes import build  # noqa: E402
+
+REGEXP_ONLY = """SELECT count() FROM messages
+JOIN users ON messages.user_id = users.user_id
+WHERE channel_id = (?) AND is_bot = 0 AND deleted = 0
+  AND message REGEXP (?)
+;"""
+
+
+def old_regexp(expr, item):
+    # The function as it was before the cached version
+    reg = re.compile(expr)
+    return reg.search(item) is not None
+
+
+def run(conn, sql, args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = conn.execute(sql, args).fetchone()[0]
+        best = min(best, time.perf_counter() - t0)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    conn = build(":memory:", args.rows)
+    word = "pizza"
+    params = {
+        "F_WOTD_COUNT": (F_WOTD_COUNT, [3, f"%{word}%", rf"(?i)(?<!\S){re.escape(word)}\b"]),
+        "REGEXP only": (REGEXP_ONLY, [3, rf"(?i)(?<!\S){re.escape(word)}\b"]),
+    }
+
+    print(f"{args.rows:,} messages\n")
+    print(f"{'query':16s} {'old':>10s} {'cached':>10s} {'speedup':>8s}")
+    print("─" * 47)
+    for label, (sql, qargs) in params.items():
+        conn.create_function("REGEXP", 2, old_regexp, deterministic=True)
+        old_count, old_ms = run(conn, sql, qargs)
+        conn.create_function("REGEXP", 2, regexp, deterministic=True)
+        new_count, new_ms = run(conn, sql, qargs)
+        assert old_count == new_count, (old_count, new_count)
+        print(f"{label:16s} {old_ms:>8.1f}ms {new_ms:>8.1f}ms {old_ms / new_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
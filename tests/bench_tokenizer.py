@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: token counting throughput, len/4 heuristic vs BPE.
+
+Counts a synthetic channel (default 100k messages) with the heuristic and
+with a BPETokenizer, cold (empty cache) and warm (every message cached, as
+on the next request in the same channel), and times building the
+MessageWindow the context budget uses, and how long a cold window build
+holds up the event loop when counted inline vs with MessageWindow.build().
+Without --vocab a small generated
+vocab is used, which tokenizes faster than a real one; pass a real
+cl100k_base.tiktoken for representative cold numbers.
+
+    python tests/bench_tokenizer.py [--messages 100000] [--vocab cl100k_base.tiktoken]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_context_budget import BOT, WORDS, build  # noqa: E402
+from test_tokenizer import write_vocab  # noqa: E402
+from modules.context_gatherer import MessageWindow, _format_line  # noqa: E402
+from modules.llm_providers import tokenizer as tk  # noqa: E402
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+async def loop_stall(make):
+    """Longest gap between 1ms ticks of the event loop while make() runs."""
+    gaps = []
+    done = False
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.005)
+    await make()
+    done = True
+    await task
+    return max(gaps)
+
+
+def report(label, texts, seconds, total):
+    mb = sum(len(t) for t in texts) / 1e6
+    print(f"{label:22s} {seconds * 1000:>9.1f}ms {len(texts) / seconds:>12,.0f} {mb / seconds:>8.1f}"
+          f" {total:>12,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--vocab", help="tiktoken vocab file (default: a generated toy vocab)")
+    args = parser.parse_args()
+    if not tk.HAS_TIKTOKEN:
+        sys.exit("tiktoken is not installed")
+
+    rows = build(args.messages)
+    # The strings MessageWindow counts, so the window build below hits the cache
+    texts = [line + "\n" for line in (_format_line(r, BOT) for r in rows) if line is not None]
+    with tempfile.TemporaryDirectory() as tmp:
+        vocab = args.vocab
+        if vocab is None:
+            vocab = os.path.join(tmp, "toy.tiktoken")
+            write_vocab(vocab, WORDS + [" " + w for w in WORDS])
+        bpe = tk.BPETokenizer(vocab)
+        heuristic = tk.HeuristicTokenizer()
+
+        print(f"{args.messages:,} messages, vocab {bpe.name}\n")
+        print(f"{'':22s} {'time':>11s} {'msgs/s':>12s} {'MB/s':>8s} {'tokens':>12s}")
+        print("─" * 70)
+        counts, s = timed(heuristic.count_many, texts)
+        report("len/4", texts, s, sum(counts))
+        counts, s = timed(lambda: [bpe.count(t) for t in texts])
+        report("BPE cold, one by one", texts, s, sum(counts))
+        bpe = tk.BPETokenizer(vocab)
+        counts, s = timed(bpe.count_many, texts)
+        report(f"BPE cold, {tk.BATCH_THREADS} thread(s)", texts, s, sum(counts))
+        counts, s = timed(bpe.count_many, texts)
+        report("BPE cached", texts, s, sum(counts))
+
+        print()
+        for label, tok in (("len/4", heuristic), ("BPE cached", bpe)):
+            _, s = timed(MessageWindow, rows, BOT, tok)
+            print(f"MessageWindow, {label:10s} {s * 1000:>9.1f}ms")
+
+        async def inline():
+            MessageWindow(rows, BOT, tk.BPETokenizer(vocab))
+
+        async def offloaded():
+            await MessageWindow.build(rows, BOT, tk.BPETokenizer(vocab))
+        print("\nLongest event loop stall, cold window:")
+        for label, make in (("inline", inline), ("build()", offloaded)):
+            print(f"  {label:10s} {asyncio.run(loop_stall(make)) * 1000:>9.1f}ms")
+        print(f"\n{bpe.describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark: TTS time-to-first-audio, temp file vs streaming into FFmpeg's pipe.
+
+The old path waited for edge-tts to finish, wrote the MP3 to a temp file
+and started FFmpeg on it. The new one hands FFmpegPCMAudio a
+StreamingAudio it reads through its stdin pipe while synthesis is still
+running. Both paths are measured from the start of synthesis until audio
+is available to play.
+
+By default edge-tts is simulated: chunks arrive after --first-chunk
+seconds, then one every --interval. The "decoder" is a thread that reads
+the input like FFmpeg would. With --live the real edge-tts service and
+FFmpeg are used, and first audio means the first 20ms PCM frame out of
+FFmpegPCMAudio. That needs network access and an ffmpeg binary.
+
+    python tests/bench_tts_playback.py [--rounds 5] [--chunks 60] [--live]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.tts_audio import StreamingAudio  # noqa: E402
+
+TEXT = ("somebody says: did anyone else see that the build broke again last night, "
+        "I think it was the dependency bump but I haven't had a chance to look yet")
+VOICE = "en-US-GuyNeural"
+CHUNK_BYTES = 4320      # edge-tts sends 24kbps MP3 in chunks about this size
+
+
+def simulated_tts(first_chunk, interval, chunks):
+    async def generate(text, voice):
+        await asyncio.sleep(first_chunk)
+        for i in range(chunks):
+            if i:
+                await asyncio.sleep(interval)
+            yield os.urandom(CHUNK_BYTES)
+    return generate
+
+
+async def live_tts(text, voice):
+    import edge_tts
+    async for chunk in edge_tts.Communicate(text, voice).stream():
+        if chunk["type"] == "audio":
+            yield chunk["data"]
+
+
+class FirstAudio:
+    """Set from the decoder thread when its first output is ready."""
+
+    def __init__(self):
+        self.at = None
+
+    def mark(self):
+        if self.at is None:
+            self.at = time.perf_counter()
+
+    async def wait(self):
+        while self.at is None:
+            await asyncio.sleep(0.001)
+        return self.at
+
+
+def fake_decoder(source, pipe):
+    """Stand-in for FFmpeg: the first block read counts as first audio."""
+    first = FirstAudio()
+
+    def run():
+        read = source.read if pipe else open(source, "rb").read
+        if read(8192):
+            first.mark()
+        while read(8192):
+            pass
+    threading.Thread(target=run, daemon=True).start()
+    return first
+
+
+def ffmpeg_decoder(source, pipe):
+    import discord
+    first = FirstAudio()
+    audio = discord.FFmpegPCMAudio(source, pipe=pipe, options="-loglevel quiet")
+
+    def run():
+        if audio.read():
+            first.mark()
+        while audio.read():
+            pass
+        audio.cleanup()
+    threading.Thread(target=run, daemon=True).start()
+    return first
+
+
+async def temp_file_path(generate, decode):
+    """Synthesize everything, write a temp file, then start decoding it."""
+    t0 = time.perf_counter()
+    data = bytearray()
+    async for chunk in generate(TEXT, VOICE):
+        data += chunk
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp:
+        tmp.write(data)
+        path = tmp.name
+    try:
+        return await decode(path, False).wait() - t0
+    finally:
+        os.unlink(path)
+
+
+async def streaming_path(generate, decode):
+    """Start decoding with the first chunk while synthesis continues."""
+    t0 = time.perf_counter()
+    audio = StreamingAudio()
+    first = None
+    async for chunk in generate(TEXT, VOICE):
+        audio.write(chunk)
+        if first is None:
+            first = decode(audio, True)
+    audio.finish()
+    return await first.wait() - t0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--first-chunk", type=float, default=0.25,
+                        help="simulated seconds until edge-tts sends audio")
+    parser.add_argument("--interval", type=float, default=0.03,
+                        help="simulated seconds between audio chunks")
+    parser.add_argument("--chunks", type=int, default=60)
+    parser.add_argument("--live", action="store_true",
+                        help="use real edge-tts and ffmpeg")
+    args = parser.parse_args()
+
+    if args.live:
+        generate, decode = live_tts, ffmpeg_decoder
+        print(f"Live edge-tts + ffmpeg, {len(TEXT)} chars of text\n")
+    else:
+        generate = simulated_tts(args.first_chunk, args.interval, args.chunks)
+        decode = fake_decoder
+        print(f"Simulated edge-tts: first chunk after {args.first_chunk * 1000:.0f}ms, "
+              f"{args.chunks} x {CHUNK_BYTES}B every {args.interval * 1000:.0f}ms\n")
+
+    print(f"{'':22s} {'median':>9s} {'min':>9s} {'max':>9s}")
+    print("─" * 52)
+    for label, path in (("temp file (old)", temp_file_path), ("streaming pipe", streaming_path)):
+        times = [await path(generate, decode) for _ in range(args.rounds)]
+        print(f"{label:22s} {statistics.median(times) * 1000:>7.0f}ms "
+              f"{min(times) * 1000:>7.0f}ms {max(times) * 1000:>7.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for AICache's in-memory settings cache.
+
+Settings are loaded once per guild and resolved per (guild, channel);
+set_setting must invalidate so reads never go stale.
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.ai_cache import AICache, SETTINGS_SPEC  # noqa: E402
+
+GUILD = 123
+CHANNEL = 456
+OTHER_CHANNEL = 789
+
+
+class SettingsCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = AICache(logdir=self._tmp.name)
+        db = await self.cache.get_db()
+        self.queries = []
+        await db.set_trace_callback(self._trace)
+
+    async def asyncTearDown(self):
+        await self.cache.close()
+        self._tmp.cleanup()
+
+    def _trace(self, sql):
+        if "FROM settings" in sql:
+            self.queries.append(sql)
+
+    async def test_defaults(self):
+        settings = await self.cache.get_all_settings(GUILD, CHANNEL)
+        self.assertEqual(settings, {k: spec[0] for k, spec in SETTINGS_SPEC.items()})
+        self.assertIsNone(await self.cache.get_setting(GUILD, CHANNEL, "nope"))
+
+    async def test_channel_guild_default_fallback(self):
+        await self.cache.set_setting(GUILD, None, "raw_hours", 12)
+        await self.cache.set_setting(GUILD, CHANNEL, "raw_hours", 3)
+        await self.cache.set_setting(GUILD, CHANNEL, "debug", "on")
+        self.assertEqual(await self.cache.get_setting(GUILD, CHANNEL, "raw_hours"), 3)
+        self.assertEqual(await self.cache.get_setting(GUILD, OTHER_CHANNEL, "raw_hours"), 12)
+        self.assertEqual(await self.cache.get_setting(GUILD, None, "raw_hours"), 12)
+        self.assertEqual(await self.cache.get_setting(GUILD, OTHER_CHANNEL, "debug"), "off")
+        self.assertEqual(await self.cache.get_setting(GUILD + 1, CHANNEL, "raw_hours"), 6)
+
+    async def test_hot_reads_do_not_query(self):
+        await self.cache.get_all_settings(GUILD, CHANNEL)
+        self.assertEqual(len(self.queries), 1)
+        # What a warm !clai does: the full dict plus a few single keys
+        await self.cache.get_setting(GUILD, CHANNEL, "enabled")
+        await self.cache.get_all_settings(GUILD, CHANNEL)
+        await self.cache.get_setting(GUILD, None, "brave_api_key")
+        await self.cache.get_all_settings(GUILD, OTHER_CHANNEL)
+        self.assertEqual(len(self.queries), 1)
+
+    async def test_set_setting_invalidates(self):
+        self.assertEqual(await self.cache.get_setting(GUILD, CHANNEL, "compact_days"), 7)
+        await self.cache.set_setting(GUILD, None, "compact_days", 14)
+        self.assertEqual(await self.cache.get_setting(GUILD, CHANNEL, "compact_days"), 14)
+        await self.cache.set_setting(GUILD, CHANNEL, "compact_days", 2)
+        self.assertEqual(await self.cache.get_setting(GUILD, CHANNEL, "compact_days"), 2)
+        self.assertEqual(await self.cache.get_setting(GUILD, OTHER_CHANNEL, "compact_days"), 14)
+
+    async def test_rejected_value_leaves_cache(self):
+        await self.cache.get_all_settings(GUILD, CHANNEL)
+        ok, _ = await self.cache.set_setting(GUILD, CHANNEL, "compact_days", 999)
+        self.assertFalse(ok)
+        self.assertEqual(await self.cache.get_setting(GUILD, CHANNEL, "compact_days"), 7)
+        self.assertEqual(len(self.queries), 1)
+
+    async def test_returned_dict_is_a_copy(self):
+        settings = await self.cache.get_all_settings(GUILD, CHANNEL)
+        settings["raw_hours"] = 99
+        self.assertEqual(await self.cache.get_setting(GUILD, CHANNEL, "raw_hours"), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for VoiceTTS._clean_text: the three-scan normalizer gives the same
+output as the old pass-per-rule version over a corpus of chat messages.
+"""
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import voice_tts  # noqa: E402
+
+
+class Named:
+    def __init__(self, name):
+        self.name = name
+        self.display_name = name
+
+
+class FakeGuild:
+    id = 1
+    members = {10: Named("six"), 11: Named("cool_guy"), 12: Named("🔥 blaze 🔥")}
+    channels = {20: Named("general"), 21: Named("bot_spam")}
+    roles = {30: Named("mods")}
+
+    def get_member(self, uid):
+        return self.members.get(uid)
+
+    def get_channel(self, cid):
+        return self.channels.get(cid)
+
+    def get_role(self, rid):
+        return self.roles.get(rid)
+
+
+class FakeMessage:
+    guild = FakeGuild()
+
+    def __init__(self, content):
+        self.content = content
+
+
+CORPUS = [
+    "lol",
+    "LOL",
+    "  hello   world  ",
+    "**bold** and *italic* and __underline__ and ~~strike~~",
+    "***both*** _single underscore_ snake_case_name",
+    "> quoted line\n> another\nnot quoted",
+    ">>> multi quote",
+    "hey <@10> and <@!11>, check <#20> or <#21>",
+    "<@&30> ping, also <@999> <#999> <@&999>",
+    "<@12> says hi",
+    "this is a ||spoiler|| and ||another one||",
+    "unclosed || spoiler",
+    "```py\nprint('hi')\nfor x in y:\n    pass\n``` then text",
+    "use `git status` and `git log --oneline` here",
+    "unclosed ` backtick",
+    "https://example.com/some/page",
+    "   https://example.com/x   ",
+    "look at this https://example.com/a?b=c and this http://x.y/z ok",
+    "<https://example.com/wrapped>",
+    "answer text\n🔧 claude-sonnet | 1234 tok | $0.01 | 2.1s",
+    "nice <:pepega:123456789> <a:dance:987654321>",
+    "😂😂😂 that's hilarious 🎉",
+    "thumbs 👍🏽 and flags 🇨🇦 and zwj 👨‍👩‍👧",
+    "★ stars ☆ and ♥ hearts ✔ check ➡ arrow",
+    "日本語のテキスト and 한국어 and 中文",
+    "café naïve résumé — em dash “quotes”",
+    "pipes | and tildes ~ and > arrows",
+    "mixed **<@10>** in bold, `<@11>` in code, ||<@10>|| in spoiler",
+    "tabs\tand\nnewlines\r\nand\u00a0nbsp",
+    "",
+    "   ",
+    "***",
+    "😂",
+    "word " * 400,
+    "a" * 1600,
+]
+
+
+def old_clean_text(message, max_length=voice_tts.DEFAULT_MSG_LENGTH):
+    """VoiceTTS._clean_text before it was compiled into three scans."""
+    text = message.content
+    if re.compile(r'^https?://\S+$').match(text.strip()):
+        return ""
+    text = re.sub(r'\|\|.*?\|\|', "spoiler", text)
+    text = re.sub(r'```.*?```', "code block", text, flags=re.DOTALL)
+    text = re.sub(r'`[^`]+`', "code", text)
+    text = re.sub(r'https?://\S+', '', text)
+    text = re.sub(r'🔧[^\n]*', '', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.+?)\*', r'\1', text)
+    text = re.sub(r'__(.+?)__', r'\1', text)
+    text = re.sub(r'~~(.+?)~~', r'\1', text)
+    text = re.sub(r'^>\s?', '', text, flags=re.MULTILINE)
+
+    def replace_mention(m):
+        member = message.guild.get_member(int(m.group(1)))
+        return member.display_name if member else "someone"
+    text = re.sub(r'<@!?(\d+)>', replace_mention, text)
+
+    def replace_channel(m):
+        ch = message.guild.get_channel(int(m.group(1)))
+        return ch.name if ch else "a channel"
+    text = re.sub(r'<#(\d+)>', replace_channel, text)
+
+    def replace_role(m):
+        role = message.guild.get_role(int(m.group(1)))
+        return role.name if role else "a role"
+    text = re.sub(r'<@&(\d+)>', replace_role, text)
+
+    text = re.sub(r'<a?:(\w+):\d+>', '', text)
+    text = re.sub(r'[*_~`|>]', '', text)
+    text = re.sub(
+        r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF'
+        r'\U0001F700-\U0001F77F\U0001F780-\U0001F7FF\U0001F800-\U0001F8FF'
+        r'\U0001F900-\U0001F9FF\U0001FA00-\U0001FA6F\U0001FA70-\U0001FAFF'
+        r'\U00002702-\U000027B0\U0000FE00-\U0000FE0F\U000024C2-\U0001F251'
+        r'\U0000200D\U00002600-\U000026FF\U00002300-\U000023FF'
+        r'\U0000203C-\U00003299]+', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    if not text:
+        return ""
+    if len(text) > max_length:
+        text = text[:max_length] + "... message truncated"
+    return text
+
+
+class CleanTextTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cog = voice_tts.VoiceTTS(None)
+
+    def test_matches_old_output(self):
+        for content in CORPUS:
+            with self.subTest(content=content[:40]):
+                message = FakeMessage(content)
+                self.assertEqual(self.cog._clean_text(message), old_clean_text(message))
+
+    def test_examples(self):
+        clean = lambda content: self.cog._clean_text(FakeMessage(content))  # noqa: E731
+        self.assertEqual(clean("hey <@10>, **see** <#21> <@&30>"), "hey six, see botspam mods")
+        self.assertEqual(clean("||secret|| `x` ```y```"), "spoiler code code block")
+        self.assertEqual(clean("https://example.com"), "")
+        self.assertEqual(clean("😂 <:kek:1>"), "")
+
+    def test_overlapping_markup_goes_left_to_right(self):
+        # The old passes ran spoilers over the whole text before code blocks;
+        # now whichever starts first wins
+        message = FakeMessage("```a || b``` || c")
+        self.assertEqual(self.cog._clean_text(message), "code block c")
+        self.assertEqual(old_clean_text(message), "a spoiler c")
+
+
+if __name__ == "__main__":
+    unittest.main()
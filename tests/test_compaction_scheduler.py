@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Tests for the background CompactionScheduler: singleflight per channel,
+per-guild concurrency, and Logger-driven overflow checks.
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import compaction_scheduler as cs  # noqa: E402
+
+SETTINGS = {"context": "on", "recompact_raw_tokens": 100}
+
+
+class FakeLogger:
+    def info(self, msg): pass
+    def error(self, msg): pass
+
+
+class FakeBot:
+    def __init__(self):
+        self.logger = FakeLogger()
+
+
+class FakeGuild:
+    def __init__(self, gid):
+        self.id = gid
+
+
+class FakeChannel:
+    def __init__(self, cid, guild):
+        self.id = cid
+        self.guild = guild
+        self.name = f"chan{cid}"
+
+
+class FakeCache:
+    def __init__(self):
+        self.rows = {}
+
+    async def get_cache(self, channel_id):
+        return self.rows.get(channel_id)
+
+
+class FakeGatherer:
+    """Records compactions; each one blocks until released."""
+
+    def __init__(self):
+        self.ai_cache = FakeCache()
+        self.overflow = 0
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.release = asyncio.Event()
+        self.fail = False
+
+    def segments_due(self, cache, settings):
+        return False
+
+    async def measure_overflow(self, channel, cache, settings):
+        return self.overflow
+
+    async def compact_channel(self, channel, settings, token, base_url, compact_model):
+        self.calls.append(channel.id)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await self.release.wait()
+            if self.fail:
+                raise RuntimeError("API down")
+        finally:
+            self.active -= 1
+        self.ai_cache.rows[channel.id] = {"newest_snowflake": 1}
+        return "summary", 10
+
+
+async def auth():
+    return "token", "https://example.invalid"
+
+
+class SchedulerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.gatherer = FakeGatherer()
+        self.scheduler = cs.CompactionScheduler(FakeBot(), self.gatherer)
+        self.guild = FakeGuild(1)
+
+    async def asyncTearDown(self):
+        await self.scheduler.close()
+
+    def _track(self, cid, guild=None):
+        channel = FakeChannel(cid, guild or self.guild)
+        self.scheduler.track(channel, SETTINGS, "model", auth)
+        return channel
+
+    async def _drain(self):
+        self.gatherer.release.set()
+        while self.scheduler._jobs:
+            await asyncio.sleep(0)
+
+    async def test_untracked_channel_not_scheduled(self):
+        self.assertFalse(self.scheduler.schedule(99))
+
+    async def test_singleflight_per_channel(self):
+        self._track(10)
+        self.assertTrue(self.scheduler.schedule(10))
+        self.assertFalse(self.scheduler.schedule(10))
+        self.assertFalse(self.scheduler.schedule(10))
+        await self._drain()
+        self.assertEqual(self.gatherer.calls, [10])
+        self.assertEqual(self.scheduler.stats["joined"], 2)
+        self.assertEqual(self.scheduler.stats["done"], 1)
+        self.assertEqual(len(self.scheduler.latency), 1)
+
+    async def test_per_guild_limit(self):
+        for cid in (10, 11, 12):
+            self._track(cid)
+        self._track(20, FakeGuild(2))
+        for cid in (10, 11, 12, 20):
+            self.scheduler.schedule(cid)
+        await asyncio.sleep(0.01)
+        # One running per guild, the rest of guild 1 waits its turn
+        self.assertEqual(self.gatherer.active, 2)
+        self.assertEqual(self.scheduler.queue_depth, 2)
+        self.assertEqual(self.scheduler.status(10), "running")
+        self.assertEqual(self.scheduler.status(11), "queued")
+        self.assertIn("2 running, 2 queued", self.scheduler.describe())
+        await self._drain()
+        self.assertEqual(sorted(self.gatherer.calls), [10, 11, 12, 20])
+        self.assertEqual(self.gatherer.max_active, 2)
+        self.assertEqual(self.scheduler.status(10), "idle")
+
+    async def test_logged_text_triggers_check(self):
+        self._track(10)
+        self.gatherer.ai_cache.rows[10] = {"newest_snowflake": 1}
+        self.scheduler.note_logged({10: 400, 99: 10_000})
+        self.assertEqual(self.scheduler._jobs, {})
+        # Past CHECK_EVERY_TOKENS but overflow is under the threshold
+        self.scheduler.note_logged({10: cs.CHECK_EVERY_TOKENS * 4})
+        await self._drain()
+        self.assertEqual(self.gatherer.calls, [])
+        # Over the threshold: compacts
+        self.gatherer.overflow = 500
+        self.gatherer.release.clear()
+        self.scheduler.note_logged({10: cs.CHECK_EVERY_TOKENS * 4})
+        await self._drain()
+        self.assertEqual(self.gatherer.calls, [10])
+
+    async def test_failure_counted_and_cleared(self):
+        self._track(10)
+        self.gatherer.fail = True
+        self.scheduler.schedule(10)
+        await self._drain()
+        self.assertEqual(self.scheduler.stats["failed"], 1)
+        self.assertEqual(self.scheduler.status(10), "idle")
+        self.assertTrue(self.scheduler.schedule(10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for tiered incremental compaction: segment planning in
+compaction_tiers and ContextGatherer.compact_channel over a simulated
+channel, with the compaction model faked out, including concurrent
+compactions and rebuilds.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import compaction_tiers as tiers  # noqa: E402
+from modules.ai_cache import AICache  # noqa: E402
+from modules.context_gatherer import ContextGatherer  # noqa: E402
+from modules.llm_providers import HeuristicTokenizer, estimate_tokens  # noqa: E402
+
+DAY = 86400
+NOW = 1_790_000_000 - 1_790_000_000 % DAY + 15 * 3600   # 15:00 UTC
+SETTINGS = {"compact_days": 7, "raw_hours": 6, "compact_max_tokens": 2000,
+            "compact_model": "model", "max_compaction_input": 120000}
+
+
+def sf(ts):
+    return (int(ts * 1000) - tiers.DISCORD_EPOCH) << 22
+
+
+def seg(tier, start, end, tokens=100):
+    return tiers.Segment(tier, sf(start), sf(end), "s", tokens)
+
+
+class TierPlanningTests(unittest.TestCase):
+
+    def test_day_chunks(self):
+        stamps = [NOW - 2 * DAY, NOW - 2 * DAY + 60, NOW - DAY, NOW - 3600, NOW - 60]
+        chunks = tiers.day_chunks([sf(t) for t in stamps], 0, len(stamps), NOW)
+        self.assertEqual(chunks, [(tiers.DAY, 0, 2), (tiers.DAY, 2, 3), (tiers.HOUR, 3, 5)])
+
+    def test_finished_day_rolls_up(self):
+        yesterday = NOW - DAY
+        segments = [seg(tiers.DAY, NOW - 3 * DAY, NOW - 3 * DAY + 60),
+                    seg(tiers.HOUR, yesterday - 7200, yesterday - 3600),
+                    seg(tiers.HOUR, yesterday - 3000, yesterday),
+                    seg(tiers.HOUR, NOW - 7200, NOW - 3600)]
+        self.assertEqual(tiers.next_rollup(segments, NOW, 10_000), (tiers.DAY, 1, 3))
+
+    def test_over_budget_merges_oldest(self):
+        segments = [seg(tiers.DAY, NOW - 3 * DAY, NOW - 3 * DAY + 60, 1500),
+                    seg(tiers.WEEK, NOW - 2 * DAY, NOW - 2 * DAY + 60, 1500),
+                    seg(tiers.HOUR, NOW - 7200, NOW - 3600)]
+        self.assertIsNone(tiers.next_rollup(segments, NOW, 5000))
+        self.assertEqual(tiers.next_rollup(segments, NOW, 2000), (tiers.WEEK, 0, 2))
+
+    def test_expire_and_render(self):
+        segments = [seg(tiers.DAY, NOW - 9 * DAY, NOW - 9 * DAY + 60),
+                    seg(tiers.HOUR, NOW - 7200, NOW - 3600)]
+        kept = tiers.expire(segments, sf(NOW - 7 * DAY))
+        self.assertEqual(len(kept), 1)
+        self.assertIn("–14:00 UTC]\ns", tiers.render(kept))
+        self.assertEqual(tiers.describe(segments), "1 day, 1 hour")
+
+    def test_legacy_row_is_one_segment(self):
+        cache = {"segments": None, "oldest_snowflake": sf(NOW - 7 * DAY),
+                 "newest_snowflake": sf(NOW - 6 * 3600), "summary_text": "old", "token_count": 5}
+        [legacy] = tiers.load(cache)
+        self.assertEqual((legacy.tier, legacy.summary, legacy.tokens), (tiers.WEEK, "old", 5))
+        self.assertEqual(tiers.load({"segments": tiers.dump([legacy])})[0].to_dict(),
+                         legacy.to_dict())
+
+
+class FakeProvider:
+    tokenizer = HeuristicTokenizer()
+
+    def estimate_tokens(self, text):
+        return estimate_tokens(text)
+
+
+class FakeUser:
+    id = 1
+
+
+class FakeBot:
+    user = FakeUser()
+    cogs = {}
+
+
+class FakeGuild:
+    id = 10
+
+
+class FakeChannel:
+    id = 20
+    guild = FakeGuild()
+    name = "general"
+
+
+class SimulatedGatherer(ContextGatherer):
+    """Serves messages from a list and fakes the compaction model."""
+
+    def __init__(self, ai_cache):
+        super().__init__(FakeBot(), ai_cache, FakeProvider())
+        self.messages = []
+        self.calls = []     # (input_tokens, merge)
+
+    async def _fetch_channel_messages(self, channel, start, end=None):
+        return [m for m in self.messages if m[3] > start and (end is None or m[3] <= end)]
+
+    async def _do_compaction(self, ctx, text, budget, model, token, base_url, merge=False):
+        in_tok = estimate_tokens(text)
+        self.calls.append((in_tok, merge))
+        return "x" * (budget * 4), in_tok, budget, 0
+
+
+class IncrementalCompactionTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.ai_cache = AICache(logdir=self._tmp.name)
+        self.gatherer = SimulatedGatherer(self.ai_cache)
+        self.now = NOW
+        self._clock = mock.patch("time.time", lambda: self.now)
+        self._clock.start()
+        # A busy channel: a ~50 token message every two minutes for 10 days
+        self._log_until(NOW, start=NOW - 10 * DAY)
+
+    async def asyncTearDown(self):
+        self._clock.stop()
+        await self.ai_cache.close()
+        self._tmp.cleanup()
+
+    def _log_until(self, end, start=None):
+        t = start if start is not None else self._last + 120
+        while t <= end:
+            self.gatherer.messages.append((2, "user", "word " * 40, sf(t)))
+            t += 120
+        self._last = t - 120
+
+    async def _compact(self):
+        self.gatherer.calls.clear()
+        result = await self.gatherer.compact_channel(FakeChannel(), SETTINGS, "tok", "url")
+        cache = await self.ai_cache.get_cache(FakeChannel.id)
+        return result, cache, sum(tok for tok, _ in self.gatherer.calls)
+
+    async def test_incremental_cost_and_rollup(self):
+        result, cache, cold_input = await self._compact()
+        self.assertIsNotNone(result)
+        segments = tiers.load(cache)
+        self.assertEqual(cache["summary_text"], result[0])
+        self.assertLessEqual(cache["newest_snowflake"], sf(NOW - 6 * 3600))
+        self.assertEqual(segments[-1].tier, tiers.HOUR)   # today so far
+        self.assertTrue(all(s.tier in (tiers.DAY, tiers.WEEK) for s in segments[:-1]))
+
+        # Three hours later only the new overflow is summarized
+        self.now += 3 * 3600
+        self._log_until(self.now)
+        result, cache, warm_input = await self._compact()
+        self.assertEqual(result[1], 90)
+        self.assertLess(warm_input * 10, cold_input)
+        self.assertEqual(tiers.load(cache)[-1].tier, tiers.HOUR)
+
+        # Nothing new and nothing due: no call, no write
+        result, _, _ = await self._compact()
+        self.assertIsNone(result)
+        self.assertEqual(self.gatherer.calls, [])
+
+        # Two days on, finished days are rolled up and old ones aged out
+        self.now += 2 * DAY
+        self._log_until(self.now)
+        _, cache, _ = await self._compact()
+        segments = tiers.load(cache)
+        window_start = sf(self.now - 7 * DAY)
+        self.assertTrue(all(s.newest > window_start for s in segments))
+        self.assertEqual([s.tier for s in segments if s.tier == tiers.HOUR], [tiers.HOUR])
+        self.assertLessEqual(sum(s.tokens for s in segments), SETTINGS["compact_max_tokens"])
+
+    async def test_quiet_channel_ages_out(self):
+        await self._compact()
+        cache = await self.ai_cache.get_cache(FakeChannel.id)
+        self.assertFalse(self.gatherer.segments_due(cache, SETTINGS))
+        self.now += 20 * DAY
+        self.assertTrue(self.gatherer.segments_due(cache, SETTINGS))
+        self.assertIsNone(await self.gatherer.compact_channel(FakeChannel(), SETTINGS, "tok", "url"))
+        self.assertIsNone(await self.ai_cache.get_cache(FakeChannel.id))
+
+
+class ConcurrentCompactionTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.ai_cache = AICache(logdir=self._tmp.name)
+        self.gatherer = SimulatedGatherer(self.ai_cache)
+        self._clock = mock.patch("time.time", lambda: NOW)
+        self._clock.start()
+        t = NOW - 10 * DAY
+        while t <= NOW:
+            self.gatherer.messages.append((2, "user", "word " * 40, sf(t)))
+            t += 120
+        # Hold the first compaction call until released
+        self.release = asyncio.Event()
+        do_compaction = self.gatherer._do_compaction
+
+        async def slow_compaction(*args, **kwargs):
+            await self.release.wait()
+            return await do_compaction(*args, **kwargs)
+        self.gatherer._do_compaction = slow_compaction
+
+    async def asyncTearDown(self):
+        self._clock.stop()
+        await self.ai_cache.close()
+        self._tmp.cleanup()
+
+    async def test_concurrent_compactions_share_one_run(self):
+        runs = [asyncio.create_task(self.gatherer.compact_channel(FakeChannel(), SETTINGS, "tok", "url"))
+                for _ in range(3)]
+        await asyncio.sleep(0.01)
+        self.release.set()
+        results = await asyncio.gather(*runs)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(self.gatherer.compactions.stats["calls"], 1)
+        self.assertEqual(self.gatherer.compactions.stats["joined"], 2)
+
+    async def test_rebuild_waits_for_running_compaction(self):
+        compacting = asyncio.create_task(
+            self.gatherer.compact_channel(FakeChannel(), SETTINGS, "tok", "url"))
+        await asyncio.sleep(0.01)
+        rebuilding = asyncio.create_task(
+            self.gatherer.rebuild_channel(FakeChannel(), SETTINGS, "tok", "url"))
+        await asyncio.sleep(0.01)
+        calls = len(self.gatherer.calls)
+        self.release.set()
+        first = await compacting
+        rebuilt = await rebuilding
+        # The rebuild ran after the compaction landed, from scratch
+        self.assertGreater(len(self.gatherer.calls), calls)
+        self.assertEqual(rebuilt, first)
+        self.assertEqual(self.gatherer.compactions.stats["waited"], 1)
+        cache = await self.ai_cache.get_cache(FakeChannel.id)
+        self.assertEqual(cache["summary_text"], rebuilt[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
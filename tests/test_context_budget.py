@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for MessageWindow: prefix-sum token budgeting over formatted rows.
+"""
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.context_gatherer import MessageWindow  # noqa: E402
+from modules.llm_providers import HeuristicTokenizer, estimate_tokens  # noqa: E402
+
+BOT = 1
+TOKENIZER = HeuristicTokenizer()
+
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        user = rng.choice([BOT, 2, 3, 4])
+        text = " ".join(rng.choice(["hi", "pizza", "https://example.com/x", "ok"])
+                        for _ in range(rng.randint(1, 30)))
+        if user == BOT and i % 3 == 0:
+            text = "-# 🔧 model=x 12tok"  # debug header only: dropped
+        elif user == BOT:
+            text = f"-# 🔧 model=x\n{text}"
+        rows.append((user, f"user{user}", text, 1000 + i * 10))
+    return rows
+
+
+class MessageWindowTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = make_rows(500)
+        self.window = MessageWindow(self.rows, BOT, TOKENIZER)
+
+    def test_text_format(self):
+        rows = [(2, "al", "hello", 1),
+                (BOT, "pal", "-# 🔧 debug", 2),
+                (BOT, "pal", "-# 🔧 debug\nanswer", 3)]
+        window = MessageWindow(rows, BOT, TOKENIZER)
+        self.assertEqual(window.text(), "al (<@2>): hello\n[BOT] pal (<@1>): answer")
+        self.assertEqual(window.tokens(1, 2), 0)
+
+    def test_tokens_match_text(self):
+        # Per-message counts stay within rounding of counting the joined text
+        for start, end in [(0, 500), (10, 20), (250, 499), (7, 7)]:
+            n = end - start
+            text_tokens = estimate_tokens(self.window.text(start, end))
+            self.assertLessEqual(abs(self.window.tokens(start, end) - text_tokens), n)
+
+    def test_trim_is_tightest_fit(self):
+        for budget in (0, 10, 500, 3000, 10**9):
+            for end in (500, 300):
+                i = self.window.trim(budget, 0, end)
+                self.assertLessEqual(self.window.tokens(i, end) * 1.2, budget + 1e-9)
+                if i > 0:
+                    self.assertGreater(self.window.tokens(i - 1, end) * 1.2, budget)
+
+    def test_split_matches_filter(self):
+        for snowflake in (0, 1000, 1005, 3000, 10**9):
+            older = [r for r in self.rows if r[3] <= snowflake]
+            self.assertEqual(self.window.split(snowflake), len(older))
+        self.assertEqual(self.window.split(3000, start=250), 250)
+
+    def test_empty(self):
+        window = MessageWindow([], BOT, TOKENIZER)
+        self.assertEqual((window.tokens(), window.trim(100), window.split(5)), (0, 0, 0))
+        self.assertEqual(window.text(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for Location's geocode/timezone cache: repeat lookups skip the API,
+"not found" is cached but API errors are not, and entries expire.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import geocache  # noqa: E402
+from utils.context import Location  # noqa: E402
+
+TORONTO = {
+    "status": "OK",
+    "results": [{
+        "address_components": [
+            {"long_name": "Toronto", "short_name": "Toronto", "types": ["locality"]},
+            {"long_name": "Ontario", "short_name": "ON", "types": ["administrative_area_level_1"]},
+            {"long_name": "Canada", "short_name": "CA", "types": ["country"]},
+        ],
+        "geometry": {"location": {"lat": 43.6532, "lng": -79.3832}},
+    }],
+}
+
+
+class FakeResponse:
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, payloads):
+        self.payloads = payloads    # substring of url -> payload
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        for part, payload in self.payloads.items():
+            if part in url:
+                return FakeResponse(payload)
+        raise AssertionError(url)
+
+
+class FakeConfig:
+    gsearch2 = "gkey"
+    timezonedb = "tzkey"
+
+
+class FakeBot:
+    config = FakeConfig()
+
+    def __init__(self, payloads):
+        self.session = FakeSession(payloads)
+
+
+class GeocodeCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = geocache.GeocodeCache(os.path.join(self._tmp.name, "geocache.sqlite"))
+        self._patch = mock.patch.object(Location, "cache", self.cache)
+        self._patch.start()
+
+    async def asyncTearDown(self):
+        self._patch.stop()
+        await self.cache.close()
+        self._tmp.cleanup()
+
+    async def test_geocode_cached_by_normalized_query(self):
+        bot = FakeBot({"address=": TORONTO})
+        first = await Location.from_google_geocode(bot, "Toronto, ON")
+        again = await Location.from_google_geocode(bot, "  toronto ON ")
+        self.assertEqual(len(bot.session.urls), 1)
+        self.assertEqual(again.formatted_address, first.formatted_address)
+        self.assertEqual((again.latitude, again.longitude), (43.6532, -79.3832))
+        self.assertEqual(again.user_input_location, "  toronto ON ")
+
+    async def test_negative_caching(self):
+        bot = FakeBot({"address=": {"status": "ZERO_RESULTS", "results": []}})
+        self.assertIsNone(await Location.from_google_geocode(bot, "qwxzzy"))
+        self.assertIsNone(await Location.from_google_geocode(bot, "qwxzzy"))
+        self.assertEqual(len(bot.session.urls), 1)
+
+        # Expires sooner than positive answers
+        with mock.patch("time.time", return_value=geocache.time.time() + geocache.NEGATIVE_TTL + 1):
+            await Location.from_google_geocode(bot, "qwxzzy")
+        self.assertEqual(len(bot.session.urls), 2)
+
+    async def test_errors_not_cached(self):
+        bot = FakeBot({"address=": {"status": "OVER_QUERY_LIMIT", "results": []},
+                       "latlng=": {"status": "OVER_QUERY_LIMIT", "results": []}})
+        for _ in range(2):
+            self.assertIsNone(await Location.from_google_geocode(bot, "Toronto"))
+            self.assertIsNone(await Location.get_location_by_latlon(bot, 43.65, -79.38))
+        self.assertEqual(len(bot.session.urls), 4)
+
+    async def test_timezone_by_grid_cell(self):
+        bot = FakeBot({"timezonedb": {"zoneName": "America\\/Toronto"}})
+        loc = Location(43.6532, -79.3832, "Toronto", "ON", "Canada", "toronto")
+        self.assertEqual(await loc.get_timezone(bot), "America/Toronto")
+        # A stored user location has string coordinates; a few km away is the same cell
+        nearby = Location("43.66", "-79.40", "Toronto", "ON", "Canada", "downtown")
+        self.assertEqual(await nearby.get_timezone(bot), "America/Toronto")
+        self.assertEqual(len(bot.session.urls), 1)
+
+    async def test_reverse_geocode_cached(self):
+        bot = FakeBot({"latlng=": TORONTO})
+        self.assertEqual(await Location.get_location_by_latlon(bot, 43.6532, -79.3832), "Toronto, ON")
+        self.assertEqual(await Location.get_location_by_latlon(bot, 43.6534, -79.3829), "Toronto, ON")
+        self.assertEqual(len(bot.session.urls), 1)
+
+    async def test_persists_across_instances(self):
+        bot = FakeBot({"address=": TORONTO})
+        await Location.from_google_geocode(bot, "Toronto")
+        await self.cache.close()
+        await Location.from_google_geocode(bot, "toronto")
+        self.assertEqual(len(bot.session.urls), 1)
+        self.assertEqual(self.cache.hits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared provider HTTP client (keep-alive reuse and retries).
+
+Runs against a local aiohttp server, no external network needed.
+"""
+import os
+import sys
+import unittest
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.llm_providers import http_client  # noqa: E402
+from modules.llm_providers import HTTPClient, CallStats, OpenAIProvider  # noqa: E402
+
+
+class HTTPClientTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.hits = 0
+        self.failures = 0   # respond 503 this many times before succeeding
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+        self.http = HTTPClient()
+        self._backoff_base = http_client.BACKOFF_BASE
+        http_client.BACKOFF_BASE = 0.001
+
+    async def asyncTearDown(self):
+        http_client.BACKOFF_BASE = self._backoff_base
+        await self.http.close()
+        await self.runner.cleanup()
+
+    async def _chat(self, request):
+        self.hits += 1
+        if self.failures:
+            self.failures -= 1
+            return web.Response(status=503, text="busy")
+        return web.json_response({"choices": [{"message": {"content": "hi"}}]})
+
+    def _provider(self):
+        return OpenAIProvider(None, base_url=self.base_url, http=self.http)
+
+    async def test_connection_reused(self):
+        provider = self._provider()
+        first, second = CallStats(), CallStats()
+        await provider.chat({}, stats=first)
+        await provider.chat({}, stats=second)
+        self.assertFalse(first.reused)
+        self.assertTrue(first.debug_label().startswith("conn:new+"))
+        self.assertTrue(second.reused)
+        self.assertTrue(second.debug_label().startswith("conn:reuse-"))
+        self.assertEqual(self.http.stats["reused"], 1)
+
+    async def test_retries_5xx(self):
+        self.failures = 2
+        stats = CallStats()
+        data = await self._provider().chat({}, stats=stats)
+        self.assertEqual(data["choices"][0]["message"]["content"], "hi")
+        self.assertEqual((self.hits, stats.retries), (3, 2))
+        self.assertIn("retry×2", stats.debug_label())
+
+    async def test_gives_up_after_max_retries(self):
+        self.failures = 10
+        with self.assertRaisesRegex(Exception, "API error 503"):
+            await self._provider().chat({})
+        self.assertEqual(self.hits, http_client.MAX_RETRIES + 1)
+
+    def test_backoff_bounds(self):
+        self.assertEqual(HTTPClient._backoff(0, "3"), 3.0)
+        self.assertEqual(HTTPClient._backoff(0, "600"), http_client.BACKOFF_MAX)
+        for attempt in range(10):
+            delay = HTTPClient._backoff(attempt, "soon")
+            self.assertLessEqual(delay, http_client.BACKOFF_MAX)
+            self.assertGreaterEqual(delay, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the processed-image cache: hits skip download and processing,
+reposted bytes skip processing, TTL expiry and LRU eviction by size.
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import image_cache as ic  # noqa: E402
+
+
+class Source:
+    """Fake download + processing that counts calls."""
+
+    def __init__(self):
+        self.downloads = 0
+        self.processed = 0
+
+    def download(self, raw):
+        async def fetch():
+            self.downloads += 1
+            return raw, "image/png"
+        return fetch
+
+    async def process(self, raw, mime):
+        self.processed += 1
+        return b"jpeg:" + raw, "image/jpeg", len(raw)
+
+
+class ImageCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = ic.ImageCache(self._tmp.name, max_bytes=100, ttl=3600)
+        self.src = Source()
+        self.now = 1_000_000.0
+        self._clock = mock.patch("time.time", lambda: self.now)
+        self._clock.start()
+
+    async def asyncTearDown(self):
+        self._clock.stop()
+        await self.cache.close()
+        self._tmp.cleanup()
+
+    async def _fetch(self, key, raw=b"x" * 20):
+        return await self.cache.fetch([key], self.src.download(raw), self.src.process)
+
+    async def test_hit_skips_download_and_processing(self):
+        first = await self._fetch("attachment:1")
+        self.assertEqual(first, (b"jpeg:" + b"x" * 20, "image/jpeg", 20, "miss"))
+        second = await self._fetch("attachment:1")
+        self.assertEqual(second[:3], first[:3])
+        self.assertEqual(second[3], "hit")
+        self.assertEqual((self.src.downloads, self.src.processed), (1, 1))
+        self.assertIn("50% hit rate", self.cache.describe())
+
+    async def test_same_bytes_new_url_skips_processing(self):
+        await self._fetch("url:https://a.example/meme.png")
+        again = await self._fetch("url:https://b.example/repost.png")
+        self.assertEqual(again[3], "raw")
+        self.assertEqual((self.src.downloads, self.src.processed), (2, 1))
+        # One file on disk for both keys
+        self.assertEqual(self.cache._total, 25)
+
+    async def test_failed_download_not_cached(self):
+        self.assertIsNone(await self.cache.fetch(["url:x"], self.src.download(None), self.src.process))
+        self.assertEqual(sum(self.cache.stats.values()), 0)
+
+    async def test_ttl_expiry(self):
+        await self._fetch("attachment:1")
+        self.now += 3601
+        self.assertEqual((await self._fetch("attachment:1"))[3], "miss")
+        self.assertEqual(self.src.processed, 2)
+
+    async def test_lru_eviction_by_bytes(self):
+        for i in range(3):                              # 3 x 25 bytes
+            await self._fetch(f"attachment:{i}", bytes([i]) * 20)
+            self.now += 1
+        await self._fetch("attachment:0", b"\x00" * 20)  # touch 0
+        self.now += 1
+        await self._fetch("attachment:3", b"\x03" * 40)  # 45 more: over 100
+        self.assertLessEqual(self.cache._total, 100)
+        self.assertIsNotNone(await self.cache.get(["attachment:0"]))
+        self.assertIsNone(await self.cache.get(["attachment:1"]))
+        files = [f for _, _, names in os.walk(self._tmp.name) for f in names if f.endswith(".img")]
+        self.assertEqual(len(files), 3)
+
+    async def test_missing_file_is_a_miss(self):
+        await self._fetch("attachment:1")
+        for root, _, names in os.walk(self._tmp.name):
+            for name in names:
+                if name.endswith(".img"):
+                    os.remove(os.path.join(root, name))
+        self.assertEqual((await self._fetch("attachment:1"))[3], "miss")
+        self.assertEqual(self.cache._total, 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
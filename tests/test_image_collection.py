@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for the Copilot cog's image lookback: concurrent fetching with
+per-host limits and a deadline, keeping oldest-first order.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import copilot as copilot_mod  # noqa: E402
+from modules.context_gatherer import ContextGatherer  # noqa: E402
+from modules.image_cache import ImageCache  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+
+
+class FakeAuthor:
+    def __init__(self, name):
+        self.display_name = name
+
+
+class FakeAttachment:
+    """Attachment whose read() takes `delay` seconds."""
+
+    active = 0
+    max_active = 0
+
+    def __init__(self, att_id, delay=0.01, host="cdn.discordapp.com"):
+        self.id = att_id
+        self.delay = delay
+        self.url = f"https://{host}/attachments/{att_id}.png"
+        self.filename = f"{att_id}.png"
+        self.content_type = "image/png"
+        self.reads = 0
+
+    async def read(self):
+        FakeAttachment.active += 1
+        FakeAttachment.max_active = max(FakeAttachment.max_active, FakeAttachment.active)
+        try:
+            self.reads += 1
+            await asyncio.sleep(self.delay)
+            return PNG + bytes([self.id % 256])
+        finally:
+            FakeAttachment.active -= 1
+
+
+class FakeMessage:
+    def __init__(self, author, attachments=()):
+        self.author = FakeAuthor(author)
+        self.attachments = list(attachments)
+        self.embeds = []
+        self.content = ""
+
+
+class FakeChannel:
+    def __init__(self, history):
+        self._history = history     # oldest first
+
+    async def history(self, limit, before):
+        for msg in reversed(self._history[-limit:]):
+            yield msg
+
+
+class FakeCtx:
+    def __init__(self, history, trigger):
+        self.channel = FakeChannel(history)
+        self.message = trigger
+
+
+class FakeBot:
+    user = None
+    cogs = {}
+
+
+class ImageCollectionTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cog = copilot_mod.Copilot.__new__(copilot_mod.Copilot)
+        self.cog.context_gatherer = ContextGatherer(FakeBot(), None, None)
+        self.cog.image_cache = ImageCache(self._tmp.name)
+        FakeAttachment.max_active = 0
+
+    async def asyncTearDown(self):
+        await self.cog.image_cache.close()
+        self._tmp.cleanup()
+
+    async def test_concurrent_and_in_order(self):
+        # Older messages load slower, so completion order is reversed
+        history = [FakeMessage(f"user{i}", [FakeAttachment(i, delay=0.05 - i * 0.01)])
+                   for i in range(5)]
+        trigger = FakeMessage("asker", [FakeAttachment(99, delay=0)])
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        images = await self.cog._collect_recent_images(FakeCtx(history, trigger), 10)
+        elapsed = loop.time() - t0
+        self.assertEqual([i["sender"] for i in images],
+                         ["user0", "user1", "user2", "user3", "user4", "asker"])
+        self.assertEqual(images[0]["filename"], "0.png")
+        self.assertTrue(images[0]["url"].startswith("data:image/png;base64,"))
+        self.assertLess(elapsed, 0.12)      # serial would be ~0.15s
+        self.assertGreater(FakeAttachment.max_active, 1)
+
+        # Second time round everything comes from the cache
+        await self.cog._collect_recent_images(FakeCtx(history, trigger), 10)
+        self.assertEqual(self.cog._img_cache["hit"], 6)
+        self.assertEqual(history[0].attachments[0].reads, 1)
+
+    async def test_per_host_limit(self):
+        history = [FakeMessage("u", [FakeAttachment(i, delay=0.02) for i in range(10)])]
+        trigger = FakeMessage("asker")
+        images = await self.cog._collect_recent_images(FakeCtx(history, trigger), 10)
+        self.assertEqual(len(images), 10)
+        self.assertEqual(FakeAttachment.max_active, copilot_mod.IMAGE_FETCHES_PER_HOST)
+
+    async def test_deadline_returns_partial_results(self):
+        history = [FakeMessage("slow", [FakeAttachment(1, delay=5)]),
+                   FakeMessage("fast", [FakeAttachment(2, delay=0)])]
+        trigger = FakeMessage("asker")
+        with mock.patch.object(copilot_mod, "IMAGE_DEADLINE", 0.1):
+            images = await self.cog._collect_recent_images(FakeCtx(history, trigger), 10)
+        self.assertEqual([i["sender"] for i in images], ["fast"])
+        self.assertIn("deadline(1 dropped)", self.cog._img_diag)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for image downscaling: size/dimension limits, mode conversion, the
+JPEG draft fast path, quality search, and the worker pool.
+"""
+import asyncio
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+
+from modules import image_processing as ip  # noqa: E402
+
+if ip.HAS_PIL:
+    from PIL import Image
+
+
+def noisy(size, mode="RGB", seed=0):
+    """An image that doesn't compress well, like a photo."""
+    rng = random.Random(seed)
+    w, h = size
+    small = Image.frombytes("RGB", (w // 4, h // 4), rng.randbytes((w // 4) * (h // 4) * 3))
+    return small.resize(size, Image.BILINEAR).convert(mode)
+
+
+def encode(img, fmt, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+@unittest.skipUnless(ip.HAS_PIL, "Pillow not installed")
+class DownscaleTests(unittest.TestCase):
+
+    def test_big_jpeg_uses_draft_and_fits(self):
+        data = encode(noisy((4000, 3000)), "JPEG", quality=95)
+        out, mime = ip.downscale_image(data, 400_000, 1024)
+        self.assertEqual(mime, "image/jpeg")
+        self.assertLessEqual(len(out), 400_000)
+        self.assertEqual(Image.open(io.BytesIO(out)).size, (1024, 768))
+
+        # draft() is what makes the decode cheap: confirm it reduces this one
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", (1024, 768))
+        self.assertEqual(img.size, (2000, 1500))
+
+    def test_rgba_png_flattened_and_reduced(self):
+        img = noisy((3000, 1000), "RGBA")
+        img.putalpha(0)     # fully transparent → white background
+        out, _ = ip.downscale_image(encode(img, "PNG"), 3_500_000, 600)
+        result = Image.open(io.BytesIO(out))
+        self.assertEqual((result.mode, result.size), ("RGB", (600, 200)))
+        self.assertGreater(min(result.getpixel((300, 100))), 240)
+
+    def test_gif_converted(self):
+        img = noisy((200, 100), "P")
+        out, mime = ip.downscale_image(encode(img, "GIF"), 3_500_000, 2048)
+        self.assertEqual(mime, "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(out)).size, (200, 100))
+
+    def test_quality_search_fits_without_shrinking(self):
+        img = noisy((1024, 1024))
+        full = len(ip._encode(img, ip.QUALITY_MAX))
+        budget = int(full * 0.7)
+        best, _ = ip._fit_quality(img, budget)
+        self.assertIsNotNone(best)
+        self.assertLessEqual(len(best), budget)
+        # Close to the best quality that fits: a few steps up doesn't
+        quality = next(q for q in range(ip.QUALITY_MAX, ip.QUALITY_MIN - 1, -1)
+                       if len(ip._encode(img, q)) <= budget)
+        self.assertGreaterEqual(len(best), len(ip._encode(img, max(ip.QUALITY_MIN, quality - 2 * ip.QUALITY_STEP))))
+
+    def test_tiny_budget_shrinks_dimensions(self):
+        data = encode(noisy((2048, 2048)), "PNG")
+        out, _ = ip.downscale_image(data, 60_000, 2048)
+        self.assertLessEqual(len(out), 60_000)
+        self.assertLess(Image.open(io.BytesIO(out)).size[0], 2048)
+
+
+@unittest.skipUnless(ip.HAS_PIL, "Pillow not installed")
+class ImagePoolTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_pool_matches_inline(self):
+        pool = ip.ImagePool(workers=1)
+        try:
+            data = encode(noisy((1600, 1200)), "JPEG", quality=95)
+            results = await asyncio.gather(*(pool.downscale(data, 200_000, 800) for _ in range(3)))
+            self.assertEqual(results[0], ip.downscale_image(data, 200_000, 800))
+            self.assertEqual(pool.jobs, 3)
+            with self.assertRaises(Exception):
+                await pool.downscale(b"not an image", 1000, 100)
+        finally:
+            pool.close()
+
+    def test_guarded_main_script(self):
+        # Like palbot.py: the bot only starts under the __main__ guard, so
+        # spawn workers importing the script as __mp_main__ don't run it.
+        script = textwrap.dedent(f"""
+            import asyncio, io, sys
+            sys.path.insert(0, {REPO!r})
+            from modules.image_processing import ImagePool
+            from PIL import Image
+
+            def main():
+                print("main ran", flush=True)
+                buf = io.BytesIO()
+                Image.new("RGB", (800, 600), "red").save(buf, format="PNG")
+                pool = ImagePool(workers=2)
+                data, mime = asyncio.run(pool.downscale(buf.getvalue(), 100_000, 200))
+                pool.close()
+                print(mime, Image.open(io.BytesIO(data)).size, flush=True)
+
+            if __name__ == "__main__":
+                main()
+        """)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bot_main.py")
+            with open(path, "w") as f:
+                f.write(script)
+            proc = subprocess.run([sys.executable, path], capture_output=True,
+                                  text=True, timeout=60)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.splitlines(), ["main ran", "image/jpeg (200, 150)"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Tests for the Logger cog's write-behind queue and read pool.
+
+Events are queued in memory and flushed in batches; these tests drive
+_queue()/flush() directly against a temp log db (no Discord connection).
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# Make the repo root importable so `import modules.logger` works.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import logger as lg  # noqa: E402
+from modules import wotd  # noqa: E402
+
+
+class FakeLogger:
+    def info(self, msg): pass
+    def error(self, msg): pass
+
+
+class FakeBot:
+    def __init__(self):
+        self.logger = FakeLogger()
+        self.dispatched = []
+
+    def dispatch(self, event, *args):
+        self.dispatched.append((event, *args))
+
+
+class FakeGuild:
+    def __init__(self, gid):
+        self.id = gid
+
+
+class LogDbTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs each test in a temp dir so the cog's logfiles/ stays isolated."""
+
+    async def asyncSetUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.cog = lg.Logger(FakeBot())
+        self.guild = FakeGuild(42)
+
+    async def asyncTearDown(self):
+        await self.cog.cog_unload()
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def _message(self, snowflake, text, user=1, channel=10):
+        return [snowflake, user, channel, text, "[]", None, False, False]
+
+    async def _row(self, snowflake):
+        async with self.cog.reader(self.guild) as db:
+            async with db.execute(
+                    "SELECT message, deleted FROM messages WHERE snowflake = ?",
+                    [snowflake]) as c:
+                return await c.fetchone()
+
+
+class WriteQueueTests(LogDbTestCase):
+
+    async def test_nothing_written_until_flush(self):
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(1, "hi"))
+        self.assertEqual(self.cog.queue_depth, 1)
+        self.assertIsNone(await self._row(1))
+        await self.cog.flush()
+        self.assertEqual(self.cog.queue_depth, 0)
+        self.assertEqual(await self._row(1), ("hi", 0))
+
+    async def test_edit_and_delete_apply_after_insert_in_same_batch(self):
+        # Queue the dependent writes first to prove the flush order
+        # doesn't rely on which statement happened to be queued first.
+        self.cog._queue(self.guild, lg.DEL_MESSAGE, [True, 2])
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(1, "first"))
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(2, "second"))
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["first (edited)", "[]", 1])
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["first (edited twice)", "[]", 1])
+        await self.cog.flush()
+        self.assertEqual(await self._row(1), ("first (edited twice)", 0))
+        self.assertEqual(await self._row(2), ("second", 1))
+
+    async def test_flush_stats_recorded(self):
+        for i in range(5):
+            self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(i, "x"))
+        await self.cog.flush()
+        self.assertEqual(self.cog.flush_stats["flushes"], 1)
+        self.assertEqual(self.cog.flush_stats["rows"], 5)
+        self.assertGreater(self.cog.flush_stats["last_ms"], 0)
+
+    async def test_flush_reports_logged_text(self):
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(1, "hello", channel=10))
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(2, "hi", channel=10))
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(3, "yo", channel=11))
+        await self.cog.flush()
+        self.assertEqual(self.cog.bot.dispatched,
+                         [("messages_logged", 42, {10: 7, 11: 2})])
+
+    async def test_background_flush_on_row_limit(self):
+        await self.cog.cog_load()
+        for i in range(lg.FLUSH_MAX_ROWS):
+            self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(i, "x"))
+        # Well under FLUSH_INTERVAL — the row limit should wake the flusher
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.cog.queue_depth, 0)
+        self.assertEqual(await self._row(0), ("x", 0))
+
+    async def test_unload_drains_queue(self):
+        await self.cog.cog_load()
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(7, "bye"))
+        await self.cog.cog_unload()
+        # Reopen the file to check it was written before the close
+        self.cog.stat_dbs = {}
+        self.cog.read_pools = {}
+        self.cog._closing = False
+        self.assertEqual(await self._row(7), ("bye", 0))
+
+
+    def _fail_next_flushes(self, n):
+        real = self.cog._word_count_deltas
+        calls = {"n": 0}
+        async def flaky(*args):
+            calls["n"] += 1
+            if calls["n"] <= n:
+                raise sqlite3.OperationalError("database is locked")
+            return await real(*args)
+        self.cog._word_count_deltas = flaky
+
+    async def test_failed_batch_is_retried_in_order(self):
+        self._fail_next_flushes(1)
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(1, "first"))
+        await self.cog.flush()
+        self.assertIsNone(await self._row(1))
+        self.assertEqual(self.cog.queue_depth, 1)
+        # Queued after the failure, but must still apply after the insert
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["first (edited)", "[]", 1])
+        await self.cog.flush()
+        self.assertEqual(await self._row(1), ("first (edited)", 0))
+        self.assertEqual(self.cog.queue_depth, 0)
+        self.assertEqual(self.cog.flush_failures, {})
+
+    async def test_batch_dropped_after_retries(self):
+        self._fail_next_flushes(lg.FLUSH_RETRIES + 1)
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(1, "doomed"))
+        for _ in range(lg.FLUSH_RETRIES + 1):
+            await self.cog.flush()
+        self.assertEqual((self.cog.pending, self.cog.queue_depth), ({}, 0))
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(2, "fine"))
+        await self.cog.flush()
+        self.assertIsNone(await self._row(1))
+        self.assertEqual(await self._row(2), ("fine", 0))
+
+
+class ReadPoolTests(LogDbTestCase):
+
+    async def test_writer_uses_wal(self):
+        db = await self.cog.get_db(self.guild)
+        async with db.execute("PRAGMA journal_mode") as c:
+            self.assertEqual((await c.fetchone())[0], "wal")
+
+    async def test_readers_are_read_only(self):
+        async with self.cog.reader(self.guild) as db:
+            with self.assertRaises(sqlite3.OperationalError):
+                await db.execute("DELETE FROM messages")
+
+    async def test_reader_not_blocked_by_open_write(self):
+        db = await self.cog.get_db(self.guild)
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute(lg.NEW_MESSAGE, [1, 1, 10, "uncommitted", "[]", None, False, False])
+        async with self.cog.reader(self.guild) as rdb:
+            async with rdb.execute("SELECT count() FROM messages") as c:
+                self.assertEqual((await c.fetchone())[0], 0)
+        await db.commit()
+
+    async def test_concurrent_first_opens_share_one_connection(self):
+        async def read():
+            async with self.cog.reader(self.guild) as db:
+                return db
+        with mock.patch.object(lg, "migrate", wraps=lg.migrate) as migrate:
+            results = await asyncio.gather(self.cog.get_db(self.guild),
+                                           self.cog.get_db(self.guild), read(),
+                                           self.cog.flush())
+        self.assertIs(results[0], results[1])
+        self.assertIs(self.cog.stat_dbs[42], results[0])
+        self.assertEqual(migrate.call_count, 1)
+
+    async def test_pool_reuses_connections(self):
+        async with self.cog.reader(self.guild) as a:
+            pass
+        async with self.cog.reader(self.guild) as b:
+            pass
+        self.assertIs(a, b)
+        # Concurrent borrowers get distinct connections
+        async with self.cog.reader(self.guild) as a:
+            async with self.cog.reader(self.guild) as b:
+                self.assertIsNot(a, b)
+
+
+class RegexpTests(unittest.TestCase):
+
+    def test_matches_like_re_search(self):
+        self.assertTrue(lg.regexp(r"(?i)\bpizza\b", "PIZZA time"))
+        self.assertFalse(lg.regexp(r"\bpizza\b", "pizzas"))
+
+    def test_null_gives_null(self):
+        self.assertIsNone(lg.regexp(None, "text"))
+        self.assertIsNone(lg.regexp("x", None))
+
+    def test_pattern_compiled_once(self):
+        lg._compile_regexp.cache_clear()
+        for item in ("a b", "b c", "c d"):
+            lg.regexp(r"\bb\b", item)
+        info = lg._compile_regexp.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+
+class MigrationTests(LogDbTestCase):
+
+    async def test_new_db_is_at_latest_version(self):
+        db = await self.cog.get_db(self.guild)
+        async with db.execute("PRAGMA user_version") as c:
+            self.assertEqual((await c.fetchone())[0], len(lg.MIGRATIONS))
+        async with db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages'") as c:
+            names = {r[0] for r in await c.fetchall()}
+        self.assertIn("idx_messages_channel", names)
+        self.assertIn("idx_messages_user", names)
+
+    async def test_migrate_is_idempotent(self):
+        db = await self.cog.get_db(self.guild)
+        await lg.migrate(db)
+        await db.execute("PRAGMA user_version = 0")
+        await lg.migrate(db)
+        async with db.execute("PRAGMA user_version") as c:
+            self.assertEqual((await c.fetchone())[0], len(lg.MIGRATIONS))
+
+    async def test_user_history_uses_index(self):
+        async with self.cog.reader(self.guild) as db:
+            async with db.execute(
+                    "EXPLAIN QUERY PLAN SELECT user_id FROM messages "
+                    "WHERE user_id = ? AND deleted = 0 ORDER BY snowflake DESC", [1]) as c:
+                plan = " ".join(str(r[-1]) for r in await c.fetchall())
+        self.assertIn("idx_messages_user", plan)
+
+
+class CorpusTestCase(LogDbTestCase):
+    """A small channel log with bot, deleted and edited messages."""
+
+    CORPUS = [
+        # snowflake, user, text
+        (1, 1, "I love Pizza tonight"),
+        (2, 1, "pizzas are great"),
+        (3, 2, "no PIZZA for you"),
+        (4, 1, "pizza"),
+        (5, 1, "unrelated message"),
+        (6, 3, "bot says pizza"),           # bot user, never counted
+        (7, 1, "deleted pizza message"),   # soft deleted below
+        (8, 1, "they said 'pizza' twice, pizza!"),
+        (9, 1, "edited to mention pizza"),  # edited below
+    ]
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.cog._queue(self.guild, lg.NEW_USER, [1, "one", False])
+        self.cog._queue(self.guild, lg.NEW_USER, [2, "two", False])
+        self.cog._queue(self.guild, lg.NEW_USER, [3, "bot", True])
+        for snowflake, user, text in self.CORPUS:
+            self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(snowflake, text, user))
+        self.cog._queue(self.guild, lg.DEL_MESSAGE, [True, 7])
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["edited, nothing here", "[]", 9])
+        await self.cog.flush()
+
+    async def _count(self, sql, args):
+        async with self.cog.reader(self.guild) as db:
+            async with db.execute(sql, args) as c:
+                return (await c.fetchone())[0]
+
+    async def _both(self, word, fullword=False):
+        l_word = f"%{word}%"
+        r_word = rf"(?i)(?<!\S){wotd.re.escape(word)}\b"
+        m_word = f'"{word}"'
+        if fullword:
+            old = await self._count(wotd.F_WOTD_COUNT, [10, l_word, r_word])
+            new = await self._count(wotd.F_FTS_WOTD_COUNT, [m_word, 10, r_word])
+        else:
+            old = await self._count(wotd.WOTD_COUNT, [10, l_word])
+            new = await self._count(wotd.FTS_WOTD_COUNT, [m_word, 10])
+        return old, new
+
+
+
+class FullTextTests(CorpusTestCase):
+    """The trigram index must give the same WOTD counts as the LIKE scan."""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # The Logger only soft deletes, but the index should survive either
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(10, "hard deleted pizza", 2))
+        await self.cog.flush()
+        db = await self.cog.get_db(self.guild)
+        await db.execute("DELETE FROM messages WHERE snowflake = 10")
+        await db.commit()
+
+    async def test_substring_counts_match(self):
+        for word in ("pizza", "PIZZA", "izz", "mention", "edited", "nothing", "zzz"):
+            old, new = await self._both(word)
+            self.assertEqual(old, new, word)
+        self.assertEqual((await self._both("pizza"))[1], 5)
+
+    async def test_fullword_counts_match(self):
+        for word in ("pizza", "pizzas", "love", "edited"):
+            old, new = await self._both(word, fullword=True)
+            self.assertEqual(old, new, word)
+        self.assertEqual((await self._both("pizza", fullword=True))[1], 4)
+
+    async def test_index_follows_edits(self):
+        self.assertEqual((await self._both("mention"))[1], 0)
+        self.assertEqual((await self._both("nothing"))[1], 1)
+
+
+class WordCountTests(CorpusTestCase):
+    """word_counts must agree with the WOTD full word regex."""
+
+    WORDS = ("pizza", "pizzas", "love", "edited", "nothing", "mention",
+             "they", "'pizza", "bot", "zzz")
+
+    async def _check_all(self):
+        for word in self.WORDS:
+            old, _ = await self._both(word, fullword=True)
+            self.assertEqual(await self.cog.word_count(self.guild, 10, word), old, word)
+
+    def test_message_tokens(self):
+        self.assertEqual(lg.message_tokens("Pizza-party! 'pizza' x"),
+                         {"pizza", "pizza-", "pizza-party", "'", "'pizza", "x"})
+        self.assertEqual(lg.message_tokens(""), set())
+
+    async def test_counts_match_regex(self):
+        self.assertTrue(await self.cog.word_counts_ready(self.guild))
+        await self._check_all()
+        self.assertEqual(await self.cog.word_count(self.guild, 10, "pizza"), 4)
+
+    async def test_counts_follow_later_edits_and_deletes(self):
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["pizza pizza pizza", "[]", 5])
+        self.cog._queue(self.guild, lg.DEL_MESSAGE, [True, 4])
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["gone anyway", "[]", 4])
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(11, "pizza time", 2))
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(11, "duplicate", 2))
+        await self.cog.flush()
+        await self._check_all()
+        self.assertEqual(await self.cog.word_count(self.guild, 10, "pizza"), 5)
+
+    async def test_top_words(self):
+        rows = await self.cog.top_words(self.guild, channel_id=10, min_len=3)
+        self.assertEqual(rows[0], ("pizza", 4))
+        self.assertNotIn("bot", dict(rows))
+        rows = await self.cog.top_words(self.guild, user_id=2, min_len=3, exclude=("pizza",))
+        self.assertEqual(dict(rows), {"for": 1, "you": 1})
+
+
+class BackfillTests(LogDbTestCase):
+    """Opening a log from before messages_fts and word_counts fills them
+    in the background."""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # A log written before word_counts existed (schema version 0)
+        conn = sqlite3.connect(self.cog._db_path(42))
+        conn.executescript(lg.NEWGUILD)
+        conn.execute("INSERT INTO users VALUES (1, 'one', 0)")
+        conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [self._message(i, f"word{i % 7} common") for i in range(1, 50)])
+        conn.execute("UPDATE messages SET deleted = 1 WHERE snowflake = 2")
+        conn.commit()
+        conn.close()
+        lg.BACKFILL_CHUNK, self._chunk = 8, lg.BACKFILL_CHUNK
+        lg.BACKFILL_PAUSE, self._pause = 0, lg.BACKFILL_PAUSE
+
+    async def asyncTearDown(self):
+        lg.BACKFILL_CHUNK, lg.BACKFILL_PAUSE = self._chunk, self._pause
+        await super().asyncTearDown()
+
+    async def _wait_ready(self):
+        while not await self.cog.word_counts_ready(self.guild):
+            await asyncio.sleep(0.01)
+
+    async def test_backfill_counts_existing_log(self):
+        self.assertIsNone(await self.cog.word_count(self.guild, 10, "common"))
+        # An edit to a row the backfill hasn't reached yet
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["common common edited", "[]", 45])
+        await self.cog.flush()
+        await self._wait_ready()
+        self.assertEqual(await self.cog.word_count(self.guild, 10, "common"), 48)
+        self.assertEqual(await self.cog.word_count(self.guild, 10, "edited"), 1)
+        self.assertEqual(await self.cog.word_count(self.guild, 10, "word3"), 6)
+
+    async def _fts_matches(self, word):
+        async with self.cog.reader(self.guild) as db:
+            async with db.execute(
+                    "SELECT count() FROM messages_fts WHERE messages_fts MATCH ?",
+                    [f'"{word}"']) as c:
+                fts = (await c.fetchone())[0]
+            async with db.execute(
+                    "SELECT count() FROM messages WHERE message LIKE ?", [f"%{word}%"]) as c:
+                like = (await c.fetchone())[0]
+        return fts, like
+
+    async def test_fts_filled_in_background(self):
+        self.assertFalse(await self.cog.fts_ready(self.guild))
+        # Edits, deletes and inserts behind and ahead of the fill
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["now says pepperoni", "[]", 40])
+        self.cog._queue(self.guild, lg.NEW_MESSAGE, self._message(100, "pepperoni again"))
+        await self.cog.flush()
+        db = await self.cog.get_db(self.guild)
+        await db.execute("DELETE FROM messages WHERE snowflake = 41")
+        await db.commit()
+        while not await self.cog.fts_ready(self.guild):
+            await asyncio.sleep(0.01)
+        self.cog._queue(self.guild, lg.EDIT_MESSAGE, ["common pepperoni", "[]", 3])
+        await self.cog.flush()
+
+        for word in ("common", "pepperoni", "word3", "ord"):
+            fts, like = await self._fts_matches(word)
+            self.assertEqual(fts, like, word)
+        self.assertEqual(await self._fts_matches("pepperoni"), (3, 3))
+        await db.execute("INSERT INTO messages_fts (messages_fts, rank) "
+                         "VALUES ('integrity-check', 1)")
+
+    async def test_one_backfill_per_guild(self):
+        await asyncio.gather(*(self.cog.word_counts_ready(self.guild) for _ in range(3)),
+                             self.cog.flush())
+        task = self.cog._backfills[42]
+        self.cog._start_backfill(42)
+        self.assertIs(self.cog._backfills[42], task)
+        await self._wait_ready()
+        self.assertEqual(await self.cog.word_count(self.guild, 10, "common"), 48)
+
+
+if __name__ == "__main__":
+    unittest.main()
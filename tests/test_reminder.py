@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Tests for the reminder scheduler: reminders fire in due order from one
+task, new ones wake it, the table is paged in lazily, deletes go by id,
+and reminders (including old-schema ones) survive a restart.
+
+The scheduler's clock is a FakeClock, so nothing waits on real seconds.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import reminder as reminder_mod  # noqa: E402
+from modules.reminder import UTC, Reminder, ReminderItem  # noqa: E402
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, msg, **kwargs):
+        self.sent.append(msg)
+
+
+class FakeBot:
+    logger = logging.getLogger("test_reminder")
+
+    def __init__(self):
+        self.channel = FakeChannel()
+
+    def get_channel(self, cid):
+        return self.channel
+
+    def get_user(self, uid):
+        return None
+
+
+class FakeClock:
+    def __init__(self):
+        self.current = datetime(2026, 1, 1, tzinfo=UTC)
+
+    def now(self):
+        return self.current
+
+    def at(self, seconds):
+        """A time this many seconds from now."""
+        return self.current + timedelta(seconds=seconds)
+
+
+class SchedulerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "reminders.sqlite")
+        self.cogs = []
+        self.clock = FakeClock()
+        self._clock = mock.patch.object(reminder_mod, "utcnow", self.clock.now)
+        self._clock.start()
+
+    async def asyncTearDown(self):
+        for cog in self.cogs:
+            await cog.cog_unload()
+        self._clock.stop()
+        self.tmp.cleanup()
+
+    async def _cog(self):
+        cog = Reminder(FakeBot())
+        cog.db_path = self.db_path
+        await cog.cog_load()
+        self.cogs.append(cog)
+        return cog
+
+    def _advance(self, seconds):
+        """Move the clock on; wake the schedulers as if their sleep ran out."""
+        self.clock.current += timedelta(seconds=seconds)
+        for cog in self.cogs:
+            cog._wake.set()
+
+    async def _wait_for(self, condition, timeout=5):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not condition():
+            self.assertLess(loop.time(), deadline)
+            await asyncio.sleep(0.01)
+
+    async def _wait_idle(self, cog, rows):
+        """Until the table holds rows and nothing due is left in the heap."""
+        now = self.clock.now().timestamp()
+        await self._wait_for(lambda: self._rows() == rows
+                             and not any(ts <= now for ts, _ in cog._heap))
+
+    def _rows(self):
+        with sqlite3.connect(self.db_path) as conn:
+            result = conn.execute("SELECT id, reminder FROM reminders ORDER BY id").fetchall()
+        conn.close()
+        return result
+
+    async def test_fires_in_due_order(self):
+        cog = await self._cog()
+        when = self.clock.at(1)
+        for msg, at in (("later", self.clock.at(2)), ("first", when), ("second", when)):
+            await cog.make_reminder(ReminderItem(1, 42, at, msg))
+        self._advance(1)
+        await self._wait_idle(cog, [(1, "later")])
+        self.assertEqual(cog.bot.channel.sent, ["<@42>: first", "<@42>: second"])
+        self._advance(1)
+        await self._wait_idle(cog, [])
+        self.assertEqual(cog.bot.channel.sent, ["<@42>: first", "<@42>: second", "<@42>: later"])
+
+    async def test_new_reminder_wakes_scheduler(self):
+        cog = await self._cog()
+        await cog.make_reminder(ReminderItem(1, 42, self.clock.at(3600), "next hour"))
+        await asyncio.sleep(0.05)       # asleep until the hour one
+        await cog.make_reminder(ReminderItem(1, 42, self.clock.at(0), "now"))
+        await self._wait_idle(cog, [(1, "next hour")])
+        self.assertEqual(cog.bot.channel.sent, ["<@42>: now"])
+
+    async def test_deleted_before_due_does_not_fire(self):
+        cog = await self._cog()
+        same_second = self.clock.at(1)
+        keep = ReminderItem(1, 42, same_second, "keep")
+        drop = ReminderItem(1, 42, same_second, "drop")
+        await cog.make_reminder(keep)
+        await cog.make_reminder(drop)
+        await cog.delete_timer(drop)
+        # The old timestamp-keyed delete would have taken both
+        self.assertEqual(self._rows(), [(keep.id, "keep")])
+        self._advance(1)
+        await self._wait_idle(cog, [])
+        self.assertEqual(cog.bot.channel.sent, ["<@42>: keep"])
+
+    async def test_past_reminders_not_saved(self):
+        cog = await self._cog()
+        out, _ = await cog.make_reminder(ReminderItem(1, 42, self.clock.at(-60), "too late"))
+        self.assertIn("in the past", out)
+        self.assertEqual(self._rows(), [])
+
+    async def test_loads_lazily_in_batches(self):
+        with mock.patch.object(reminder_mod, "LOAD_BATCH", 10):
+            cog = await self._cog()
+            base = int(self.clock.at(86400).timestamp())
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(
+                    'INSERT INTO reminders ("timestamp", channel, user, "when", reminder) '
+                    'VALUES (?, 1, 42, "", ?)',
+                    [(base + i, f"r{i}") for i in range(100)])
+            conn.close()
+            # Drive the loading by hand, as if just restarted
+            cog.scheduler.cancel()
+            cog._heap, cog._loaded_until = [], (float("-inf"), 0)
+            await cog._load_more()
+            self.assertEqual(len(cog._heap), 10)
+            self.assertEqual(cog._loaded_until, (base + 9, 10))
+
+            # New ones past what's loaded wait for their page, earlier ones don't
+            await cog.make_reminder(ReminderItem(1, 42, self.clock.at(86400 + 500), "far"))
+            await cog.make_reminder(ReminderItem(1, 42, self.clock.at(60), "near"))
+            self.assertEqual(len(cog._heap), 11)
+
+            while cog._loaded_until is not None:
+                await cog._load_more()
+            self.assertEqual(len(cog._heap), 102)
+
+    async def test_restart_fires_overdue(self):
+        cog = await self._cog()
+        await cog.make_reminder(ReminderItem(1, 42, self.clock.at(3600), "later"))
+        await cog.cog_unload()
+        self.cogs.remove(cog)
+        self.clock.current += timedelta(hours=2)     # down for a while
+
+        restarted = await self._cog()
+        await self._wait_idle(restarted, [])
+        self.assertEqual(restarted.bot.channel.sent, ["<@42>: later"])
+
+    async def test_migrates_old_schema(self):
+        ts = int(self.clock.at(-5).timestamp())
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''CREATE TABLE 'reminders' (
+                "timestamp" integer, "channel" integer,
+                "user" integer, "when" text, "reminder" text)''')
+            conn.executemany("INSERT INTO reminders VALUES (?, 1, 42, '', ?)",
+                             [(ts, "a"), (ts, "b"), (ts + 86400 * 30, "c")])
+        conn.close()
+
+        cog = await self._cog()
+        await self._wait_idle(cog, [(3, "c")])
+        self.assertEqual(cog.bot.channel.sent, ["<@42>: a", "<@42>: b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
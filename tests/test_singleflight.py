@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for SingleFlight: joining in-flight calls, short-lived result reuse,
+failures and cancellation, and do_after() for rebuilds.
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.singleflight import SingleFlight  # noqa: E402
+
+
+class Work:
+    """A call that blocks until released and counts how often it ran."""
+
+    def __init__(self, result="done"):
+        self.result = result
+        self.runs = 0
+        self.release = asyncio.Event()
+        self.fail = False
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("boom")
+        return self.result
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_run(self):
+        flight = SingleFlight()
+        work = Work()
+        callers = [asyncio.create_task(flight.do("k", work)) for _ in range(3)]
+        other_work = Work("x")
+        other = asyncio.create_task(flight.do("other", other_work))
+        await asyncio.sleep(0)
+        self.assertTrue(flight.in_flight("k"))
+        work.release.set()
+        results = await asyncio.gather(*callers)
+        self.assertEqual(work.runs, 1)
+        self.assertEqual(sorted(results), [("done", False), ("done", True), ("done", True)])
+        self.assertFalse(flight.in_flight("k"))
+        # Without ttl the next call runs again
+        self.assertEqual(await flight.do("k", work), ("done", False))
+        self.assertEqual(work.runs, 2)
+        other_work.release.set()
+        self.assertEqual(await other, ("x", False))
+        self.assertEqual(flight.describe(), "3 run, 2 joined")
+
+    async def test_failure_shared_not_kept(self):
+        flight = SingleFlight(ttl=60)
+        work = Work()
+        work.fail = True
+        callers = [asyncio.create_task(flight.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        work.fail = False
+        self.assertEqual(await flight.do("k", work), ("done", False))
+        self.assertEqual(work.runs, 2)
+
+    async def test_recent_result_reused(self):
+        flight = SingleFlight(ttl=60)
+        work = Work()
+        work.release.set()
+        self.assertEqual(await flight.do("k", work), ("done", False))
+        self.assertEqual(await flight.do("k", work), ("done", True))
+        self.assertEqual(work.runs, 1)
+        self.assertIn("1 reused", flight.describe())
+        flight.ttl = 1e-9
+        await asyncio.sleep(0.001)
+        self.assertEqual(await flight.do("k", work), ("done", False))
+
+    async def test_cancelled_caller_doesnt_cancel_others(self):
+        flight = SingleFlight()
+        work = Work()
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        self.assertEqual(await second, ("done", True))
+        self.assertTrue(first.cancelled())
+
+    async def test_do_after_waits_for_running_call(self):
+        flight = SingleFlight()
+        work = Work("compacted")
+        order = []
+
+        async def rebuild():
+            order.append("rebuild")
+            return "rebuilt"
+
+        running = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        rebuilding = asyncio.create_task(flight.do_after("k", rebuild))
+        await asyncio.sleep(0)
+        self.assertEqual(order, [])
+        work.release.set()
+        self.assertEqual(await running, ("compacted", False))
+        self.assertEqual(await rebuilding, "rebuilt")
+        self.assertEqual(flight.stats["waited"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed chat completions: SSE parsing in the providers and the
+Copilot cog's progressive-edit sender.
+"""
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import copilot as copilot_mod  # noqa: E402
+from modules.llm_providers import OpenAIProvider, HTTPClient, CallStats  # noqa: E402
+
+CHUNKS = [
+    {"choices": [{"index": 0, "delta": {"role": "assistant"}}]},
+    {"choices": [{"index": 0, "delta": {"reasoning_content": "thinking"}}]},
+    {"choices": [{"index": 0, "delta": {"content": "Hello"}}]},
+    {"choices": [{"index": 0, "delta": {"content": ", world"}}]},
+    {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]},
+    {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 3}},
+]
+
+
+class StreamingProviderTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = []
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.http = HTTPClient()
+        self.provider = OpenAIProvider(None, base_url=f"http://127.0.0.1:{port}/v1",
+                                       http=self.http)
+
+    async def asyncTearDown(self):
+        await self.http.close()
+        await self.runner.cleanup()
+
+    async def _chat(self, request):
+        self.requests.append(await request.json())
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        await resp.write(b": keep-alive comment\n\n")
+        for chunk in CHUNKS:
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await resp.write(b"data: [DONE]\n\n")
+        return resp
+
+    async def test_stream_assembles_chat_response(self):
+        deltas = []
+
+        async def on_delta(text):
+            deltas.append(text)
+
+        data = await self.provider.chat_stream({"model": "m", "messages": []}, on_delta,
+                                               stats=CallStats())
+        self.assertEqual(deltas, ["Hello", ", world"])
+        message = data["choices"][0]["message"]
+        self.assertEqual(message["content"], "Hello, world")
+        self.assertEqual(message["reasoning_content"], "thinking")
+        self.assertEqual(data["choices"][0]["finish_reason"], "stop")
+        self.assertEqual(data["usage"]["completion_tokens"], 3)
+        self.assertTrue(self.requests[0]["stream"])
+        self.assertTrue(self.requests[0]["stream_options"]["include_usage"])
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = []
+
+    async def edit(self, content=None, **kwargs):
+        self.content = content
+        self.edits.append(content)
+
+
+class FakeContext:
+    """ctx.send that can behave like MoreContext's edit override."""
+
+    def __init__(self, override=None):
+        self.sent = []
+        self.override = override
+
+    async def send(self, content):
+        if self.override is not None:
+            msg, self.override = self.override, None
+            await msg.edit(content=content)
+            return msg
+        msg = FakeMessage(content)
+        self.sent.append(msg)
+        return msg
+
+
+class StreamSenderTests(unittest.IsolatedAsyncioTestCase):
+
+    def _sender(self, ctx):
+        return copilot_mod._StreamSender(ctx, lambda text: text.upper(), t0=0)
+
+    async def test_first_text_posted_then_edited(self):
+        ctx = FakeContext()
+        sender = self._sender(ctx)
+        await sender.on_delta("  ")
+        self.assertIsNone(sender._pending)  # whitespace only, nothing to show yet
+        await sender.on_delta("hi")
+        await sender._pending
+        self.assertEqual(len(ctx.sent), 1)
+        self.assertEqual(ctx.sent[0].content, "  HI" + copilot_mod.STREAM_CURSOR)
+        self.assertIsNotNone(sender.first_visible)
+        await sender.finish("final")
+        self.assertEqual(len(ctx.sent), 1)
+        self.assertEqual(ctx.sent[0].content, "final")
+
+    async def test_edits_are_throttled(self):
+        ctx = FakeContext()
+        sender = self._sender(ctx)
+        await sender.on_delta("a")
+        await sender._pending
+        for _ in range(20):
+            await sender.on_delta("b")
+            await asyncio.sleep(0)
+        self.assertEqual(ctx.sent[0].edits, [])
+        sender._last_push -= copilot_mod.STREAM_EDIT_INTERVAL
+        await sender.on_delta("c")
+        await sender._pending
+        self.assertEqual(ctx.sent[0].edits, ["A" + "B" * 20 + "C" + copilot_mod.STREAM_CURSOR])
+
+    async def test_edit_override_reuses_old_reply(self):
+        old_reply = FakeMessage("old answer")
+        ctx = FakeContext(override=old_reply)
+        sender = self._sender(ctx)
+        await sender.on_delta("new")
+        await sender._pending
+        await sender.finish("new answer")
+        self.assertEqual(ctx.sent, [])
+        self.assertIs(sender.message, old_reply)
+        self.assertEqual(old_reply.content, "new answer")
+
+    async def test_finish_without_stream_sends(self):
+        ctx = FakeContext()
+        sender = self._sender(ctx)
+        await sender.finish("❌ API error")
+        self.assertEqual([m.content for m in ctx.sent], ["❌ API error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for the pluggable tokenizers: the len/4 heuristic, BPE counts from
+a local vocab file (a small generated one, needs tiktoken), the count
+cache, counting cold batches off the event loop, and how providers and
+MessageWindow use them.
+"""
+import base64
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.context_gatherer import MessageWindow  # noqa: E402
+from modules.llm_providers import tokenizer as tk  # noqa: E402
+from modules.llm_providers import OpenAIProvider  # noqa: E402
+
+WORDS = ["hello", "world", " hello", " world", " pizza", " the"]
+
+
+def write_vocab(path, words=WORDS):
+    """A tiktoken-format vocab: every byte, then each word's prefixes so
+    BPE can merge up to the whole word."""
+    ranks = [bytes([b]) for b in range(256)]
+    for word in words:
+        raw = word.encode()
+        for end in range(2, len(raw) + 1):
+            if raw[:end] not in ranks:
+                ranks.append(raw[:end])
+    with open(path, "w") as f:
+        for rank, token in enumerate(ranks):
+            f.write(f"{base64.b64encode(token).decode()} {rank}\n")
+
+
+class HeuristicTests(unittest.TestCase):
+
+    def test_counts(self):
+        tok = tk.HeuristicTokenizer()
+        self.assertEqual(tok.count("abcdefgh"), 2)
+        self.assertEqual(tok.count_many(["abcd", "", "abcdefghijk"]), [1, 0, 2])
+        self.assertIn("len/4", tok.describe())
+
+    def test_load_without_path(self):
+        self.assertIsInstance(tk.load_tokenizer(None), tk.HeuristicTokenizer)
+
+
+@unittest.skipUnless(tk.HAS_TIKTOKEN, "tiktoken not installed")
+class BPETests(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "toy.tiktoken")
+        write_vocab(self.path)
+        self.tok = tk.load_tokenizer(self.path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_exact_counts(self):
+        self.assertIsInstance(self.tok, tk.BPETokenizer)
+        self.assertEqual(self.tok.name, "toy")
+        self.assertEqual(self.tok.count("hello world"), 2)
+        self.assertEqual(self.tok.count("hello xyz"), 5)   # " ", "x", "y", "z" are bytes
+
+    def test_cache(self):
+        self.tok.count("hello world")
+        self.tok.count("hello world")
+        self.assertEqual((self.tok.hits, self.tok.misses), (1, 1))
+        self.assertIn("50% hit rate", self.tok.describe())
+
+    def test_count_many_matches_count(self):
+        texts = [f"hello world {i} the pizza" for i in range(tk.BATCH_MIN * 2)] + ["hello"]
+        expected = [tk.BPETokenizer(self.path).count(t) for t in texts]
+        self.assertEqual(self.tok.count_many(texts), expected)
+        self.assertEqual(self.tok.count_many(texts), expected)
+        self.assertEqual(self.tok.hits, len(texts))
+
+    def test_generations(self):
+        tok = tk.BPETokenizer(self.path, cache_size=2)
+        for text in ("a", "b", "c"):
+            tok.count(text)
+        # "a" and "b" moved to the old generation; "a" is still a hit
+        tok.count("a")
+        self.assertEqual(tok.hits, 1)
+        for text in ("d", "e"):
+            tok.count(text)
+        tok.count("b")
+        self.assertEqual(tok.misses, 6)
+
+    def test_bad_vocab_raises(self):
+        with self.assertRaises(Exception):
+            tk.load_tokenizer(os.path.join(self._tmp.name, "missing.tiktoken"))
+
+    def test_window_uses_tokenizer(self):
+        rows = [(2, "al", "hello world", 1), (3, "bo", "the pizza", 2)]
+        window = MessageWindow(rows, 1, self.tok)
+        self.assertEqual(window.margin, tk.BPETokenizer.margin)
+        self.assertEqual(window.tokens(), sum(self.tok.count(line + "\n") for line in window.lines))
+
+
+@unittest.skipUnless(tk.HAS_TIKTOKEN, "tiktoken not installed")
+class AsyncCountTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "toy.tiktoken")
+        write_vocab(self.path)
+        self.tok = tk.BPETokenizer(self.path)
+        self.threads = []
+        encode = self.tok._encode_lengths
+
+        def record(texts):
+            self.threads.append(threading.current_thread())
+            return encode(texts)
+        self.tok._encode_lengths = record
+
+    async def asyncTearDown(self):
+        self._tmp.cleanup()
+
+    async def test_cold_batches_counted_off_the_loop(self):
+        texts = [f"hello {i} the pizza" for i in range(tk.OFFLOAD_MIN)]
+        expected = tk.BPETokenizer(self.path).count_many(texts)
+        self.assertEqual(await self.tok.count_many_async(texts), expected)
+        self.assertIsNot(self.threads[-1], threading.main_thread())
+        # Now cached: nothing to encode
+        self.assertEqual(await self.tok.count_many_async(texts), expected)
+        self.assertEqual(len(self.threads), 1)
+        self.assertEqual(self.tok.hits, len(texts))
+
+    async def test_small_batches_stay_inline(self):
+        self.assertEqual(await self.tok.count_many_async(["hello world", "hello"]), [2, 1])
+        self.assertIs(self.threads[-1], threading.main_thread())
+
+    async def test_window_build_matches_constructor(self):
+        rows = [(2, "al", f"hello world {i}", i) for i in range(tk.OFFLOAD_MIN)]
+        built = await MessageWindow.build(rows, 1, self.tok)
+        made = MessageWindow(rows, 1, tk.BPETokenizer(self.path))
+        self.assertEqual(built.cum, made.cum)
+        self.assertEqual(built.text(), made.text())
+
+
+class ProviderTests(unittest.TestCase):
+
+    def test_estimate_tokens_uses_tokenizer(self):
+        self.assertEqual(OpenAIProvider(None).estimate_tokens("abcdefgh"), 2)
+        tok = tk.HeuristicTokenizer()
+        tok.count = lambda text: 42
+        self.assertEqual(OpenAIProvider(None, tokenizer=tok).estimate_tokens("abcdefgh"), 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
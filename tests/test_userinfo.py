@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the userinfo store behind AuthorInfo: in-memory reads,
+batched write-behind, and the blocking fallback outside an event loop.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.context import AuthorInfo, Location  # noqa: E402
+from utils.userinfo import SCHEMA, UserInfoStore  # noqa: E402
+
+
+class FakeUser:
+    def __init__(self, uid, name="someone"):
+        self.id = uid
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+def rows(path, user):
+    with sqlite3.connect(path) as conn:
+        result = dict(conn.execute("SELECT field, data FROM userinfo WHERE user = ?", [user]))
+    conn.close()
+    return result
+
+
+class UserInfoStoreTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "userinfo.sqlite")
+        # A database written by the old per-access AuthorInfo
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE userinfo (user integer, username text, field text, data text)")
+            conn.executemany("INSERT INTO userinfo VALUES (?, ?, ?, ?)", [
+                (1, "one", "timezone", "America/Toronto"),
+                (1, "one", "latitude", 43.65),
+                (1, "one", "longitude", -79.38),
+                (1, "one", "city", "Toronto"),
+                (1, "one", "local_area", "ON"),
+                (1, "one", "country", "Canada"),
+                (1, "one", "user_input_location", "toronto"),
+                (2, "two", "lastfm", "twofm"),
+            ])
+        conn.close()
+        self.store = UserInfoStore(self.path)
+        await self.store.load()
+        self._old_store = AuthorInfo.store
+        AuthorInfo.store = self.store
+
+    async def asyncTearDown(self):
+        AuthorInfo.store = self._old_store
+        await self.store.close()
+        self._tmp.cleanup()
+
+    async def test_reads_existing_rows(self):
+        info = AuthorInfo(FakeUser(1))
+        self.assertEqual(info.timezone, "America/Toronto")
+        self.assertEqual(info.location.formatted_address, "Toronto, ON, Canada")
+        self.assertEqual(info.location.latitude, "43.65")
+        self.assertIsNone(info.lastfm)
+        self.assertEqual(AuthorInfo(FakeUser(2)).lastfm, "twofm")
+        self.assertIsNone(AuthorInfo(FakeUser(3)).location)
+
+    async def test_writes_batched(self):
+        info = AuthorInfo(FakeUser(3, "three"))
+        info.location = Location(51.5, -0.12, "London", "England", "United Kingdom", "london")
+        info.timezone = "Europe/London"
+        # Visible at once, in the same types a database read would give
+        self.assertEqual(AuthorInfo(FakeUser(3)).location.longitude, "-0.12")
+        self.assertEqual(AuthorInfo(FakeUser(3)).timezone, "Europe/London")
+
+        await self.store.flush()
+        self.assertEqual(self.store.flushes, 1)
+        stored = rows(self.path, 3)
+        self.assertEqual(stored["city"], "London")
+        self.assertEqual(stored["timezone"], "Europe/London")
+        self.assertEqual(len(stored), 7)
+
+    async def test_write_during_flush_persisted(self):
+        release = asyncio.Event()
+        get_db = self.store.get_db
+
+        async def slow_get_db():
+            await release.wait()
+            return await get_db()
+        self.store.get_db = slow_get_db
+        self.store.set_many(4, "four", {"lastfm": "first"})
+        await asyncio.sleep(0)      # the flush has taken the first batch
+        self.store.set_many(5, "five", {"lastfm": "second"})
+        release.set()
+        await self.store._flush_task
+        self.assertEqual(rows(self.path, 4), {"lastfm": "first"})
+        self.assertEqual(rows(self.path, 5), {"lastfm": "second"})
+        self.assertEqual(self.store.flushes, 2)
+
+    async def test_update_replaces_row(self):
+        info = AuthorInfo(FakeUser(1))
+        info.timezone = "America/Vancouver"
+        info.strava = "123"
+        await asyncio.sleep(0)      # the scheduled flush
+        await self.store.flush()
+        with sqlite3.connect(self.path) as conn:
+            count = conn.execute(
+                "SELECT COUNT(*) FROM userinfo WHERE user = 1 AND field = 'timezone'").fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 1)
+        self.assertEqual(rows(self.path, 1)["timezone"], "America/Vancouver")
+        self.assertEqual(rows(self.path, 1)["strava_athlete"], "null")
+        self.assertEqual(info.strava, 123)
+        self.assertIsNone(info.strava_athlete)
+
+        fresh = UserInfoStore(self.path)
+        await fresh.load()
+        self.assertEqual(fresh.get(1, "timezone"), "America/Vancouver")
+        await fresh.close()
+
+
+class BlockingFallbackTests(unittest.TestCase):
+
+    def test_no_event_loop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "userinfo.sqlite")
+            with sqlite3.connect(path) as conn:
+                conn.executescript(SCHEMA)
+                conn.execute("INSERT INTO userinfo VALUES (5, 'five', 'birthday', '2000-01-01')")
+            conn.close()
+            store = UserInfoStore(path)
+            self.assertEqual(store.get(5, "birthday"), "2000-01-01")
+            store.set_many(5, "five", {"lastfm": "fivefm"})
+            self.assertEqual(rows(path, 5), {"birthday": "2000-01-01", "lastfm": "fivefm"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Tests for VoiceTTS playback: synthesis pipelined with playback, bounded
+prefetch, prefetched audio dropped on skip-all and leave, streaming
+audio into FFmpeg before synthesis finishes, and the phrase cache.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import voice_tts  # noqa: E402
+from modules.tts_audio import PhraseCache, StreamingAudio  # noqa: E402
+
+SYNTH_TIME = 0.05
+PLAY_TIME = 0.05
+
+
+class FakeVoiceClient:
+    """Plays each source on a loop timer until PLAY_TIME after its audio
+    is complete, as FFmpeg reading a pipe would."""
+
+    def __init__(self):
+        self.played = []
+        self._timer = None
+        self._after = None
+
+    def is_connected(self):
+        return True
+
+    def is_playing(self):
+        return self._timer is not None
+
+    def play(self, source, after):
+        self.played.append(source)
+        self.complete_at_start = source.finished
+        self._after = after
+        self._timer = asyncio.get_running_loop().call_later(PLAY_TIME, self._finish)
+
+    def _finish(self):
+        if not self.played[-1].finished:
+            self._timer = asyncio.get_running_loop().call_later(PLAY_TIME, self._finish)
+            return
+        self._timer = None
+        self._after(None)
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+            self._after(None)
+
+
+class FakeGuild:
+    id = 1
+
+
+class FakeCtx:
+    guild = FakeGuild()
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, msg):
+        self.sent.append(msg)
+
+
+class FakeBot:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+
+
+class PipelineTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cog = voice_tts.VoiceTTS(FakeBot())
+        self.cog.phrases = PhraseCache(voice_tts.PHRASE_CACHE_BYTES)
+        self.vc = FakeVoiceClient()
+        self.cog.guild_config[1] = {"voice_client": self.vc}
+        self.synthesized = []
+        self.cog._generate_tts = self._generate_tts
+        # The StreamingAudio itself stands in for the FFmpeg source
+        self._source = mock.patch.object(voice_tts.discord, "FFmpegPCMAudio",
+                                         lambda audio, **kw: audio)
+        self._source.start()
+        self.cog._start_consumer(1)
+
+    async def asyncTearDown(self):
+        self._source.stop()
+        self.cog.cog_unload()
+        await asyncio.sleep(0)
+
+    async def _generate_tts(self, text, voice):
+        # Two chunks, the second arriving after playback could have started
+        for part in (text[:5], text[5:]):
+            await asyncio.sleep(SYNTH_TIME / 2)
+            yield part.encode()
+        self.synthesized.append(text)
+
+    def _played(self):
+        return [audio.getvalue() for audio in self.vc.played]
+
+    async def _say(self, *texts):
+        for text in texts:
+            await self.cog.queues[1].put(("bob", text, 42, time.monotonic()))
+
+    async def _wait_played(self, n, timeout=2):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(self.vc.played) < n or self.vc.is_playing():
+            self.assertLess(loop.time(), deadline)
+            await asyncio.sleep(0.005)
+
+    async def test_synthesis_overlaps_playback(self):
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        await self._say("one", "two", "three")
+        await self._wait_played(3)
+        elapsed = loop.time() - t0
+        self.assertEqual(self._played(), [b"bob says:one", b"bob says:two", b"bob says:three"])
+        # Serial: 3 x (synth + play) = 0.30s; pipelined: synth + 3 x play = 0.20s
+        self.assertLess(elapsed, 0.27)
+        self.assertEqual(len(self.cog.gaps[1]), 2)
+        self.assertLess(max(self.cog.gaps[1]), SYNTH_TIME / 2)
+        self.assertIn("gap between messages", self.cog._format_timing(1))
+
+    async def test_prefetch_is_bounded(self):
+        await self._say(*[str(i) for i in range(5)])
+        await asyncio.sleep(SYNTH_TIME * 6)
+        # The playing one plus PREFETCH_DEPTH ahead of it
+        self.assertLessEqual(len(self.synthesized) - len(self.vc.played), voice_tts.PREFETCH_DEPTH)
+        self.assertLessEqual(self.cog.prefetched[1].qsize(), voice_tts.PREFETCH_DEPTH)
+
+    async def test_skip_all_drops_prefetched(self):
+        await self._say(*[str(i) for i in range(5)])
+        await asyncio.sleep(SYNTH_TIME * 3)
+        ctx = FakeCtx()
+        await self.cog.tts_skip.callback(self.cog, ctx, "all")
+        played, synthesized = len(self.vc.played), len(self.synthesized)
+        await asyncio.sleep(SYNTH_TIME * 4)
+        self.assertEqual((len(self.vc.played), len(self.synthesized)), (played, synthesized))
+        self.assertIn("Skipped everything", ctx.sent[0])
+
+        # The new consumer still works
+        await self._say("after")
+        await self._wait_played(played + 1)
+        self.assertEqual(self._played()[-1], b"bob says:after")
+
+    async def test_stopping_consumer_cancels_synthesis(self):
+        await self._say("one")
+        await asyncio.sleep(SYNTH_TIME / 2)     # mid-synthesis
+        self.cog.consumers[1].cancel()
+        await asyncio.sleep(SYNTH_TIME)
+        self.assertEqual(self.synthesized, [])
+        self.assertNotIn(1, self.cog.prefetched)
+
+    async def test_playback_starts_before_synthesis_ends(self):
+        await self._say("streaming")
+        await self._wait_played(1)
+        self.assertFalse(self.vc.complete_at_start)
+        self.assertEqual(self._played(), [b"bob says:streaming"])
+        self.assertLess(self.cog.latencies[1][0], SYNTH_TIME)
+
+    async def test_repeats_come_from_phrase_cache(self):
+        await self._say("lol")
+        await self._wait_played(1)
+        await self._say("lol", "new one")
+        await self._wait_played(3)
+        self.assertEqual(self._played(), [b"bob says:lol", b"bob says:lol", b"bob says:new one"])
+        # The prefix and "lol" were each synthesized once
+        self.assertEqual(self.synthesized, ["bob says:", "lol", "new one"])
+        self.assertIn("3 phrases", self.cog.phrases.describe())
+
+    async def test_long_messages_not_cached(self):
+        long = "word " * voice_tts.PHRASE_MAX_CHARS
+        await self._say(long)
+        await self._wait_played(1)
+        self.assertEqual(len(self.cog.phrases), 1)      # just the prefix
+
+
+class StreamingAudioTests(unittest.TestCase):
+
+    def _reader(self, audio, out):
+        """Read like FFmpegPCMAudio's stdin writer: small blocks until b''."""
+        def read():
+            while chunk := audio.read(4):
+                out.extend(chunk)
+        thread = threading.Thread(target=read)
+        thread.start()
+        return thread
+
+    def test_reader_waits_for_data_then_eof(self):
+        audio = StreamingAudio()
+        out = bytearray()
+        thread = self._reader(audio, out)
+        audio.write(b"abcdef")
+        time.sleep(0.02)
+        self.assertTrue(thread.is_alive())      # waiting for more
+        audio.write(b"gh")
+        audio.finish()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(bytes(out), b"abcdefgh")
+        self.assertEqual(len(audio), 8)
+
+    def test_close_unblocks_reader(self):
+        audio = StreamingAudio()
+        out = bytearray()
+        thread = self._reader(audio, out)
+        audio.write(b"ab")
+        time.sleep(0.02)
+        audio.close()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        audio.write(b"ignored")
+        self.assertEqual(audio.getvalue(), b"ab")
+
+
+class PhraseCacheTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_lru_by_bytes(self):
+        cache = PhraseCache(max_bytes=10)
+        await cache.put("v", "a", b"aaaa")
+        await cache.put("v", "b", b"bbbb")
+        await cache.get("v", "a")
+        await cache.put("v", "c", b"cccc")
+        self.assertIsNone(await cache.get("v", "b"))
+        self.assertEqual(await cache.get("v", "a"), b"aaaa")
+        self.assertEqual(cache.size, 8)
+        self.assertIsNone(await cache.get("other voice", "a"))
+        # Only whitespace is normalized
+        self.assertEqual(await cache.get("v", "  a "), b"aaaa")
+        self.assertIsNone(await cache.get("v", "A"))
+
+    async def test_persisted_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = PhraseCache(max_bytes=10, cache_dir=tmp)
+            await cache.put("v", "a", b"aaaa")
+            await cache.put("v", "b", b"bbbb")
+            await cache.put("v", "c", b"cccc")     # evicts a, and its file
+            self.assertEqual(len(os.listdir(tmp)), 2)
+
+            restarted = PhraseCache(max_bytes=10, cache_dir=tmp)
+            self.assertEqual(restarted.size, 8)
+            self.assertEqual(await restarted.get("v", "b"), b"bbbb")
+            self.assertIsNone(await restarted.get("v", "a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Tests for web search page handling: lxml text extraction (against the old
+BeautifulSoup path), URL normalization, the TTL cache, and the Copilot
+cog's cached, size-capped page fetch.
+"""
+import asyncio
+import os
+import re
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from aiohttp import web
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import copilot as copilot_mod  # noqa: E402
+from modules import web_content as wc  # noqa: E402
+from modules.llm_providers import HTTPClient  # noqa: E402
+
+PAGES = [
+    b"""<html><head><title>T</title><style>p{}</style></head><body>
+        <nav>Home | About</nav><header>Site</header>
+        <article><h1>Big  news</h1><p>First   paragraph
+        with <b>bold</b> text.</p><script>var x = 1;</script>
+        <aside>ad</aside><p>Second&nbsp;one.</p><!-- comment --></article>
+        <footer>(c)</footer></body></html>""",
+    b"""<html><body><main><div>Main <i>content</i></div><form>login</form></main>
+        <p>outside</p></body></html>""",
+    b"""<html><body><div>Just a body<br>with lines</div>\n<iframe>x</iframe>tail</body></html>""",
+    "<html><head><meta charset='utf-8'></head><body><p>Café — naïve</p></body></html>".encode(),
+]
+
+
+def old_extract(data, max_chars):
+    """fetch_page_text's extraction before lxml-only parsing."""
+    page = BeautifulSoup(data, 'lxml')
+    for tag in page(['script', 'style', 'nav', 'header', 'footer', 'aside', 'form', 'iframe']):
+        tag.decompose()
+    content = page.find('article') or page.find('main') or page.find('body')
+    if not content:
+        return ""
+    text = content.get_text(separator=' ', strip=True)
+    text = re.sub(r'\s+', ' ', text)
+    return text[:max_chars]
+
+
+class ExtractTests(unittest.TestCase):
+
+    def test_matches_old_extraction(self):
+        for page in PAGES:
+            self.assertEqual(wc.extract_text(page, 4000), old_extract(page, 4000))
+
+    def test_stops_at_max_chars(self):
+        page = b"<html><body>" + b"<p>word word word</p>" * 100_000 + b"</body></html>"
+        text = wc.extract_text(page, 100)
+        self.assertEqual(text, old_extract(page, 100))
+        self.assertEqual(len(text), 100)
+
+    def test_garbage(self):
+        self.assertEqual(wc.extract_text(b"", 100), "")
+        self.assertEqual(wc.extract_text(b"   ", 100), "")
+        self.assertEqual(wc.extract_text(b"plain text", 100), "plain text")
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            wc.normalize_url("HTTPS://Example.COM:443/a?b=2&utm_source=x&a=1#frag"),
+            "https://example.com/a?a=1&b=2")
+        self.assertEqual(wc.normalize_url("http://example.com"), "http://example.com/")
+        self.assertEqual(wc.normalize_url("http://example.com:8080/x"), "http://example.com:8080/x")
+
+
+class TTLCacheTests(unittest.TestCase):
+
+    def test_lru_by_size(self):
+        cache = wc.TTLCache(max_bytes=10, ttl=60)
+        cache.put("a", "xxxx")
+        cache.put("b", "xxxx")
+        cache.get("a")
+        cache.put("c", "xxxx")      # over 10: evicts b, the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "xxxx")
+        self.assertEqual(cache.size, 8)
+        cache.put("huge", "x" * 11)  # never fits
+        self.assertIsNone(cache.get("huge"))
+        self.assertIn("2 entries", cache.describe())
+
+    def test_expiry(self):
+        now = [100.0]
+        with mock.patch("time.monotonic", lambda: now[0]):
+            cache = wc.TTLCache(max_bytes=100, ttl=60)
+            cache.put("a", "x")
+            now[0] += 61
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+class FakeLogger:
+    def debug(self, msg): pass
+
+
+class FakeBot:
+    logger = FakeLogger()
+
+
+class FetchPageTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.hits = []
+        app = web.Application()
+        app.router.add_get("/page", self._page)
+        app.router.add_get("/big", self._big)
+        app.router.add_get("/pdf", self._pdf)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+        cog = copilot_mod.Copilot.__new__(copilot_mod.Copilot)
+        cog.bot = FakeBot()
+        cog.http = HTTPClient()
+        cog.page_cache = wc.TTLCache(wc.PAGE_CACHE_BYTES, wc.PAGE_TTL, sizeof=lambda item: len(item[0]))
+        cog.extract_pool = ThreadPoolExecutor(1)
+        self.cog = cog
+
+    async def asyncTearDown(self):
+        self.cog.extract_pool.shutdown()
+        await self.cog.http.close()
+        await self.runner.cleanup()
+
+    async def _page(self, request):
+        self.hits.append(request.path)
+        return web.Response(body=PAGES[0], content_type="text/html")
+
+    async def _big(self, request):
+        self.hits.append(request.path)
+        resp = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await resp.prepare(request)
+        await resp.write(b"<html><body>")
+        try:
+            for _ in range(200):
+                await resp.write(b"<p>" + b"a" * 65536 + b"</p>")
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        return resp
+
+    async def _pdf(self, request):
+        self.hits.append(request.path)
+        return web.Response(body=b"%PDF-1.4", content_type="application/pdf")
+
+    async def test_cached_by_normalized_url(self):
+        text = await self.cog.fetch_page_text(f"{self.base}/page", max_chars=3000)
+        self.assertEqual(text, old_extract(PAGES[0], 3000))
+        again = await self.cog.fetch_page_text(f"{self.base}/page?utm_source=x#top", max_chars=20)
+        self.assertEqual(again, text[:20])
+        self.assertEqual(self.hits, ["/page"])
+
+    async def test_download_capped(self):
+        with mock.patch.object(wc, "MAX_PAGE_BYTES", 200_000):
+            html = await self.cog._download_page(f"{self.base}/big")
+        self.assertEqual(len(html), 200_000)
+
+    async def test_non_html_skipped(self):
+        self.assertEqual(await self.cog.fetch_page_text(f"{self.base}/pdf"), "")
+        self.assertEqual(await self.cog.fetch_page_text(f"{self.base}/missing"), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
-import sqlite3
 from discord.ext import commands
 from urllib.parse import quote as uriquote
 import json
+from utils.geocache import GeocodeCache, TIMEZONE_GRID, REVERSE_GRID, cell_key, query_key
+from utils.userinfo import UserInfoStore
+
+LOCATION_FIELDS = ('latitude', 'longitude', 'city', 'local_area', 'country',
+                   'user_input_location')
 
 
 class MoreContext(commands.Context):
@@ -35,6 +39,9 @@ class MoreContext(commands.Context):
 
 #@dataclass
 class Location:
+    # Shared geocode/timezone cache; closed in PalBot.close
+    cache = GeocodeCache()
+
     def __init__(self, latitude, longitude, city, local_area, country, user_input_location):
         self.latitude = latitude
         self.longitude = longitude
@@ -51,7 +58,7 @@ class Location:
         elif not address:
             raise commands.MissingRequiredArgument
         else:
-            loc = cls.from_google_geocode(ctx.bot, address)
+            loc = await cls.from_google_geocode(ctx.bot, address)
             if not loc:
                 raise commands.BadArgument
             return loc
@@ -67,6 +74,10 @@ class Location:
             return f"{self.city}, {self.country}"
 
     async def get_timezone(self, bot):
+        cell = cell_key(self.latitude, self.longitude, TIMEZONE_GRID)
+        found, zone = await self.cache.get("timezone", cell)
+        if found:
+            return zone
         key = bot.config.timezonedb
         url = (f"http://api.timezonedb.com/v2.1/get-time-zone?key={key}"
                f"&format=json&by=position&lat={self.latitude}&lng={self.longitude}")
@@ -74,11 +85,17 @@ class Location:
             results = await resp.json()
             #not sure why they \escape a '/' char... pytz doesnt like it..
             zone = results['zoneName'].replace('\\', '')
+            await self.cache.put("timezone", cell, zone)
             return zone
 
 
     @classmethod
     async def from_google_geocode(cls, bot, address):
+        key = query_key(address)
+        found, fields = await cls.cache.get("geocode", key)
+        if found:
+            return cls(**fields, user_input_location=address) if fields else None
+
         url = "https://maps.googleapis.com/maps/api/geocode/json?address={}&key={}"
         url = url.format(uriquote(address), bot.config.gsearch2)
 
@@ -87,6 +104,9 @@ class Location:
             status = results_json['status']
 
             if status != "OK":
+                # Only "no such place" is worth remembering; quota/auth errors are transient
+                if status == "ZERO_RESULTS":
+                    await cls.cache.put("geocode", key, None)
                 return None
             city, state, country, poi = "","","", ""
 
@@ -109,12 +129,17 @@ class Location:
             lat = results_json['results'][0]['geometry']['location']['lat']
 
             loc = cls(lat, lng, city, state, country, address)
+            await cls.cache.put("geocode", key, {'latitude': lat, 'longitude': lng, 'city': city,
+                                                 'local_area': state, 'country': country})
 
             return loc
 
     @classmethod
     async def get_location_by_latlon(cls, bot, lat, lon):
-        location_string = None
+        cell = cell_key(lat, lon, REVERSE_GRID)
+        found, location_string = await cls.cache.get("reverse", cell)
+        if found:
+            return location_string
         url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lon}&key={bot.config.gsearch2}"
         city, state = "", ""
         async with bot.session.get(url) as resp:
@@ -124,6 +149,8 @@ class Location:
                     location = resp_json['results'][0]
                 else:
                     print(f"Google maps did not return at least one location for coordinates: {lat},{lon}")
+                    if resp_json.get('status') == "ZERO_RESULTS":
+                        await cls.cache.put("reverse", cell, None)
                     return None
                 try:
                     for pt in location['address_components']:
@@ -133,6 +160,7 @@ class Location:
                             state = pt['short_name']
                     if city or state:
                         location_string = f"{city}, {state}"
+                    await cls.cache.put("reverse", cell, location_string)
                 except KeyError as e:
                     print(f"Google maps API did not return proper response: {e} is missing")
             else:
@@ -140,57 +168,33 @@ class Location:
         return location_string
 
 class AuthorInfo:
+    # Shared by every AuthorInfo; loaded in PalBot.setup_hook
+    store = UserInfoStore()
+
     def __init__(self, user):
 
         self.user_id = user.id
         self.user = user
 
-        self.conn = sqlite3.connect('data/userinfo.sqlite')
-        self.c = self.conn.cursor()
-        # username field is never queried, just exists for convenient lookup when manually checking db entries
-        self.c.execute('''CREATE TABLE IF NOT EXISTS userinfo (user integer, username text, field text, data text);''')
-        self.conn.commit()
-
     def single_getter(self, key):
-        q = '''SELECT data FROM userinfo WHERE user = (?) AND field = (?); '''
-        result = self.c.execute(q, (self.user_id, key)).fetchone()
-        if result:
-            return result[0]
-        else:
-            return None
+        return self.store.get(self.user_id, key)
 
     def single_setter(self, key, value):
-        q = '''SELECT data FROM userinfo WHERE user = (?) AND field = (?); '''
-        result = self.c.execute(q, (self.user_id, key)).fetchone()
-        # Unfortunately key-value db means I can't INSERT OR REPLACE
-        if result:
-            q = '''UPDATE userinfo SET data = (?) WHERE user = (?) AND field = (?); '''
-            self.c.execute(q, (value, self.user_id, key))
-        else:
-            q = '''INSERT INTO userinfo VALUES (?, ?, ?, ?); '''
-            self.c.execute(q, (self.user_id, str(self.user), key, value))
-        self.conn.commit()
- 
+        self.store.set_many(self.user_id, str(self.user), {key: value})
+
 
 
     @property
     def location(self):
-        q = '''SELECT field, data FROM userinfo WHERE user = (?) AND
-               (field = 'latitude' OR field = 'longitude' OR field = 'city'
-               OR field = 'local_area' OR field = 'country'
-               OR field = 'user_input_location');'''
-        result = self.c.execute(q, (self.user_id,))
-
-        loc = {}
-        for field, data in result:
-            loc[field] = data
+        record = self.store.record(self.user_id)
+        loc = {field: record[field] for field in LOCATION_FIELDS if field in record}
 
         return Location(**loc) if loc else None
 
     @location.setter
     def location(self, loc: Location):
-        for k,v in loc.__dict__.items():
-            self.single_setter(k, v)
+        self.store.set_many(self.user_id, str(self.user),
+                            {field: getattr(loc, field) for field in LOCATION_FIELDS})
     
     @property
     def id(self):
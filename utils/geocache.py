@@ -0,0 +1,104 @@
+"""Persistent cache for Google geocoding and TimezoneDB lookups.
+
+Weather, sun, AQI and time commands geocode the same few dozen location
+strings over and over, and !set location looks up a timezone each time.
+GeocodeCache stores the answers in SQLite so they survive restarts:
+
+  geocode   normalized query string      -> Location fields
+  reverse   lat/lon rounded to ~1km      -> "City, ST"
+  timezone  lat/lon rounded to ~10km     -> zone name
+
+Answers expire after TTL. "No such place" answers are cached too, for
+NEGATIVE_TTL, so a typo repeated in a channel doesn't hit the API each
+time. API errors (quota, network) are never cached.
+"""
+
+import json
+import os
+import re
+import time
+
+import aiosqlite
+
+DB_PATH = "data/geocache.sqlite"
+TTL = 30 * 86400
+NEGATIVE_TTL = 86400
+REVERSE_GRID = 0.01     # degrees, ~1km: enough to name the nearest town
+TIMEZONE_GRID = 0.1     # degrees, ~10km: zone borders rarely matter at this scale
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocache (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+_PUNCT = re.compile(r"[\s,]+")
+
+
+def query_key(address: str) -> str:
+    """'  Toronto,ON ' and 'toronto on' share an entry."""
+    return _PUNCT.sub(" ", address.lower()).strip()
+
+
+def cell_key(lat, lon, grid: float) -> str:
+    """Grid cell containing (lat, lon); lat/lon may be stored strings."""
+    return f"{round(float(lat) / grid) * grid:.3f},{round(float(lon) / grid) * grid:.3f}"
+
+
+class GeocodeCache:
+    """SQLite-backed TTL cache with negative entries."""
+
+    def __init__(self, db_path: str = DB_PATH, ttl: float = TTL,
+                 negative_ttl: float = NEGATIVE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    async def get_db(self) -> aiosqlite.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._db = await aiosqlite.connect(self.db_path)
+            await self._db.executescript(SCHEMA)
+            # Prune on open; entries are small, so expiring at read time is enough otherwise
+            now = time.time()
+            await self._db.execute(
+                "DELETE FROM geocache WHERE stored_at < ? OR (value IS NULL AND stored_at < ?)",
+                [now - self.ttl, now - self.negative_ttl])
+            await self._db.commit()
+        return self._db
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def get(self, kind: str, key: str) -> tuple[bool, object]:
+        """(True, value) on a hit, where value None is a cached "not
+        found"; (False, None) on a miss."""
+        db = await self.get_db()
+        async with db.execute("SELECT value, stored_at FROM geocache WHERE kind = ? AND key = ?",
+                              [kind, key]) as cursor:
+            row = await cursor.fetchone()
+        if row is not None:
+            value, stored_at = row
+            ttl = self.ttl if value is not None else self.negative_ttl
+            if stored_at >= time.time() - ttl:
+                self.hits += 1
+                return True, json.loads(value) if value is not None else None
+        self.misses += 1
+        return False, None
+
+    async def put(self, kind: str, key: str, value):
+        """Store a JSON-able value, or None to remember that nothing was found."""
+        db = await self.get_db()
+        await db.execute(
+            "INSERT OR REPLACE INTO geocache (kind, key, value, stored_at) VALUES (?, ?, ?, ?)",
+            [kind, key, json.dumps(value) if value is not None else None, time.time()])
+        await db.commit()
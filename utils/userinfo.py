@@ -0,0 +1,151 @@
+"""Per-user profile fields (location, timezone, birthday, lastfm, strava).
+
+The userinfo table is a key-value store of (user, field) -> data. It used
+to be read with a fresh blocking sqlite3 connection every time a cog
+touched ctx.author_info. UserInfoStore keeps every user's fields in
+memory as {field: data}, loaded in one query when the bot starts, so
+AuthorInfo's properties stay plain attribute reads.
+
+Writes are write-behind: they go to memory immediately and are queued
+for the database, where a flush task started by the first of them writes
+them as soon as the loop gets to it. All writes queued in one event-loop
+pass (e.g. the six fields of a location) land in a single transaction on
+one shared aiosqlite connection, and the task keeps going until nothing
+is left queued. A crash inside that window loses the queued fields;
+PalBot.close() calls close(), which flushes, on a normal shutdown.
+Outside a running loop (scripts, the REPL) reads and writes fall back to
+a blocking sqlite3 connection and are written before returning.
+"""
+
+import asyncio
+import logging
+import sqlite3
+
+import aiosqlite
+
+DB_PATH = "data/userinfo.sqlite"
+
+# username field is never queried, just exists for convenient lookup when manually checking db entries
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS userinfo (user integer, username text, field text, data text);
+CREATE INDEX IF NOT EXISTS idx_userinfo_user_field ON userinfo(user, field);
+"""
+
+log = logging.getLogger("palbot.userinfo")
+
+
+def _as_text(value):
+    """What the data column's TEXT affinity turns value into, so the
+    in-memory copy reads back the same as a fresh database read."""
+    if value is None or isinstance(value, (str, bytes)):
+        return value
+    return str(value)
+
+
+class UserInfoStore:
+    """In-memory cache of the userinfo table with batched write-behind."""
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._db = None
+        self._records = None        # {user_id: {field: data}} once loaded
+        self._pending = {}          # {(user_id, field): (username, data)}
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self.flushes = 0
+
+    async def get_db(self) -> aiosqlite.Connection:
+        if self._db is None:
+            self._db = await aiosqlite.connect(self.db_path)
+            await self._db.executescript(SCHEMA)
+            await self._db.commit()
+        return self._db
+
+    async def load(self):
+        """Read the whole table into memory. Called from setup_hook."""
+        db = await self.get_db()
+        async with db.execute("SELECT user, field, data FROM userinfo") as cursor:
+            self._records = self._group(await cursor.fetchall())
+
+    def _load_sync(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript(SCHEMA)
+            self._records = self._group(conn.execute("SELECT user, field, data FROM userinfo"))
+        conn.close()
+
+    @staticmethod
+    def _group(rows) -> dict:
+        records = {}
+        for user, field, data in rows:
+            records.setdefault(user, {})[field] = data
+        return records
+
+    def record(self, user_id: int) -> dict:
+        """All stored fields for a user. Treat as read-only."""
+        if self._records is None:
+            self._load_sync()
+        return self._records.get(user_id, {})
+
+    def get(self, user_id: int, field: str):
+        return self.record(user_id).get(field)
+
+    def set_many(self, user_id: int, username: str, fields: dict):
+        """Update several fields of one user, in memory now and in the
+        database in the next batch."""
+        if self._records is None:
+            self._load_sync()
+        fields = {k: _as_text(v) for k, v in fields.items()}
+        self._records.setdefault(user_id, {}).update(fields)
+        for field, data in fields.items():
+            self._pending[(user_id, field)] = (username, data)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_sync(self._take_pending())
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self.flush())
+
+    def _take_pending(self) -> list:
+        rows = [(user, field, username, data)
+                for (user, field), (username, data) in self._pending.items()]
+        self._pending.clear()
+        return rows
+
+    async def flush(self):
+        """Write queued changes, one transaction per batch, until none are
+        left (including ones queued while a batch was being written)."""
+        async with self._lock:
+            while self._pending:
+                await self._write(self._take_pending())
+
+    async def _write(self, rows: list):
+        db = await self.get_db()
+        try:
+            # Key-value table without a unique key, so no INSERT OR REPLACE
+            await db.executemany("DELETE FROM userinfo WHERE user = ? AND field = ?",
+                                 [(user, field) for user, field, _, _ in rows])
+            await db.executemany("INSERT INTO userinfo VALUES (?, ?, ?, ?)",
+                                 [(user, username, field, data)
+                                  for user, field, username, data in rows])
+            await db.commit()
+            self.flushes += 1
+        except Exception:
+            await db.rollback()
+            log.exception("Failed to write %d userinfo fields", len(rows))
+
+    def _write_sync(self, rows: list):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executescript(SCHEMA)
+            conn.executemany("DELETE FROM userinfo WHERE user = ? AND field = ?",
+                             [(user, field) for user, field, _, _ in rows])
+            conn.executemany("INSERT INTO userinfo VALUES (?, ?, ?, ?)",
+                             [(user, username, field, data)
+                              for user, field, username, data in rows])
+        conn.close()
+
+    async def close(self):
+        await self.flush()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None